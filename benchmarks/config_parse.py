@@ -0,0 +1,92 @@
+# noqa: INP001
+
+"""
+Benchmark parsing of large synthetic configuration files.
+
+Run with, for example, `hatch run python benchmarks/config_parse.py --links 20000`.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from dotbot.config import ConfigReader, describe_yaml_loader
+from dotbot.util import yaml_subset
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--links", type=int, default=10000, help="number of link entries")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed repetitions (the best is reported)")
+    args = parser.parse_args()
+
+    print(describe_yaml_loader())  # noqa: T201
+    document = yaml.dump(synthetic_config(args.links), default_flow_style=False)
+    print(f"Config: {args.links} links, {len(document.splitlines())} lines, {len(document)} bytes")  # noqa: T201
+
+    loaders: Dict[str, Callable[[str], Any]] = {
+        "SafeLoader": lambda text: yaml.load(text, Loader=yaml.SafeLoader),
+    }
+    if hasattr(yaml, "CSafeLoader"):
+        loaders["CSafeLoader"] = lambda text: yaml.load(text, Loader=yaml.CSafeLoader)
+    loaders["yaml_subset"] = yaml_subset.parse
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "install.conf.yaml")
+        with open(path, "w") as file:
+            file.write(document)
+        loaders["ConfigReader"] = lambda _: ConfigReader([path]).get_config()
+
+        expected = yaml.load(document, Loader=yaml.SafeLoader)
+        baseline = None
+        for name, load in loaders.items():
+            if load(document) != expected:
+                print(f"{name}: result differs from SafeLoader")  # noqa: T201
+                sys.exit(1)
+            elapsed = best_of(args.repeat, load, document)
+            if baseline is None:
+                baseline = elapsed
+            print(f"{name:>14}: {elapsed * 1000:10.1f} ms ({baseline / elapsed:5.1f}x)")  # noqa: T201
+
+
+def synthetic_config(links: int) -> List[Dict[str, Any]]:
+    """
+    Returns a configuration resembling a large generated one.
+    """
+    config: List[Dict[str, Any]] = [
+        {"defaults": {"link": {"create": True, "relink": True}, "shell": {"stdout": True}}},
+        {"clean": ["~", {"~/.config": {"recursive": True}}]},
+        {"create": {f"~/.local/share/app{i}": {"mode": 0o700} for i in range(links // 100 + 1)}},
+    ]
+    per_task = 500
+    for start in range(0, links, per_task):
+        entries: Dict[str, Any] = {}
+        for i in range(start, min(start + per_task, links)):
+            if i % 10 == 0:
+                entries[f"~/.config/app{i}/config"] = {"path": f"config/app{i}/config", "if": "[ `uname` = Linux ]"}
+            elif i % 10 == 1:
+                entries[f"~/.config/glob{i}/"] = {"glob": True, "path": f"config/glob{i}/*", "exclude": ["*.bak"]}
+            else:
+                entries[f"~/.dotfile{i}"] = f"dotfile{i}"
+        config.append({"link": entries})
+        config.append({"shell": [[f"echo task {start}", f"Running task {start}"], {"command": "true", "quiet": True}]})
+    return config
+
+
+def best_of(repeat: int, function: Callable[[str], Any], argument: str) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    main()
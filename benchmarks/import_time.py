@@ -0,0 +1,105 @@
+# noqa: INP001
+
+"""
+Benchmark the time it takes to import Dotbot, using `python -X importtime`.
+
+Run with, for example, `hatch run python benchmarks/import_time.py --budget 100`.
+The benchmark fails if importing Dotbot loads any of the modules that are
+only loaded on first use, or if it takes longer than the budget.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# modules that are only loaded when they are used, not when Dotbot starts
+DEFERRED = (
+    "dotbot.plugins.clean",
+    "dotbot.plugins.create",
+    "dotbot.plugins.link",
+    "dotbot.plugins.shell",
+    "dotbot.scheduler",
+    "concurrent.futures",
+    "datetime",
+    "glob",
+    "multiprocessing",
+    "pickle",
+    "shutil",
+    "tempfile",
+    "yaml",
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="dotbot.cli", help="module to import")
+    parser.add_argument("--repeat", type=int, default=10, help="number of timed repetitions (the best is reported)")
+    parser.add_argument("--top", type=int, default=10, help="number of the slowest imports to show")
+    parser.add_argument("--budget", type=float, help="fail if the import takes longer (in milliseconds)")
+    args = parser.parse_args()
+
+    # the first import compiles the bytecode, which later runs reuse
+    import_times(args.module)
+    runs = [import_times(args.module) for _ in range(max(args.repeat, 1))]
+    best = min(runs, key=lambda times: times[args.module][1])
+    total = best[args.module][1] / 1000
+
+    print(f"{args.module}: {total:.1f} ms, {len(best)} modules")  # noqa: T201
+    for name, (own, cumulative) in sorted(best.items(), key=lambda item: -item[1][0])[: args.top]:
+        print(f"{name:>40}: {own / 1000:6.1f} ms ({cumulative / 1000:6.1f} ms cumulative)")  # noqa: T201
+
+    failed = False
+    for name in loaded(best, DEFERRED):
+        print(f"{name} should not be imported at startup")  # noqa: T201
+        failed = True
+    if args.budget is not None and total > args.budget:
+        print(f"Import took longer than the budget of {args.budget:.1f} ms")  # noqa: T201
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+def import_times(module: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Imports the module in a new interpreter, and returns the time that each
+    imported module took to import, by itself and cumulatively (in
+    microseconds).
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SRC, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return parse_import_times(result.stderr)
+
+
+def parse_import_times(output: str) -> Dict[str, Tuple[int, int]]:
+    times: Dict[str, Tuple[int, int]] = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        if not own.strip().isdigit():
+            # the header
+            continue
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+
+def loaded(times: Dict[str, Tuple[int, int]], modules: Tuple[str, ...]) -> List[str]:
+    """
+    Returns the modules (or their submodules) that were imported.
+    """
+    return [name for name in modules if any(imported == name or imported.startswith(f"{name}.") for imported in times)]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# noqa: INP001
+
+"""
+Benchmark how long Dotbot takes to start running a configuration.
+
+Run with, for example, `hatch run python benchmarks/startup.py`. Dotbot is run
+through the `bin/dotbot` script, and through the installed `dotbot` console
+script (if there is one), on a configuration whose first task is a shell
+command that prints a marker; the time until the marker is printed is the
+time to the first task.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+BIN_DOTBOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bin", "dotbot")
+
+MARKER = "dotbot-first-task"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20, help="number of timed repetitions (the median is reported)")
+    parser.add_argument("--console-script", help="path of the console script (found on PATH by default)")
+    parser.add_argument("--budget", type=float, help="fail if the time to the first task is longer (in milliseconds)")
+    args = parser.parse_args()
+
+    commands: Dict[str, List[str]] = {"bin/dotbot": [BIN_DOTBOT]}
+    console_script = args.console_script or shutil.which("dotbot")
+    if console_script is not None:
+        commands["console script"] = [console_script]
+    else:
+        print("No dotbot console script found on PATH, skipping it")  # noqa: T201
+
+    failed = False
+    with tempfile.TemporaryDirectory() as home:
+        config = os.path.join(home, "install.conf.yaml")
+        with open(config, "w") as file:
+            file.write(f"- shell:\n    - command: echo {MARKER}\n      stdout: true\n")
+        env = dict(os.environ)
+        env["HOME"] = home
+        for name, command in commands.items():
+            # the first run compiles the bytecode, which later runs reuse
+            time_to_first_task([*command, "-c", config], env)
+            runs = [time_to_first_task([*command, "-c", config], env) for _ in range(max(args.repeat, 1))]
+            first_task = median([first for first, _ in runs]) * 1000
+            total = median([total for _, total in runs]) * 1000
+            print(f"{name:>15}: {first_task:6.1f} ms to the first task, {total:6.1f} ms in total")  # noqa: T201
+            if args.budget is not None and first_task > args.budget:
+                failed = True
+    if failed:
+        print(f"The time to the first task was longer than the budget of {args.budget:.1f} ms")  # noqa: T201
+        sys.exit(1)
+
+
+def time_to_first_task(command: List[str], env: Dict[str, str]) -> Tuple[float, float]:
+    """
+    Runs the command, and returns the time until it printed the marker, and
+    until it exited (in seconds).
+    """
+    start = time.perf_counter()
+    with subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True) as process:
+        assert process.stdout is not None  # noqa: S101 # stdout is a pipe
+        first_task = None
+        for line in process.stdout:
+            if first_task is None and line.strip() == MARKER:
+                first_task = time.perf_counter() - start
+    total = time.perf_counter() - start
+    if process.returncode != 0 or first_task is None:
+        msg = f"{' '.join(command)} failed"
+        raise RuntimeError(msg)
+    return first_task, total
+
+
+def median(values: List[float]) -> float:
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+if __name__ == "__main__":
+    main()
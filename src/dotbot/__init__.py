@@ -1,5 +1,26 @@
+import importlib
+from typing import TYPE_CHECKING, Any
+
 from dotbot.__about__ import __version__
-from dotbot.cli import main
-from dotbot.plugin import Plugin
+
+if TYPE_CHECKING:
+    from dotbot.cli import main
+    from dotbot.plugin import Plugin
 
 __all__ = ["Plugin", "__version__", "main"]
+
+
+def __getattr__(name: str) -> Any:
+    # the rest of the package is only loaded when it is used, to keep startup fast
+    if name == "main":
+        return importlib.import_module("dotbot.cli").main
+    if name == "Plugin":
+        return importlib.import_module("dotbot.plugin").Plugin
+    # submodules (e.g., dotbot.cli), which used to be imported along with the package
+    try:
+        return importlib.import_module(f"{__name__}.{name}")
+    except ModuleNotFoundError as e:
+        if e.name != f"{__name__}.{name}":
+            raise
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
@@ -1,15 +1,27 @@
+import hashlib
+import json
 import os
 import subprocess
 import sys
-from argparse import SUPPRESS, ArgumentParser, RawTextHelpFormatter
-from typing import Any, List
+from argparse import SUPPRESS, ArgumentParser, HelpFormatter, RawTextHelpFormatter
+from typing import Any, List, Optional
 
 import dotbot
-from dotbot.config import ConfigReader, ReadingError
+from dotbot.client import connect, split_connect
+from dotbot.config import STDIN, ConfigCache, ConfigReader, ReadingError, describe_yaml_loader
 from dotbot.dispatcher import Dispatcher, DispatchError
+from dotbot.filesystem import FileSystem, OperationCounter, Snapshot
+from dotbot.fingerprints import FingerprintStore
+from dotbot.generations import Generations, GenerationsError
+from dotbot.journal import Journal
+from dotbot.manifest import Manifest
 from dotbot.messenger import Level, Messenger
-from dotbot.plugins import Clean, Create, Link, Shell
-from dotbot.util import module
+from dotbot.plan import Plan, PlanCache, PlanError
+from dotbot.plugins import built_in_plugins
+from dotbot.profiler import Profiler
+from dotbot.tracing import Tracer
+from dotbot.util import module, string, xdg
+from dotbot.util.git import head_revision
 
 
 def add_options(parser: ArgumentParser) -> None:
@@ -26,7 +38,23 @@ def add_options(parser: ArgumentParser) -> None:
     )
     parser.add_argument("-d", "--base-directory", help="execute commands from within BASE_DIR", metavar="BASE_DIR")
     parser.add_argument(
-        "-c", "--config-file", help="run commands given in CONFIG_FILE", metavar="CONFIG_FILE", nargs="+"
+        "-c",
+        "--config-file",
+        help="run commands given in CONFIG_FILE\n(use - to read the configuration from standard input)",
+        metavar="CONFIG_FILE",
+        nargs="+",
+    )
+    parser.add_argument(
+        "--config-cache",
+        action="store_true",
+        help="cache parsed configuration files in the user cache directory",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="run each task as soon as it has been read, instead of\n"
+        "reading the entire configuration first; this is most useful\n"
+        "with multi-document YAML or JSON Lines (.jsonl) configs",
     )
     parser.add_argument(
         "-p",
@@ -38,6 +66,12 @@ def add_options(parser: ArgumentParser) -> None:
         metavar="PLUGIN",
     )
     parser.add_argument("--disable-built-in-plugins", action="store_true", help="disable built-in plugins")
+    parser.add_argument(
+        "--plugin-cache",
+        action="store_true",
+        help="remember which directives each plugin handles, in the\n"
+        "user cache directory, and only load the plugins that are used",
+    )
     parser.add_argument(
         "--plugin-dir",
         action="append",
@@ -52,6 +86,97 @@ def add_options(parser: ArgumentParser) -> None:
     parser.add_argument("--force-color", dest="force_color", action="store_true", help="force color output")
     parser.add_argument("--no-color", dest="no_color", action="store_true", help="disable color output")
     parser.add_argument("--version", action="store_true", help="show program's version number and exit")
+    parser.add_argument(
+        "--yaml-loader", action="store_true", help="show which YAML loader is used to parse configs and exit"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="run up to N independent parts of the configuration in\nparallel (shell commands always run on their own)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="skip actions that haven't changed since they last\nsucceeded, including their files and defaults",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="keep a journal of completed tasks, and skip the tasks that\n"
+        "the last run with --resume completed, if it failed and the\n"
+        "configuration hasn't changed since",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="keep a manifest of the symbolic links that Dotbot creates,\n"
+        "and remove the ones that are no longer in the configuration\n"
+        "or whose targets are gone",
+    )
+    parser.add_argument(
+        "--generations",
+        action="store_true",
+        help="point symbolic links into a generation of links to their\n"
+        "targets, which is activated all at once after a successful run",
+    )
+    parser.add_argument(
+        "--rollback",
+        action="store_true",
+        help="activate the generation that was active before the last\nrun with --generations, and exit",
+    )
+    parser.add_argument(
+        "--plan-cache",
+        action="store_true",
+        help="record the changes that a successful run makes, and make\n"
+        "them again instead of handling the configuration when the\n"
+        "configuration, the dotfiles revision, and the paths involved\n"
+        "are the same",
+    )
+    parser.add_argument(
+        "--plan-out",
+        help="write the changes that would be made to PLAN_FILE, without\nmaking them (implies --dry-run)",
+        metavar="PLAN_FILE",
+    )
+    parser.add_argument(
+        "--apply-plan",
+        help="make the changes in PLAN_FILE, which was written by\n--plan-out, without reading a configuration",
+        metavar="PLAN_FILE",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="show how long each task, action, and plugin took",
+    )
+    parser.add_argument(
+        "--profile-output",
+        help="write the timings to PROFILE_FILE as JSON (implies --profile)",
+        metavar="PROFILE_FILE",
+    )
+    parser.add_argument(
+        "--fs-stats",
+        action="store_true",
+        help="count the filesystem operations of each directive and entry",
+    )
+    parser.add_argument(
+        "--trace-out",
+        help="write a timeline of the run to TRACE_FILE, which can be\nopened in Perfetto or chrome://tracing",
+        metavar="TRACE_FILE",
+    )
+    parser.add_argument(
+        "--serve",
+        help="run configurations for clients that connect to the Unix\n"
+        "socket at SOCKET with --connect, keeping plugins and parsed\n"
+        "configuration files between runs",
+        metavar="SOCKET",
+    )
+    parser.add_argument(
+        "--connect",
+        help="run Dotbot with the other arguments on the server that\nlistens on SOCKET (see --serve)",
+        metavar="SOCKET",
+    )
     parser.add_argument(
         "-x",
         "--exit-on-failure",
@@ -61,35 +186,184 @@ def add_options(parser: ArgumentParser) -> None:
     )
 
 
-def read_config(config_files: List[str]) -> Any:
-    reader = ConfigReader(config_files)
+def build_parser() -> ArgumentParser:
+    # add_argument() checks each option by formatting it, and creating the help
+    # formatter is slow (it measures the terminal), so a formatter with a fixed
+    # width is used until the help itself is formatted
+    parser = ArgumentParser(formatter_class=_fixed_width_formatter)
+    add_options(parser)
+    parser.formatter_class = RawTextHelpFormatter
+    return parser
+
+
+def _fixed_width_formatter(prog: str) -> HelpFormatter:
+    return RawTextHelpFormatter(prog, width=80)
+
+
+def read_config(
+    config_files: List[str],
+    cache_directory: Optional[str] = None,
+    *,
+    stream: bool = False,
+    cache: Optional[ConfigCache] = None,
+) -> Any:
+    reader = ConfigReader(config_files, cache_directory, stream=stream, cache=cache)
     return reader.get_config()
 
 
-def main() -> None:
+def state_path(kind: str, config_files: List[str], base_directory: str) -> str:
+    """
+    Returns the path of the file where Dotbot stores the given kind of state
+    for runs of the given config files in the given base directory.
+    """
+    key = json.dumps([base_directory, [os.path.abspath(path) for path in config_files]])
+    return os.path.join(xdg.state_home(), kind, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+
+def git_revision(directory: str) -> Optional[str]:
+    """
+    Returns the commit that is checked out in the git repository containing
+    the directory, or None if there is none.
+    """
+    revision = head_revision(directory)
+    if revision is not None:
+        return revision
+    # e.g., a repository in a format that head_revision() can't read
+    try:
+        with open(os.devnull) as devnull:
+            return (
+                subprocess.check_output(
+                    ["git", "rev-parse", "HEAD"],  # noqa: S607
+                    cwd=directory,
+                    stderr=devnull,
+                )
+                .decode("ascii")
+                .strip()
+            )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def plan_cache_path(options: Any, base_directory: str) -> Optional[str]:
+    """
+    Returns the path of the cached plan for runs with the given options, or
+    None if runs can't be cached (e.g., if the dotfiles aren't in a git
+    repository, or the configuration is read from standard input).
+    """
+    revision = git_revision(base_directory)
+    if revision is None:
+        return None
+    key = hashlib.sha256()
+    for config_file in options.config_file:
+        if config_file == STDIN or not os.path.isfile(config_file):
+            return None
+        try:
+            with open(config_file, "rb") as file:
+                key.update(hashlib.sha256(file.read()).digest())
+        except OSError:
+            return None
+    # everything else that can change which operations a run makes
+    other = [
+        revision,
+        os.path.expanduser("~"),
+        base_directory,
+        options.only,
+        options.skip,
+        options.plugins,
+        options.plugin_dirs,
+        options.disable_built_in_plugins,
+        # shell commands show their output with -vv
+        options.verbose > 1,
+    ]
+    key.update(json.dumps(other).encode("utf-8", "surrogateescape"))
+    return os.path.join(xdg.cache_home(), "plans", key.hexdigest())
+
+
+def report_profile(profiler: Profiler, output: Optional[str]) -> None:
+    log = Messenger()
+    for line in profiler.summary():
+        log.action(line)
+    if output:
+        try:
+            profiler.write(output)
+        except OSError as e:
+            msg = f"Failed to write profile to {output}: {e}"
+            log.warning(msg)
+
+
+def write_trace(output: str) -> None:
+    tracer = Tracer()
+    try:
+        tracer.write(output)
+    except OSError as e:
+        msg = f"Failed to write trace to {output}: {e}"
+        Messenger().warning(msg)
+    finally:
+        tracer.stop()
+
+
+def apply_plan(path: str, *, exit_on_failure: bool) -> None:
+    plan = Plan.read(path)
+    if not plan.apply(FileSystem(), exit_on_failure=exit_on_failure):
+        msg = "Some tasks were not executed successfully"
+        raise DispatchError(msg)
+
+
+def write_plan(plan: Plan, path: str) -> None:
+    try:
+        plan.write(path)
+    except OSError as e:
+        msg = f"Could not write plan file:\n{string.indent_lines(str(e))}"
+        raise PlanError(msg) from e
+
+
+def main(
+    argv: Optional[List[str]] = None,
+    *,
+    config_cache: Optional[ConfigCache] = None,
+    plugin_cache: Optional[module.PluginCache] = None,
+) -> None:
+    """
+    Runs Dotbot with the given arguments (by default, those of the process).
+
+    Parsed configuration files and loaded plugins are kept in the given
+    caches, if any, for later runs (see dotbot.server).
+    """
     log = Messenger()
+    trace_out: Optional[str] = None
     try:
-        parser = ArgumentParser(formatter_class=RawTextHelpFormatter)
-        add_options(parser)
-        options = parser.parse_args()
+        connection = split_connect(sys.argv[1:] if argv is None else argv)
+        if connection is not None:
+            sys.exit(connect(*connection))
+        parser = build_parser()
+        options = parser.parse_args(argv)
         if options.version:
-            try:
-                with open(os.devnull) as devnull:
-                    git_hash = subprocess.check_output(
-                        ["git", "rev-parse", "HEAD"],  # noqa: S607
-                        cwd=os.path.dirname(os.path.abspath(__file__)),
-                        stderr=devnull,
-                    ).decode("ascii")
-                hash_msg = f" (git {git_hash[:10]})"
-            except (OSError, subprocess.CalledProcessError):
-                hash_msg = ""
+            git_hash = head_revision(os.path.dirname(os.path.abspath(__file__)))
+            hash_msg = "" if git_hash is None else f" (git {git_hash[:10]})"
             print(f"Dotbot version {dotbot.__version__}{hash_msg}")  # noqa: T201
             sys.exit(0)
+        if options.yaml_loader:
+            print(describe_yaml_loader())  # noqa: T201
+            sys.exit(0)
         if options.super_quiet or options.quiet:
             log.set_level(Level.WARNING)
         if options.verbose > 0:
             log.set_level(Level.INFO if options.verbose == 1 else Level.DEBUG)
 
+        if options.jobs < 1:
+            log.error("`--jobs` must be at least 1")
+            sys.exit(1)
+
+        if options.plan_cache and (options.incremental or options.resume):
+            # actions that are skipped wouldn't be part of the plan
+            log.error("`--plan-cache` cannot be combined with `--incremental` or `--resume`")
+            sys.exit(1)
+
+        if options.generations and (options.plan_cache or options.plan_out):
+            # generations are staged directly, not with operations
+            log.error("`--generations` cannot be combined with `--plan-cache` or `--plan-out`")
+            sys.exit(1)
+
         if options.force_color and options.no_color:
             log.error("`--force-color` and `--no-color` cannot both be provided")
             sys.exit(1)
@@ -100,24 +374,110 @@ def main() -> None:
         else:
             log.use_color(sys.stdout.isatty())
 
-        plugins = []
-        if not options.disable_built_in_plugins:
-            plugins.extend([Clean, Create, Link, Shell])
-        module.load_plugins(options.plugin_dirs, plugins)  # note, plugin_dirs is deprecated
-        module.load_plugins(options.plugins, plugins)
+        if options.serve:
+            if options.config_file:
+                log.error("`--serve` cannot be combined with a configuration file")
+                sys.exit(1)
+            # dotbot.server imports this module
+            from dotbot.server import Server, ServerError  # noqa: PLC0415
+
+            try:
+                Server(options.serve).serve()
+            except ServerError as e:
+                log.error(str(e))  # noqa: TRY400
+                sys.exit(1)
+            return
+
+        tracer = Tracer()
+        if options.trace_out:
+            trace_out = options.trace_out
+            tracer.start()
+
+        if options.apply_plan:
+            if options.config_file:
+                log.error("`--apply-plan` cannot be combined with a configuration file")
+                sys.exit(1)
+            apply_plan(options.apply_plan, exit_on_failure=options.exit_on_failure)
+            log.info("All tasks executed successfully")
+            return
 
         if not options.config_file:
             log.error("No configuration file specified")
             sys.exit(1)
-        tasks = read_config(options.config_file)
-        if not tasks:
-            log.warning("No tasks given in configuration, no work to do")
         if options.base_directory:
             base_directory = os.path.abspath(options.base_directory)
+        elif options.config_file[0] == STDIN or not os.path.isfile(options.config_file[0]):
+            # configs read from standard input or pipes have no directory of their own
+            base_directory = os.getcwd()
         else:
             # default to directory of first config file
             base_directory = os.path.dirname(os.path.abspath(options.config_file[0]))
+        generations_directory = state_path("generations", options.config_file, base_directory)
+        if options.rollback:
+            number = Generations(generations_directory).rollback()
+            log.action(f"Rolled back to generation {number}")
+            return
+        plan_cache = None
+        if options.plan_cache and not options.dry_run and not options.plan_out:
+            path = plan_cache_path(options, base_directory)
+            if path is not None:
+                plan_cache = PlanCache(path)
+                cached = plan_cache.load()
+                if cached is not None:
+                    log.info("Applying the cached plan")
+                    os.chdir(base_directory)
+                    if not cached.apply(FileSystem(), exit_on_failure=options.exit_on_failure):
+                        msg = "Some tasks were not executed successfully"
+                        raise DispatchError(msg)  # noqa: TRY301
+                    log.info("All tasks executed successfully")
+                    return
+            else:
+                log.debug("Not caching the plan, because the dotfiles aren't in a git repository")
+
+        plugins = []
+        if not options.disable_built_in_plugins:
+            plugins.extend(built_in_plugins())
+        plugin_manifest = None
+        if plugin_cache is None and options.plugin_cache:
+            plugin_manifest = module.PluginManifest(os.path.join(xdg.cache_home(), "plugins.json"))
+            plugin_cache = plugin_manifest
+        module.load_plugins(options.plugin_dirs, plugins, plugin_cache)  # note, plugin_dirs is deprecated
+        module.load_plugins(options.plugins, plugins, plugin_cache)
+        if plugin_manifest is not None:
+            plugin_manifest.save()
+
+        cache_directory = os.path.join(xdg.cache_home(), "config") if options.config_cache else None
+        with tracer.span("read configuration", "config"):
+            tasks = read_config(options.config_file, cache_directory, stream=options.stream, cache=config_cache)
+        if not options.stream and not tasks:
+            log.warning("No tasks given in configuration, no work to do")
         os.chdir(base_directory)
+        plan = None
+        snapshot = None
+        if options.plan_out:
+            options.dry_run = True
+            plan = Plan()
+        elif plan_cache is not None:
+            snapshot = Snapshot()
+            plan = Plan(preconditions=snapshot)
+        profiler = Profiler(options.jobs) if options.profile or options.profile_output else None
+        operation_counter = OperationCounter() if options.fs_stats else None
+        fingerprints = None
+        if options.incremental:
+            fingerprints = FingerprintStore(state_path("fingerprints", options.config_file, base_directory))
+        journal = None
+        if options.resume and not options.dry_run:
+            journal = Journal(
+                state_path("journal", options.config_file, base_directory), seed=[options.only, options.skip]
+            )
+        generations = None
+        if options.generations:
+            # runs that skip links keep the links of the current generation
+            partial = bool(options.only or options.skip or options.incremental or options.resume)
+            generations = Generations(generations_directory, partial=partial)
+        manifest = None
+        if options.prune:
+            manifest = Manifest(state_path("manifest", options.config_file, base_directory))
         dotbot.dispatcher._all_plugins = plugins  # for backwards compatibility, see dispatcher.py  # noqa: SLF001
         dispatcher = Dispatcher(
             base_directory,
@@ -126,19 +486,65 @@ def main() -> None:
             exit_on_failure=options.exit_on_failure,
             options=options,
             plugins=plugins,
+            jobs=options.jobs,
+            profiler=profiler,
+            operation_counter=operation_counter,
+            fingerprints=fingerprints,
+            journal=journal,
+            plan=plan,
+            snapshot=snapshot,
+            generations=generations,
+            manifest=manifest,
+            prune=options.prune,
         )
-        success = dispatcher.dispatch(tasks)
+        try:
+            with tracer.span("dispatch", "dispatch"):
+                success = dispatcher.dispatch(tasks)
+        finally:
+            if profiler is not None:
+                report_profile(profiler, options.profile_output)
+            if operation_counter is not None:
+                for line in operation_counter.summary():
+                    log.action(line)
+        if fingerprints is not None and not options.dry_run:
+            fingerprints.save(complete=success)
+        if journal is not None:
+            journal.finish(success=success)
+        if manifest is not None and not options.dry_run:
+            manifest.save()
+        if generations is not None:
+            if success:
+                activated = generations.activate()
+                if activated is not None:
+                    log.action(f"Activated generation {activated}")
+            else:
+                generations.discard()
+        if plan is not None and plan.omitted():
+            omitted = ", ".join(plan.omitted())
+            msg = f"The plan doesn't include the changes made by plugins {omitted}"
+            if plan_cache is not None:
+                log.debug(msg)
+            else:
+                log.warning(msg)
+        if plan is not None and success:
+            if options.plan_out:
+                write_plan(plan, options.plan_out)
+            elif plan_cache is not None and not plan.omitted():
+                plan_cache.save(plan)
         if success:
             log.info("All tasks executed successfully")
         else:
             msg = "Some tasks were not executed successfully"
             raise DispatchError(msg)  # noqa: TRY301
-    except (ReadingError, DispatchError) as e:
+    except (ReadingError, DispatchError, PlanError, GenerationsError) as e:
         log.error(str(e))  # noqa: TRY400
         sys.exit(1)
     except KeyboardInterrupt:
         log.error("Operation aborted")  # noqa: TRY400
         sys.exit(1)
+    finally:
+        if trace_out is not None:
+            write_trace(trace_out)
 
 
 if __name__ == "__main__":
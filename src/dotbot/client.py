@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+from typing import List, Optional, Tuple
+
+from dotbot.messenger import Messenger
+
+# This module is the client for `--connect`, which is loaded instead of the
+# rest of Dotbot (see bin/dotbot), so it should only import what it needs.
+
+
+def split_connect(arguments: List[str]) -> Optional[Tuple[str, List[str]]]:
+    """
+    Returns the socket given with `--connect`, and the other arguments, or
+    None if the arguments don't include `--connect`.
+    """
+    for index, argument in enumerate(arguments):
+        if argument == "--connect" and index + 1 < len(arguments):
+            return arguments[index + 1], arguments[:index] + arguments[index + 2 :]
+        if argument.startswith("--connect="):
+            return argument[len("--connect=") :], arguments[:index] + arguments[index + 1 :]
+    return None
+
+
+def connect(path: str, arguments: List[str]) -> int:
+    """
+    Runs Dotbot with the given arguments on the server listening on the
+    socket at the given path (see dotbot.server), and returns the exit status
+    of the run.
+
+    The server reads from and writes to the standard input, output, and error
+    of this process directly, so the output of the run appears as if Dotbot
+    ran here.
+    """
+    # socket is slow to import, and only needed to connect
+    import array  # noqa: PLC0415
+    import socket  # noqa: PLC0415
+
+    log = Messenger()
+    log.use_color(sys.stdout.isatty())
+    if not hasattr(socket, "AF_UNIX"):
+        log.error("`--connect` is not supported on this platform")
+        return 1
+    request = {"version": 1, "arguments": arguments, "cwd": os.getcwd(), "environment": dict(os.environ)}
+    data = json.dumps(request).encode("utf-8") + b"\n"
+    streams = array.array("i", [sys.stdin.fileno(), sys.stdout.fileno(), sys.stderr.fileno()])
+    # anything written before the server writes to the same file should come first
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(path)
+            sent = connection.sendmsg([data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, streams)])
+            if sent < len(data):
+                connection.sendall(data[sent:])
+            response = b""
+            while not response.endswith(b"\n"):
+                chunk = connection.recv(4096)
+                if not chunk:
+                    log.error("The server closed the connection before the run finished")
+                    return 1
+                response += chunk
+    except OSError as e:
+        msg = f"Could not connect to {path}: {e}"
+        log.error(msg)  # noqa: TRY400
+        return 1
+    except KeyboardInterrupt:
+        log.error("Operation aborted")  # noqa: TRY400
+        return 1
+    return int(json.loads(response)["status"])
+
+
+def main() -> None:
+    connection = split_connect(sys.argv[1:])
+    if connection is None:
+        Messenger().error("No socket specified with `--connect`")
+        sys.exit(1)
+    sys.exit(connect(*connection))
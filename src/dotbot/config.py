@@ -1,19 +1,72 @@
+import contextlib
+import hashlib
+import io
+import itertools
 import json
 import os.path
-from typing import Any, List
+import stat
+import sys
+from typing import IO, TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
 
-import yaml
+from dotbot.tracing import Tracer
+from dotbot.util import string, yaml_subset
+from dotbot.util.common import write_atomically
 
-from dotbot.util import string
+if TYPE_CHECKING:
+    from multiprocessing.context import BaseContext
+
+    import yaml
+
+# Below this total size, the cost of starting worker processes outweighs the
+# benefit of parsing config files in parallel.
+_PARALLEL_THRESHOLD = 256 * 1024
+
+# The stat result and contents of a config file that wasn't found in the cache.
+_Miss = Tuple[os.stat_result, bytes]
+
+# The config file path that refers to standard input.
+STDIN = "-"
+
+# Config file formats, by extension. Files with other extensions (and standard
+# input and pipes, which have no meaningful name) are detected from content.
+_FORMATS = {".json": "json", ".jsonl": "jsonl", ".ndjson": "jsonl", ".yaml": "yaml", ".yml": "yaml"}
 
 
 class ConfigReader:
     _config: List[Any]
+    _cache: "Optional[ConfigCache]"
+    _stream_paths: Optional[List[str]]
 
-    def __init__(self, config_file_paths: List[str]):
+    def __init__(
+        self,
+        config_file_paths: List[str],
+        cache_directory: Optional[str] = None,
+        *,
+        stream: bool = False,
+        cache: "Optional[ConfigCache]" = None,
+    ):
+        """
+        Reads the given config files. The path `-` refers to standard input,
+        and paths such as `/dev/fd/3` can be used to read from pipes.
+
+        Parsed config files are cached in the given cache, if any, or else in
+        the given cache directory, if any.
+
+        If stream is true, the config files are not read up front; instead,
+        get_config() returns an iterator that reads and parses the files
+        incrementally, yielding each task as soon as it has been parsed.
+        """
+        if config_file_paths.count(STDIN) > 1:
+            msg = "Standard input can only be read once"
+            raise ReadingError(msg)
         self._config = []
-        for path in config_file_paths:
-            config = self._read(path)
+        if cache is None and cache_directory is not None:
+            cache = ConfigCache(cache_directory)
+        self._cache = cache
+        self._stream_paths = config_file_paths if stream else None
+        if stream:
+            return
+        for config in self._read_all(config_file_paths):
             if config is None:
                 continue
             if not isinstance(config, list):
@@ -21,19 +74,396 @@ class ConfigReader:
                 raise ReadingError(msg)
             self._config.extend(config)
 
-    def _read(self, config_file_path: str) -> Any:
+    def _read_all(self, config_file_paths: List[str]) -> List[Any]:
+        """
+        Reads all of the config files, returning the configs in the same order.
+
+        Parsing is CPU-bound, so large configs that are split across multiple
+        files are parsed in parallel in separate processes. Parsed configs are
+        cached by this process, because the cache may be in its memory (e.g.,
+        with --serve).
+        """
+        if len(config_file_paths) > 1 and self._total_size(config_file_paths) >= _PARALLEL_THRESHOLD:
+            context = _process_context()
+        else:
+            context = None
+        results: Optional[List[Tuple[Any, Optional[_Miss]]]] = None
+        if context is not None:
+            # process pools are slow to import (they import multiprocessing), and rarely needed
+            from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+            from concurrent.futures.process import BrokenProcessPool  # noqa: PLC0415
+
+            workers = min(len(config_file_paths), os.cpu_count() or 1)
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                    results = list(executor.map(self._read, config_file_paths))
+            except (OSError, NotImplementedError, BrokenProcessPool):
+                # process pools are not supported everywhere (e.g., on systems
+                # without working semaphores); parse the files sequentially
+                pass
+        if results is None:
+            results = [self._read(path) for path in config_file_paths]
+        return [self._store(path, config, miss) for path, (config, miss) in zip(config_file_paths, results)]
+
+    def _total_size(self, config_file_paths: List[str]) -> int:
+        """
+        Returns the total size of the config files, or 0 if any of them is not
+        a regular file (e.g., standard input or a pipe), because those can
+        only be read once, by this process.
+        """
+        total = 0
+        for path in config_file_paths:
+            if path == STDIN:
+                return 0
+            try:
+                st = os.stat(path)
+            except OSError:
+                # let _read report the error
+                return 0
+            if not stat.S_ISREG(st.st_mode):
+                return 0
+            total += st.st_size
+        return total
+
+    def _read(self, config_file_path: str) -> Tuple[Any, Optional[_Miss]]:
+        with Tracer().span(f"read {_display_name(config_file_path)}", "config"):
+            return self._read_untraced(config_file_path)
+
+    def _read_untraced(self, config_file_path: str) -> Tuple[Any, Optional[_Miss]]:
+        """
+        Returns the config, and what _store() needs to cache it, if it was
+        parsed rather than found in the cache.
+        """
+        try:
+            with _open_config(config_file_path) as fin:
+                # the cache is keyed by path, which is meaningless for standard input
+                st = os.fstat(fin.fileno()) if self._cache is not None and config_file_path != STDIN else None
+                contents = fin.read()
+            if self._cache is None or st is None or not stat.S_ISREG(st.st_mode):
+                return self._parse(config_file_path, contents), None
+            hit, config = self._cache.load(config_file_path, st, contents)
+            if hit:
+                return config, None
+            config = self._parse(config_file_path, contents)
+        except Exception as e:
+            msg = string.indent_lines(str(e))
+            msg = f"Could not read config file:\n{msg}"
+            raise ReadingError(msg) from e
+        else:
+            return config, (st, contents)
+
+    def _store(self, config_file_path: str, config: Any, miss: Optional[_Miss]) -> Any:
+        if self._cache is not None and miss is not None:
+            st, contents = miss
+            self._cache.store(config_file_path, st, contents, config)
+        return config
+
+    def _parse(self, config_file_path: str, contents: bytes) -> Any:
+        text = contents.decode("utf-8")
+        config_format = _format(config_file_path)
+        if config_format is None:
+            if text.lstrip()[:1] not in {"{", "["}:
+                return self._parse_yaml(config_file_path, text)
+            # JSON is also valid YAML, but it's much faster to parse it as JSON
+            try:
+                return json.loads(text)
+            except json.JSONDecodeError:
+                pass
+            try:
+                return self._parse_json_lines(text.splitlines())
+            except ValueError:
+                return self._parse_yaml(config_file_path, text)
+        if config_format == "json":
+            return json.loads(text)
+        if config_format == "jsonl":
+            return self._parse_json_lines(text.splitlines())
+        return self._parse_yaml(config_file_path, text)
+
+    def _parse_json_lines(self, lines: Iterable[str]) -> List[Any]:
+        """
+        Parses a JSON Lines config, where each line is a task or a list of tasks.
+        """
+        config: List[Any] = []
+        for document in self._json_lines(lines):
+            if isinstance(document, list):
+                config.extend(document)
+            else:
+                config.append(document)
+        return config
+
+    def _parse_yaml(self, config_file_path: str, text: str, first_line: int = 0) -> Any:
+        """
+        Parses a YAML document that starts at the given (zero-based) line of the
+        config file.
+        """
+        try:
+            # most configs only use a small subset of YAML, which can be parsed
+            # much faster than with a general-purpose YAML parser
+            return yaml_subset.parse(text)
+        except yaml_subset.UnsupportedSyntaxError:
+            pass
+        # PyYAML is slow to import, and only needed for configs outside of the subset
+        import yaml  # noqa: PLC0415
+
+        # pad the document so that errors refer to the line in the config file
+        text = "\n" * first_line + text
+        return yaml.load(_NamedStringIO(text, _display_name(config_file_path)), Loader=yaml_loader())  # noqa: S506 # always a safe loader
+
+    def _stream(self, config_file_paths: List[str]) -> Iterator[Any]:
+        tracer = Tracer()
+        for path in config_file_paths:
+            for config in tracer.iterate(self._read_documents(path), f"read {_display_name(path)}", "config"):
+                if config is None:
+                    continue
+                if isinstance(config, dict):
+                    # when streaming, documents may also be individual tasks
+                    yield config
+                elif isinstance(config, list):
+                    yield from config
+                else:
+                    msg = "Configuration file must be a list of tasks"
+                    raise ReadingError(msg)
+
+    def _read_documents(self, config_file_path: str) -> Iterator[Any]:
+        """
+        Incrementally reads a config file, yielding each document as soon as it
+        has been parsed: each line of a JSON Lines file, or each document of a
+        multi-document YAML file.
+        """
         try:
-            _, ext = os.path.splitext(config_file_path)
-            with open(config_file_path, encoding="utf-8") as fin:
-                return json.load(fin) if ext == ".json" else yaml.safe_load(fin)
+            with _open_config(config_file_path) as binary:
+                fin = io.TextIOWrapper(binary, encoding="utf-8")
+                try:
+                    yield from self._read_text_documents(config_file_path, fin)
+                finally:
+                    # leave closing the underlying file (which may be standard input) to _open_config
+                    fin.detach()
         except Exception as e:
             msg = string.indent_lines(str(e))
             msg = f"Could not read config file:\n{msg}"
             raise ReadingError(msg) from e
 
+    def _read_text_documents(self, config_file_path: str, fin: Iterable[str]) -> Iterator[Any]:
+        config_format = _format(config_file_path)
+        if config_format is None:
+            # detect the format from the first non-blank line, which is
+            # available without waiting for the rest of the input
+            fin = iter(fin)
+            blank = []
+            first = ""
+            for line in fin:
+                if line.strip():
+                    first = line
+                    break
+                blank.append(line)
+            lines = itertools.chain(blank, [first], fin)
+            config_format = "yaml"
+            if first.lstrip()[:1] in {"{", "["}:
+                try:
+                    json.loads(first)
+                    config_format = "jsonl"
+                except json.JSONDecodeError:
+                    # a multi-line JSON document (or a YAML flow collection), which
+                    # cannot be parsed until it has been read completely
+                    yield self._parse(config_file_path, "".join(lines).encode("utf-8"))
+                    return
+            fin = lines
+        if config_format == "json":
+            yield json.loads("".join(fin))
+        elif config_format == "jsonl":
+            yield from self._json_lines(fin)
+        else:
+            yield from self._read_yaml_documents(config_file_path, fin)
+
+    def _json_lines(self, lines: Iterable[str]) -> Iterator[Any]:
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                msg = f"{e.msg}: line {number} column {e.colno}"
+                raise ValueError(msg) from e
+
+    def _read_yaml_documents(self, config_file_path: str, fin: Iterable[str]) -> Iterator[Any]:
+        lines: List[str] = []
+        first_line = 0
+        for number, line in enumerate(fin):
+            if not _is_document_marker(line):
+                lines.append(line)
+                continue
+            yield self._parse_yaml(config_file_path, "".join(lines), first_line)
+            lines = []
+            first_line = number + 1
+            if line.startswith("---") and line[3:].strip():
+                # the document starts on the same line as the marker, e.g., `--- |`
+                lines.append(line)
+                first_line = number
+        yield self._parse_yaml(config_file_path, "".join(lines), first_line)
+
     def get_config(self) -> Any:
+        if self._stream_paths is not None:
+            return self._stream(self._stream_paths)
         return self._config
 
 
+@contextlib.contextmanager
+def _open_config(config_file_path: str) -> Iterator[IO[bytes]]:
+    if config_file_path == STDIN:
+        yield sys.stdin.buffer
+    else:
+        with open(config_file_path, "rb") as fin:
+            yield fin
+
+
+def _format(config_file_path: str) -> Optional[str]:
+    """
+    Returns the format of the config file based on its extension, or None if
+    the format should be detected from the content.
+    """
+    if config_file_path == STDIN:
+        return None
+    _, ext = os.path.splitext(config_file_path)
+    return _FORMATS.get(ext)
+
+
+def _process_context() -> "Optional[BaseContext]":
+    """
+    Returns the context to start the processes that parse config files with,
+    or None if config files should be parsed sequentially.
+
+    Only forked processes are used. Processes started any other way (e.g., by
+    default on macOS and Windows) import the main module again, and scripts
+    that run Dotbot, such as install scripts, may not guard against that.
+    """
+    import multiprocessing  # noqa: PLC0415 # slow to import, and rarely needed
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork")
+
+
+def _display_name(config_file_path: str) -> str:
+    return "<stdin>" if config_file_path == STDIN else config_file_path
+
+
+def _is_document_marker(line: str) -> bool:
+    """
+    Returns true if the line is a YAML document start (`---`) or document end
+    (`...`) marker.
+    """
+    return line.startswith(("---", "...")) and line[3:4] in {"", " ", "\t", "\r", "\n"}
+
+
+def yaml_loader() -> "Union[Type[yaml.CSafeLoader], Type[yaml.SafeLoader]]":
+    """
+    Returns the loader used to parse YAML configuration files.
+
+    This is the libyaml-based loader when PyYAML was built with libyaml, which
+    is much faster, and the pure-Python loader (e.g., the vendored copy of
+    PyYAML that the `bin/dotbot` script uses) otherwise.
+    """
+    import yaml  # noqa: PLC0415 # see _parse_yaml()
+
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def describe_yaml_loader() -> str:
+    """
+    Returns a human-readable description of the YAML loader in use.
+    """
+    import yaml  # noqa: PLC0415 # see _parse_yaml()
+
+    loader = yaml_loader()
+    kind = "libyaml" if loader is getattr(yaml, "CSafeLoader", None) else "pure Python"
+    return f"PyYAML {yaml.__version__} from {os.path.dirname(yaml.__file__)}, using {loader.__name__} ({kind})"
+
+
+class ConfigCache:
+    """
+    On-disk cache of parsed configuration files.
+
+    Entries are keyed by the absolute path of the configuration file, and an
+    entry is only used if the size, modification time, and content hash of the
+    file all match. A missing, stale, or corrupted entry is treated as a miss.
+    """
+
+    _version = 1
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    def load(self, path: str, stat: os.stat_result, contents: bytes) -> Tuple[bool, Any]:
+        """
+        Returns whether the cache has a valid entry for the file, and if so, the
+        parsed configuration.
+        """
+        import pickle  # noqa: PLC0415 # only needed with --config-cache
+
+        try:
+            key, config = pickle.loads(self._read_entry(path))  # noqa: S301 # the cache is user-owned
+        except Exception:  # noqa: BLE001 # corruption can surface as almost any exception
+            return False, None
+        if key != self._key(path, stat, contents):
+            return False, None
+        return True, config
+
+    def store(self, path: str, stat: os.stat_result, contents: bytes, config: Any) -> None:
+        """
+        Stores the parsed configuration for the file. Failures are ignored.
+        """
+        import pickle  # noqa: PLC0415 # only needed with --config-cache
+
+        data = pickle.dumps((self._key(path, stat, contents), config), protocol=pickle.HIGHEST_PROTOCOL)
+        with contextlib.suppress(OSError):
+            self._write_entry(path, data)
+
+    def _read_entry(self, path: str) -> bytes:
+        with open(self._entry_path(path), "rb") as fin:
+            return fin.read()
+
+    def _write_entry(self, path: str, data: bytes) -> None:
+        write_atomically(self._entry_path(path), data)
+
+    def _entry_path(self, path: str) -> str:
+        name = hashlib.sha256(os.path.abspath(path).encode("utf-8")).hexdigest()
+        return os.path.join(self._directory, f"{name}.pickle")
+
+    def _key(self, path: str, stat: os.stat_result, contents: bytes) -> Tuple[Any, ...]:
+        digest = hashlib.sha256(contents).hexdigest()
+        return (self._version, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest)
+
+
+class MemoryConfigCache(ConfigCache):
+    """
+    In-memory cache of parsed configuration files, for processes that read
+    the same configuration files many times (e.g., `--serve`).
+
+    Entries are stored pickled, like on disk, so that every run gets its own
+    copy of the configuration.
+    """
+
+    def __init__(self) -> None:
+        super().__init__("")
+        self._entries: Dict[str, bytes] = {}
+
+    def _read_entry(self, path: str) -> bytes:
+        return self._entries[os.path.abspath(path)]
+
+    def _write_entry(self, path: str, data: bytes) -> None:
+        self._entries[os.path.abspath(path)] = data
+
+
+class _NamedStringIO(io.StringIO):
+    """
+    An in-memory text stream with a name, so that parse errors refer to the
+    configuration file rather than to an anonymous string.
+    """
+
+    def __init__(self, value: str, name: str):
+        super().__init__(value, newline=None)
+        self.name = name
+
+
 class ReadingError(Exception):
     pass
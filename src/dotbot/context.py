@@ -1,7 +1,15 @@
+import contextlib
 import copy
 import os
+import threading
 from argparse import Namespace
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Mapping, NoReturn, Optional, Tuple, Type
+
+from dotbot.filesystem import FileSystem
+from dotbot.generations import Generations
+from dotbot.manifest import Manifest
+from dotbot.plan import Operation, Plan, perform
 
 if TYPE_CHECKING:
     from dotbot.plugin import Plugin
@@ -13,12 +21,27 @@ class Context:
     """
 
     def __init__(
-        self, base_directory: str, options: Optional[Namespace] = None, plugins: "Optional[List[Type[Plugin]]]" = None
+        self,
+        base_directory: str,
+        options: Optional[Namespace] = None,
+        plugins: "Optional[List[Type[Plugin]]]" = None,
+        plan: Optional[Plan] = None,
+        generations: Optional[Generations] = None,
+        manifest: Optional[Manifest] = None,
     ):
         self._base_directory = base_directory
-        self._defaults: Dict[str, Any] = {}
+        self._local = threading.local()
+        self.set_defaults({})
         self._options = options if options is not None else Namespace()
+        self._options_view = _ReadOnlyNamespace(self._options)
         self._plugins = plugins
+        self._filesystem = FileSystem()
+        # in a dry run, operations are added to a plan instead of being performed
+        if plan is None and getattr(self._options, "dry_run", False):
+            plan = Plan()
+        self._plan = plan
+        self._generations = generations
+        self._manifest = manifest
 
     def set_base_directory(self, base_directory: str) -> None:
         self._base_directory = base_directory
@@ -26,21 +49,157 @@ class Context:
     def base_directory(self, canonical_path: bool = True) -> str:  # noqa: FBT001, FBT002 # part of established public API
         base_directory = self._base_directory
         if canonical_path:
-            base_directory = os.path.realpath(base_directory)
+            base_directory = self._filesystem.realpath(base_directory)
         return base_directory
 
     def set_defaults(self, defaults: Dict[str, Any]) -> None:
-        self._defaults = defaults
+        self._defaults: Tuple[Dict[str, Any], Mapping[str, Any]] = (defaults, _freeze(defaults))
+        self._last_scoped_defaults = self._defaults
+
+    @contextlib.contextmanager
+    def scoped_defaults(self, defaults: Dict[str, Any]) -> Iterator[None]:
+        """
+        Uses the given defaults in the current thread only, for the duration
+        of the with statement.
+
+        This is used to run directives in parallel, each with the defaults
+        that were set when the directive appeared in the config.
+        """
+        # avoid freezing the same defaults over and over again
+        scoped = self._defaults if defaults is self._defaults[0] else self._last_scoped_defaults
+        if defaults is not scoped[0]:
+            scoped = (defaults, _freeze(defaults))
+            self._last_scoped_defaults = scoped
+        self._local.defaults = scoped
+        try:
+            yield
+        finally:
+            self._local.defaults = None
 
     def defaults(self) -> Dict[str, Any]:
-        return copy.deepcopy(self._defaults)
+        """
+        Returns a copy of the defaults, which the caller may modify.
+
+        Plugins that only read the defaults should use defaults_view() instead,
+        which does not copy them.
+        """
+        return copy.deepcopy(self._current_defaults()[0])
+
+    def defaults_view(self) -> Mapping[str, Any]:
+        """
+        Returns a read-only view of the defaults.
+
+        Nested mappings are read-only as well, and lists are tuples.
+        """
+        return self._current_defaults()[1]
+
+    def _current_defaults(self) -> Tuple[Dict[str, Any], Mapping[str, Any]]:
+        scoped: Optional[Tuple[Dict[str, Any], Mapping[str, Any]]] = getattr(self._local, "defaults", None)
+        return scoped if scoped is not None else self._defaults
 
     def options(self) -> Namespace:
+        """
+        Returns a copy of the command-line options, which the caller may modify.
+
+        Plugins that only read the options should use options_view() instead,
+        which does not copy them.
+        """
         return copy.deepcopy(self._options)
 
+    def options_view(self) -> Namespace:
+        """
+        Returns a read-only view of the command-line options.
+        """
+        return self._options_view
+
     def plugins(self) -> "Optional[List[Type[Plugin]]]":
         # shallow copy is ok here
         return copy.copy(self._plugins)
 
+    def filesystem(self) -> FileSystem:
+        """
+        Returns the filesystem, which caches filesystem metadata for the
+        duration of the run.
+
+        Plugins that make changes to the filesystem should make them through
+        the returned object, or invalidate its cache afterwards.
+        """
+        return self._filesystem
+
     def dry_run(self) -> bool:
         return bool(self._options.dry_run)
+
+    def generations(self) -> Optional[Generations]:
+        """
+        Returns the generations that symbolic links should point into, or
+        None if links should point at their targets directly.
+        """
+        return self._generations
+
+    def manifest(self) -> Optional[Manifest]:
+        """
+        Returns the manifest that symbolic links should be recorded in, or
+        None if they aren't recorded.
+        """
+        return self._manifest
+
+    def planned(self, path: str) -> Optional[bool]:
+        """
+        In a dry run, returns whether the path would exist after the
+        operations that were planned so far, or None if they don't affect it
+        (or if this isn't a dry run), in which case the filesystem tells.
+        """
+        if self._plan is None or not self.dry_run():
+            return None
+        return self._plan.planned(os.path.abspath(os.path.expanduser(path)))
+
+    def perform(self, operation: Operation) -> bool:
+        """
+        Performs the operation, logging what was done, and returns whether it
+        succeeded.
+
+        In a dry run, the operation is added to the plan instead, logging what
+        would be done, and is assumed to succeed. Otherwise, if there is a
+        plan, the operation is recorded in it.
+        """
+        if self._plan is None:
+            return perform(operation, self._filesystem)
+        if self.dry_run():
+            self._plan.add(operation)
+            return True
+        self._plan.record(operation)
+        return perform(operation, self._filesystem)
+
+
+class _ReadOnlyNamespace(Namespace):
+    """
+    A namespace whose attributes cannot be set or deleted.
+
+    Attribute values are frozen with _freeze().
+    """
+
+    def __init__(self, namespace: Namespace):
+        for name, value in vars(namespace).items():
+            object.__setattr__(self, name, _freeze(value))
+
+    def __setattr__(self, name: str, value: Any) -> NoReturn:
+        msg = "options are read-only"
+        raise AttributeError(msg)
+
+    def __delattr__(self, name: str) -> NoReturn:
+        msg = "options are read-only"
+        raise AttributeError(msg)
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Returns a read-only version of the value: dicts become read-only mappings,
+    lists become tuples, and sets become frozensets, recursively.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
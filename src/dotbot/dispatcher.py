@@ -1,12 +1,24 @@
+import functools
 import os
 from argparse import Namespace
-from typing import Any, Dict, List, Optional, Type
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
 
 from dotbot.context import Context
+from dotbot.filesystem import OperationCounter, Snapshot
+from dotbot.fingerprints import FingerprintStore
+from dotbot.generations import Generations
+from dotbot.journal import Journal
+from dotbot.manifest import Manifest
 from dotbot.messenger import Messenger
+from dotbot.plan import Operation, Plan
 from dotbot.plugin import Plugin
+from dotbot.profiler import Profiler
+from dotbot.tracing import Tracer
 from dotbot.util.module import load_plugins
 
+if TYPE_CHECKING:
+    from dotbot.scheduler import Scheduler
+
 # Before b5499c7dc5b300462f3ce1c2a3d9b7a76233b39b, Dispatcher auto-loaded all
 # plugins, but after that change, plugins are passed in explicitly (and loaded
 # in cli.py). There are some plugins that rely on the old Dispatcher behavior,
@@ -25,36 +37,75 @@ class Dispatcher:
         exit_on_failure: bool = False,  # noqa: FBT001, FBT002 part of established public API
         options: Optional[Namespace] = None,
         plugins: Optional[List[Type[Plugin]]] = None,
+        jobs: int = 1,
+        profiler: Optional[Profiler] = None,
+        operation_counter: Optional[OperationCounter] = None,
+        fingerprints: Optional[FingerprintStore] = None,
+        journal: Optional[Journal] = None,
+        plan: Optional[Plan] = None,
+        snapshot: Optional[Snapshot] = None,
+        generations: Optional[Generations] = None,
+        manifest: Optional[Manifest] = None,
+        prune: bool = False,  # noqa: FBT001, FBT002 consistent with exit_on_failure
     ):
         # if the caller wants no plugins, the caller needs to explicitly pass in
         # plugins=[]
         self._log = Messenger()
-        self._setup_context(base_directory, options, plugins)
+        self._setup_context(base_directory, options, plugins, plan, generations, manifest)
         if plugins is None:
             plugins = _all_plugins
         self._plugins = [plugin(self._context) for plugin in plugins]
+        self._index_plugins()
         self._only = only
         self._skip = skip
         self._exit = exit_on_failure
         self._dry_run: bool = options is not None and bool(options.dry_run)
+        self._jobs = jobs
+        self._profiler = profiler
+        self._tracer = Tracer()
+        self._fingerprints = fingerprints
+        self._journal = journal
+        self._plan = plan
+        self._manifest = manifest
+        self._prune = prune
+        if operation_counter is not None:
+            self._context.filesystem().count_operations(operation_counter)
+        if snapshot is not None:
+            self._context.filesystem().take_snapshot(snapshot)
 
     def _setup_context(
-        self, base_directory: str, options: Optional[Namespace], plugins: Optional[List[Type[Plugin]]]
+        self,
+        base_directory: str,
+        options: Optional[Namespace],
+        plugins: Optional[List[Type[Plugin]]],
+        plan: Optional[Plan] = None,
+        generations: Optional[Generations] = None,
+        manifest: Optional[Manifest] = None,
     ) -> None:
         path = os.path.abspath(os.path.expanduser(base_directory))
         if not os.path.exists(path):
             msg = "Nonexistent base directory"
             raise DispatchError(msg)
-        self._context = Context(path, options, plugins)
+        self._context = Context(path, options, plugins, plan, generations, manifest)
+
+    def dispatch(self, tasks: Iterable[Dict[str, Any]]) -> bool:
+        if self._profiler is not None:
+            tasks = self._profiler.tasks(tasks)
+        success = self._dispatch_parallel(tasks) if self._jobs > 1 else self._dispatch_sequential(tasks)
+        if success and self._prune and self._manifest is not None:
+            with self._tracer.span("prune", "dispatch"):
+                success = self._prune_links(self._manifest)
+        return success
 
-    def dispatch(self, tasks: List[Dict[str, Any]]) -> bool:
+    def _dispatch_sequential(self, tasks: Iterable[Dict[str, Any]]) -> bool:
         success = True
-        for task in tasks:
-            for action in task:
-                if (
-                    (self._only is not None and action not in self._only)
-                    or (self._skip is not None and action in self._skip)
-                ) and action != "defaults":
+        for index, task in enumerate(tasks):
+            if self._journal is not None and self._journal.start(task):
+                success &= self._fast_forward(index, task)
+                self._journal.record(index + 1)
+                continue
+            for action in self._actions(task):
+                if self._excluded(action):
                     self._log.info(f"Skipping action {action}")
                     continue
                 handled = False
@@ -63,18 +114,7 @@ class Dispatcher:
                     handled = True
                     # keep going, let other plugins handle this if they want
                 if action == "plugins":
-                    for plugin_path in task[action]:
-                        try:
-                            # load the new plugins and add them to the list of plugins
-                            # this mutates self._context._plugins; we don't add a setter method
-                            # to Context because we don't want plugins to call it
-                            new_plugins = load_plugins([plugin_path], self._context._plugins)  # noqa: SLF001
-                            for plugin_class in new_plugins:
-                                self._plugins.append(plugin_class(self._context))
-                        except Exception as err:  # noqa: BLE001
-                            self._log.warning(f"Failed to load plugin '{plugin_path}'")
-                            self._log.debug(str(err))
-                            success = False
+                    success &= self._load_plugins(task[action])
                     if not success:
                         self._log.error("Some plugins could not be loaded")
                         if self._exit:
@@ -82,32 +122,334 @@ class Dispatcher:
                             return False
                     handled = True
                     # keep going, let other plugins handle this if they want
-                for plugin in self._plugins:
-                    if plugin.can_handle(action):
+                for plugin in self._plugins_for(action):
+                    if self._dry_run and not plugin.supports_dry_run:
+                        self._log.action(f"Skipping dry-run-unaware plugin {plugin.__class__.__name__}")
+                        handled = True
+                        continue
+                    if self._unchanged(plugin, action, task[action]):
+                        handled = True
+                        continue
+                    local_success = self._handle(plugin, action, task[action])
+                    if local_success is None:
+                        if self._exit:
+                            # There was an exception, exit
+                            return False
+                        continue
+                    if not local_success and self._exit:
+                        # The action has failed, exit
+                        self._log.error(f"Action {action} failed")
+                        return False
+                    success &= local_success
+                    handled = True
+                    if local_success:
+                        self._record_fingerprint(plugin, action, task[action])
+                # plugins that don't use the filesystem cache may have changed the filesystem
+                self._context.filesystem().invalidate()
+                if not handled:
+                    success = False
+                    self._log.error(f"Action {action} not handled")
+                    if self._exit:
+                        # Invalid action exit
+                        return False
+            if success and self._journal is not None:
+                self._journal.record(index + 1)
+        return success
+
+    def _dispatch_parallel(self, tasks: Iterable[Dict[str, Any]]) -> bool:
+        """
+        Like dispatch(), but handles independent parts of actions in parallel.
+
+        Actions are split into parts with Plugin.partition(), and parts that
+        touch overlapping paths are handled in order. Actions that can't be
+        split (e.g., shell commands) are handled after everything before them
+        has finished, and before anything after them starts.
+        """
+        # the scheduler imports concurrent.futures, which is slow, and sequential runs don't need it
+        from dotbot.scheduler import Scheduler  # noqa: PLC0415
+
+        scheduler = Scheduler(self._jobs, stop_on_failure=self._exit, plan=self._plan)
+        defaults: Dict[str, Any] = {}
+        success = True
+        started = 0
+        try:
+            for task in tasks:
+                started += 1
+                if self._journal is not None and self._journal.start(task):
+                    # only a prefix of the tasks can be skipped, so nothing is running yet
+                    success &= self._fast_forward(started - 1, task)
+                    defaults = task.get("defaults", defaults)
+                    self._journal.record(started)
+                    continue
+                for action in self._actions(task):
+                    if self._excluded(action):
+                        scheduler.submit(
+                            functools.partial(self._log_unit, self._log.info, f"Skipping action {action}"), []
+                        )
+                        continue
+                    handled = False
+                    if action == "defaults":
+                        defaults = task[action]
+                        self._context.set_defaults(defaults)  # replace, not update
+                        handled = True
+                    if action == "plugins":
+                        success = self._drain(scheduler, started - 1, success=success)
+                        if scheduler.stopped:
+                            return False
+                        if not self._load_plugins(task[action]):
+                            success = False
+                            self._log.error("Some plugins could not be loaded")
+                            if self._exit:
+                                self._log.error("Action plugins failed")
+                                return False
+                        handled = True
+                    for plugin in self._plugins_for(action):
                         if self._dry_run and not plugin.supports_dry_run:
-                            self._log.action(f"Skipping dry-run-unaware plugin {plugin.__class__.__name__}")
+                            message = f"Skipping dry-run-unaware plugin {plugin.__class__.__name__}"
+                            scheduler.submit(functools.partial(self._log_unit, self._log.action, message), [])
                             handled = True
                             continue
-                        try:
-                            local_success = plugin.handle(action, task[action])
-                            if not local_success and self._exit:
-                                # The action has failed, exit
-                                self._log.error(f"Action {action} failed")
+                        if self._fingerprints is not None:
+                            # the fingerprint must reflect what everything before the action did
+                            success = self._drain(scheduler, started - 1, success=success)
+                            if scheduler.stopped:
                                 return False
-                            success &= local_success
+                            if self._unchanged(plugin, action, task[action]):
+                                handled = True
+                                continue
+                        try:
+                            parts = plugin.partition(action, task[action])
+                        except Exception:  # noqa: BLE001
+                            # let handle() report the problem
+                            parts = None
+                        if parts is not None:
+                            results: List[bool] = []
+                            for data, paths in parts:
+                                scheduler.submit(
+                                    functools.partial(self._handle_part, plugin, action, data, defaults, results),
+                                    paths,
+                                )
                             handled = True
-                        except Exception as err:  # noqa: BLE001
-                            self._log.error(f"An error was encountered while executing action {action}")
-                            self._log.debug(str(err))
+                            if self._fingerprints is not None:
+                                # and so must the fingerprint that is recorded afterward
+                                success = self._drain(scheduler, started - 1, success=success)
+                                if scheduler.stopped:
+                                    return False
+                                if all(results):
+                                    self._record_fingerprint(plugin, action, task[action])
+                            continue
+                        success = self._drain(scheduler, started - 1, success=success)
+                        if scheduler.stopped:
+                            return False
+                        local_success = self._handle(plugin, action, task[action])
+                        self._context.filesystem().invalidate()
+                        if local_success is None:
                             if self._exit:
-                                # There was an exception, exit
                                 return False
-                if not handled:
-                    success = False
-                    self._log.error(f"Action {action} not handled")
-                    if self._exit:
-                        # Invalid action exit
+                            continue
+                        if not local_success and self._exit:
+                            self._log.error(f"Action {action} failed")
+                            return False
+                        success &= local_success
+                        handled = True
+                        if local_success:
+                            self._record_fingerprint(plugin, action, task[action])
+                    if not handled:
+                        message = f"Action {action} not handled"
+                        scheduler.submit(functools.partial(self._log_unit, self._log.error, message, success=False), [])
+                    if scheduler.stopped:
+                        scheduler.drain()
                         return False
+            success = self._drain(scheduler, started, success=success)
+        finally:
+            scheduler.shutdown()
+        return success and not scheduler.stopped
+
+    def _prune_links(self, manifest: Manifest) -> bool:
+        """
+        Removes the links in the manifest that are no longer in the
+        configuration, or whose targets are gone, only examining the links in
+        the manifest.
+
+        Links that are no longer in the configuration can only be told apart
+        after a run that handled the whole configuration; other runs only
+        remove links whose targets are gone.
+        """
+        complete = self._only is None and self._skip is None and self._fingerprints is None and self._journal is None
+        filesystem = self._context.filesystem()
+        success = True
+        for path, target, added in manifest.links():
+            try:
+                ours = filesystem.islink(path) and filesystem.readlink(path) == target
+            except OSError:
+                ours = False
+            if not ours:
+                # the link was removed or replaced by someone else, so it's no longer ours to remove
+                manifest.discard(path)
+                continue
+            if added or not complete:
+                if filesystem.exists(path):
+                    continue
+                reason = "invalid"
+            else:
+                reason = "stale"
+            removed = self._context.perform(
+                Operation(
+                    "unlink",
+                    {"path": path},
+                    planned=f"Would remove {reason} link {path} -> {target}",
+                    performed=f"Removing {reason} link {path} -> {target}",
+                    failed=f"Failed to remove {reason} link {path}",
+                )
+            )
+            if removed and not self._dry_run:
+                manifest.discard(path)
+            success &= removed
+        return success
+
+    def _drain(self, scheduler: "Scheduler", completed: int, *, success: bool) -> bool:
+        """
+        Waits for the scheduled parts to finish, and returns whether
+        everything so far succeeded, in which case the first completed tasks
+        are recorded in the journal.
+        """
+        success &= scheduler.drain()
+        if success and self._journal is not None:
+            self._journal.record(completed)
+        return success
+
+    def _excluded(self, action: str) -> bool:
+        return (
+            (self._only is not None and action not in self._only) or (self._skip is not None and action in self._skip)
+        ) and action != "defaults"
+
+    def _fast_forward(self, index: int, task: Dict[str, Any]) -> bool:
+        """
+        Skips a task that was completed by the run that is being resumed,
+        except for setting defaults and loading plugins, which later tasks
+        depend on.
+        """
+        self._log.info(f"Skipping task {index}, which was completed by an earlier run")
+        success = True
+        for action, data in task.items():
+            if action == "defaults":
+                self._context.set_defaults(data)
+            elif action == "plugins" and not self._excluded(action):
+                success &= self._load_plugins(data)
+        return success
+
+    def _actions(self, task: Dict[str, Any]) -> Iterable[str]:
+        actions: Iterable[str] = task
+        if self._profiler is not None:
+            actions = self._profiler.actions(actions)
+        return self._tracer.each(actions, "action")
+
+    def _index_plugins(self) -> None:
+        """
+        Indexes the plugins by the directives that they declare, so that
+        finding the plugins for a directive doesn't require asking every
+        plugin. Plugins that implement can_handle() are still asked.
+        """
+        # plugins are kept with their position, so that directives are always
+        # handled by plugins in the order in which they were loaded
+        self._static_plugins: Dict[str, List[Tuple[int, Plugin]]] = {}
+        self._dynamic_plugins: List[Tuple[int, Plugin]] = []
+        for position, plugin in enumerate(self._plugins):
+            if type(plugin).can_handle is Plugin.can_handle:
+                for directive in plugin.directives:
+                    self._static_plugins.setdefault(directive, []).append((position, plugin))
+            else:
+                self._dynamic_plugins.append((position, plugin))
+
+    def _plugins_for(self, action: str) -> List[Plugin]:
+        candidates = self._static_plugins.get(action, [])
+        if self._dynamic_plugins:
+            dynamic = [(position, plugin) for position, plugin in self._dynamic_plugins if plugin.can_handle(action)]
+            if dynamic:
+                candidates = sorted(candidates + dynamic, key=lambda candidate: candidate[0])
+        return [plugin for _, plugin in candidates]
+
+    def _handle_part(
+        self, plugin: Plugin, action: str, data: Any, defaults: Dict[str, Any], results: List[bool]
+    ) -> bool:
+        with self._context.scoped_defaults(defaults):
+            local_success = self._handle(plugin, action, data)
+        results.append(bool(local_success))
+        if local_success is None:
+            self._log.error(f"Action {action} not handled")
+            return False
+        if not local_success and self._exit:
+            self._log.error(f"Action {action} failed")
+        return local_success
+
+    def _fingerprint(self, plugin: Plugin, action: str, data: Any) -> Optional[str]:
+        if self._fingerprints is None:
+            return None
+        try:
+            state = plugin.fingerprint(action, data)
+        except Exception:  # noqa: BLE001
+            # let handle() report the problem
+            return None
+        if state is None:
+            return None
+        cls = plugin.__class__
+        return FingerprintStore.digest(cls.__module__, cls.__qualname__, action, self._context.base_directory(), state)
+
+    def _unchanged(self, plugin: Plugin, action: str, data: Any) -> bool:
+        """
+        Returns whether the action is unchanged since it was last handled
+        successfully by the plugin, and so can be skipped (with --incremental).
+        """
+        fingerprint = self._fingerprint(plugin, action, data)
+        if fingerprint is None or self._fingerprints is None or not self._fingerprints.unchanged(fingerprint):
+            return False
+        self._log.info(f"Skipping unchanged action {action}")
+        return True
+
+    def _record_fingerprint(self, plugin: Plugin, action: str, data: Any) -> None:
+        fingerprint = self._fingerprint(plugin, action, data)
+        if fingerprint is not None and self._fingerprints is not None:
+            self._fingerprints.record(fingerprint)
+
+    def _log_unit(self, log: Callable[[str], None], message: str, *, success: bool = True) -> bool:
+        log(message)
+        return success
+
+    def _handle(self, plugin: Plugin, action: str, data: Any) -> Optional[bool]:
+        """
+        Handles the action with the plugin, returning whether it succeeded, or
+        None if the plugin raised an exception.
+        """
+        name = plugin.__class__.__name__
+        filesystem = self._context.filesystem()
+        if self._plan is not None and not plugin.performs_operations:
+            self._plan.omit(name)
+        try:
+            with self._tracer.span(f"{name}.handle", "plugin", directive=action), filesystem.scope(action):
+                if self._profiler is not None:
+                    with self._profiler.measure("plugin", f"{name} ({action})"):
+                        return plugin.handle(action, data)
+                return plugin.handle(action, data)
+        except Exception as err:  # noqa: BLE001
+            self._log.error(f"An error was encountered while executing action {action}")
+            self._log.debug(str(err))
+            return None
+
+    def _load_plugins(self, plugin_paths: List[str]) -> bool:
+        success = True
+        for plugin_path in plugin_paths:
+            try:
+                # load the new plugins and add them to the list of plugins
+                # this mutates self._context._plugins; we don't add a setter method
+                # to Context because we don't want plugins to call it
+                new_plugins = load_plugins([plugin_path], self._context._plugins)  # noqa: SLF001
+                for plugin_class in new_plugins:
+                    self._plugins.append(plugin_class(self._context))
+            except Exception as err:  # noqa: BLE001
+                self._log.warning(f"Failed to load plugin '{plugin_path}'")
+                self._log.debug(str(err))
+                success = False
+        self._index_plugins()
         return success
 
 
@@ -0,0 +1,484 @@
+import contextlib
+import os
+import stat
+import threading
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from dotbot.util import shell_command
+
+
+class FileSystem:
+    """
+    Filesystem operations for plugins, with a cache of filesystem metadata.
+
+    Queries (e.g., exists() or readlink()) are cached, so that repeated
+    queries for the same path, which are common, only cost a single system
+    call. This matters on network filesystems, where every metadata operation
+    is a round trip to the server.
+
+    The cache is kept consistent with changes that are made through this
+    class (e.g., symlink() or rename()): such a change discards the cached
+    metadata for the changed path, its ancestors, and its descendants, as well
+    as all cached results that depend on resolving symbolic links. Changes
+    made in any other way (e.g., by shell commands) are not tracked, so
+    whoever makes them must call invalidate().
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # results of operations that don't follow a final symbolic link, by absolute path
+        self._lstat: Dict[str, Union[os.stat_result, OSError]] = {}
+        self._readlink: Dict[str, Union[str, OSError]] = {}
+        self._listdir: Dict[str, Union[List[str], OSError]] = {}
+        # results of operations that follow symbolic links, which can depend on any path
+        self._stat: Dict[str, Union[os.stat_result, OSError]] = {}
+        self._realpath: Dict[str, str] = {}
+        # cached paths, by parent directory, for finding the descendants of a path
+        self._children: Dict[str, Set[str]] = {}
+        # incremented by invalidate(), so that results of queries that were
+        # made while a change was being made (e.g., with --jobs) are not cached
+        self._generation = 0
+        self._counter: Optional[OperationCounter] = None
+        self._snapshot: Optional[Snapshot] = None
+
+    def count_operations(self, counter: "OperationCounter") -> None:
+        """
+        Starts counting the operations that are made through this class,
+        including the ones whose results are cached.
+        """
+        self._counter = counter
+
+    def take_snapshot(self, snapshot: "Snapshot") -> None:
+        """
+        Starts recording the state of the paths that are queried through this
+        class, as first observed.
+        """
+        self._snapshot = snapshot
+
+    def scope(self, name: str) -> ContextManager[None]:
+        """
+        Attributes the operations in the with statement to the named scope
+        (e.g., a directive, or an entry of a directive), if operations are
+        being counted. Scopes can be nested.
+        """
+        if self._counter is None:
+            return contextlib.nullcontext()
+        return self._counter.scope(name)
+
+    # queries
+
+    def lstat(self, path: str) -> os.stat_result:
+        key = _key(path)
+        result = self._lstat.get(key)
+        if self._counter is not None:
+            self._counter.record("lstat", cached=result is not None)
+        if result is None:
+            generation = self._generation
+            try:
+                result = os.lstat(os.path.expanduser(path))
+            except OSError as e:
+                result = e
+            self._store(self._lstat, key, result, generation)
+            if self._snapshot is not None:
+                self._snapshot.observe("lstat", key, result)
+        if isinstance(result, OSError):
+            raise result
+        return result
+
+    def stat(self, path: str) -> os.stat_result:
+        key = _key(path)
+        result = self._stat.get(key)
+        if self._counter is not None:
+            self._counter.record("stat", cached=result is not None)
+        if result is None:
+            generation = self._generation
+            try:
+                result = os.stat(os.path.expanduser(path))
+            except OSError as e:
+                result = e
+            self._store(self._stat, key, result, generation)
+            if self._snapshot is not None:
+                self._snapshot.observe("stat", key, result)
+        if isinstance(result, OSError):
+            raise result
+        return result
+
+    def exists(self, path: str) -> bool:
+        try:
+            self.stat(path)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def lexists(self, path: str) -> bool:
+        try:
+            self.lstat(path)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def islink(self, path: str) -> bool:
+        try:
+            return stat.S_ISLNK(self.lstat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def isdir(self, path: str) -> bool:
+        try:
+            return stat.S_ISDIR(self.stat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def isfile(self, path: str) -> bool:
+        try:
+            return stat.S_ISREG(self.stat(path).st_mode)
+        except (OSError, ValueError):
+            return False
+
+    def signature(self, path: str, *, follow_symlinks: bool = True) -> Optional[Tuple[int, ...]]:
+        """
+        Returns a value that changes whenever the file at the path is
+        replaced, modified, or has its metadata changed, or None if there is
+        no such file.
+        """
+        try:
+            st = self.stat(path) if follow_symlinks else self.lstat(path)
+        except (OSError, ValueError):
+            return None
+        return (st.st_dev, st.st_ino, st.st_mode, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+    def readlink(self, path: str) -> str:
+        key = _key(path)
+        result = self._readlink.get(key)
+        if self._counter is not None:
+            self._counter.record("readlink", cached=result is not None)
+        if result is None:
+            generation = self._generation
+            try:
+                result = os.readlink(os.path.expanduser(path))
+            except OSError as e:
+                result = e
+            self._store(self._readlink, key, result, generation)
+            if self._snapshot is not None:
+                self._snapshot.observe("readlink", key, result)
+        if isinstance(result, OSError):
+            raise result
+        return result
+
+    def realpath(self, path: str) -> str:
+        key = _key(path)
+        result = self._realpath.get(key)
+        if self._counter is not None:
+            self._counter.record("realpath", cached=result is not None)
+        if result is None:
+            generation = self._generation
+            result = os.path.realpath(os.path.expanduser(path))
+            self._store(self._realpath, key, result, generation)
+        return result
+
+    def listdir(self, path: str) -> List[str]:
+        key = _key(path)
+        result = self._listdir.get(key)
+        if self._counter is not None:
+            self._counter.record("listdir", cached=result is not None)
+        if result is None:
+            generation = self._generation
+            try:
+                result = os.listdir(os.path.expanduser(path))
+            except OSError as e:
+                result = e
+            self._store(self._listdir, key, result, generation)
+            if self._snapshot is not None:
+                self._snapshot.observe("listdir", key, result)
+        if isinstance(result, OSError):
+            raise result
+        return list(result)
+
+    def glob(self, pattern: str) -> List[str]:
+        """
+        Returns the paths that match the pattern, like `glob.glob` with
+        recursive=True. The results aren't cached.
+        """
+        import glob  # noqa: PLC0415
+
+        if self._counter is not None:
+            self._counter.record("glob")
+        result = glob.glob(pattern, recursive=True)
+        if self._snapshot is not None:
+            self._snapshot.observe("glob", os.path.abspath(pattern), [os.path.abspath(p) for p in result])
+        return result
+
+    def observe_test(self, command: str, cwd: str, *, success: bool) -> None:
+        """
+        Records the outcome of a shell command that a decision depended on
+        (e.g., a link's `if`), if a snapshot is being taken, so that the
+        snapshot is only unchanged while the command has the same outcome.
+        """
+        if self._snapshot is not None:
+            self._snapshot.observe("test", command, {"cwd": cwd, "success": success})
+
+    # changes
+
+    def makedirs(self, path: str, mode: int = 0o777) -> None:
+        if self._counter is not None:
+            self._counter.record("makedirs")
+        try:
+            os.makedirs(os.path.expanduser(path), mode)
+        finally:
+            self.invalidate(path)
+
+    def chmod(self, path: str, mode: int) -> None:
+        if self._counter is not None:
+            self._counter.record("chmod")
+        try:
+            os.chmod(os.path.expanduser(path), mode)
+        finally:
+            self.invalidate(path)
+
+    def symlink(self, source: str, link_name: str) -> None:
+        if self._counter is not None:
+            self._counter.record("symlink")
+        try:
+            os.symlink(source, os.path.expanduser(link_name))
+        finally:
+            self.invalidate(link_name)
+
+    def link(self, source: str, link_name: str) -> None:
+        if self._counter is not None:
+            self._counter.record("link")
+        try:
+            os.link(os.path.expanduser(source), os.path.expanduser(link_name))
+        finally:
+            self.invalidate(source)
+            self.invalidate(link_name)
+
+    def rename(self, source: str, destination: str) -> None:
+        if self._counter is not None:
+            self._counter.record("rename")
+        try:
+            os.rename(os.path.expanduser(source), os.path.expanduser(destination))
+        finally:
+            self.invalidate(source)
+            self.invalidate(destination)
+
+    def remove(self, path: str) -> None:
+        if self._counter is not None:
+            self._counter.record("remove")
+        try:
+            os.remove(os.path.expanduser(path))
+        finally:
+            self.invalidate(path)
+
+    def unlink(self, path: str) -> None:
+        if self._counter is not None:
+            self._counter.record("unlink")
+        try:
+            os.unlink(os.path.expanduser(path))
+        finally:
+            self.invalidate(path)
+
+    def rmtree(self, path: str) -> None:
+        import shutil  # noqa: PLC0415 # slow to import, and few runs remove directories
+
+        if self._counter is not None:
+            self._counter.record("rmtree")
+        try:
+            shutil.rmtree(os.path.expanduser(path))
+        finally:
+            self.invalidate(path)
+
+    def invalidate(self, path: Optional[str] = None) -> None:
+        """
+        Discards cached metadata that may be affected by a change to the path,
+        or all cached metadata if no path is given.
+        """
+        with self._lock:
+            self._generation += 1
+            self._stat.clear()
+            self._realpath.clear()
+            if path is None:
+                self._lstat.clear()
+                self._readlink.clear()
+                self._listdir.clear()
+                self._children.clear()
+                return
+            key = _key(path)
+            # the ancestors (e.g., after makedirs() creates them)
+            ancestor = key
+            while True:
+                self._discard(ancestor)
+                parent = os.path.dirname(ancestor)
+                if parent == ancestor:
+                    break
+                ancestor = parent
+            # the descendants (e.g., after rename() moves them)
+            pending = [key]
+            while pending:
+                for child in self._children.pop(pending.pop(), ()):
+                    self._discard(child)
+                    pending.append(child)
+
+    def _store(self, cache: Dict[str, Any], key: str, result: Any, generation: int) -> None:
+        with self._lock:
+            if generation != self._generation:
+                # the result may predate the change
+                return
+            cache[key] = result
+            self._children.setdefault(os.path.dirname(key), set()).add(key)
+
+    def _discard(self, key: str) -> None:
+        self._lstat.pop(key, None)
+        self._readlink.pop(key, None)
+        self._listdir.pop(key, None)
+
+
+class Snapshot:
+    """
+    The state of the paths that a run queried, as first observed.
+
+    A snapshot tells whether the paths are still in the same state (e.g.,
+    still missing, still a symbolic link to the same target, or still the same
+    unmodified file), which is all that the decisions of a run that only
+    queries them can depend on. Glob patterns are matched again, and the shell
+    commands of tests (e.g., a link's `if`) are run again, to check that they
+    have the same outcome.
+    """
+
+    QUERIES = ("lstat", "stat", "readlink", "listdir", "glob", "test")
+
+    def __init__(self, states: Optional[List[Tuple[str, str, Any]]] = None):
+        self._lock = threading.Lock()
+        self._states: Dict[Tuple[str, str], Any] = {(query, path): state for query, path, state in states or []}
+
+    def observe(self, query: str, path: str, result: Any) -> None:
+        """
+        Records the result of a query, unless the path was already observed.
+        """
+        with self._lock:
+            self._states.setdefault((query, path), _describe(result))
+
+    def states(self) -> List[Tuple[str, str, Any]]:
+        with self._lock:
+            return [(query, path, state) for (query, path), state in sorted(self._states.items())]
+
+    def unchanged(self) -> bool:
+        """
+        Returns whether all of the observed paths are still in the same state.
+        """
+        for query, path, state in self.states():
+            if query not in self.QUERIES:
+                return False
+            if _describe(_query(query, path, state)) != state:
+                return False
+        return True
+
+
+class OperationCounter:
+    """
+    Counts filesystem operations, by operation and scope.
+
+    Operations that need a system call are counted separately from operations
+    whose results come from the cache.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (scope, operation) -> [system calls, cached results]
+        self._counts: Dict[Tuple[Tuple[str, ...], str], List[int]] = {}
+
+    @contextlib.contextmanager
+    def scope(self, name: str) -> Iterator[None]:
+        outer: Tuple[str, ...] = getattr(self._local, "scope", ())
+        self._local.scope = (*outer, name)
+        try:
+            yield
+        finally:
+            self._local.scope = outer
+
+    def record(self, operation: str, *, cached: bool = False) -> None:
+        key = (getattr(self._local, "scope", ()), operation)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0, 0]
+            counts[1 if cached else 0] += 1
+
+    def counts(self) -> Dict[Tuple[Tuple[str, ...], str], Tuple[int, int]]:
+        """
+        Returns the number of system calls and of cached results, by scope
+        and operation.
+        """
+        with self._lock:
+            return {key: (counts[0], counts[1]) for key, counts in self._counts.items()}
+
+    def summary(self, limit: int = 10) -> List[str]:
+        """
+        Returns a human-readable summary of the operations of each directive,
+        and of the entries with the most system calls.
+        """
+        directives: Dict[str, Dict[str, List[int]]] = {}
+        entries: Dict[Tuple[str, ...], List[int]] = {}
+        for (scope, operation), (calls, cached) in self.counts().items():
+            directive = scope[0] if scope else "(other)"
+            totals = directives.setdefault(directive, {}).setdefault(operation, [0, 0])
+            totals[0] += calls
+            totals[1] += cached
+            if len(scope) > 1:
+                totals = entries.setdefault(scope, [0, 0])
+                totals[0] += calls
+                totals[1] += cached
+        lines = ["Filesystem operations (system calls, with cached results in parentheses):"]
+        for directive, operations in sorted(directives.items()):
+            calls = sum(counts[0] for counts in operations.values())
+            cached = sum(counts[1] for counts in operations.values())
+            lines.append(f"  {directive}: {calls} ({cached})")
+            details = ", ".join(
+                f"{operation} {counts[0]} ({counts[1]})" for operation, counts in sorted(operations.items())
+            )
+            lines.append(f"    {details}")
+        if entries:
+            lines.append("  entries with the most system calls:")
+            ranked = sorted(entries.items(), key=lambda item: (-item[1][0], item[0]))
+            lines.extend(f"    {' '.join(scope)}: {calls} ({cached})" for scope, (calls, cached) in ranked[:limit])
+            if len(ranked) > limit:
+                lines.append(f"    ... and {len(ranked) - limit} more")
+        return lines
+
+
+def _query(query: str, path: str, state: Any) -> Any:
+    """
+    Returns the current result of a query that a snapshot observed.
+    """
+    if query == "glob":
+        import glob  # noqa: PLC0415
+
+        return [os.path.abspath(p) for p in glob.glob(path, recursive=True)]
+    if query == "test":
+        return {"cwd": state["cwd"], "success": shell_command(path, cwd=state["cwd"]) == 0}
+    try:
+        return getattr(os, query)(path)
+    except OSError as e:
+        return e
+
+
+def _describe(result: Any) -> Any:
+    """
+    Returns a JSON-compatible description of the result of a query.
+    """
+    if isinstance(result, OSError):
+        return None
+    if isinstance(result, os.stat_result):
+        # which file it is, as well as its type (e.g., hard links depend on
+        # it), and for regular files, whether they were modified
+        description = [stat.S_IFMT(result.st_mode), result.st_dev, result.st_ino]
+        if stat.S_ISREG(result.st_mode):
+            description.append(result.st_mtime_ns)
+        return description
+    if isinstance(result, list):
+        return sorted(result)
+    return result
+
+
+def _key(path: str) -> str:
+    return os.path.abspath(os.path.expanduser(path))
@@ -0,0 +1,77 @@
+import contextlib
+import hashlib
+import json
+import threading
+from typing import Set
+
+from dotbot.util.common import write_atomically
+
+
+class FingerprintStore:
+    """
+    The fingerprints of the actions that were handled successfully, which
+    persist between runs.
+
+    An action whose fingerprint (see Plugin.fingerprint()) was recorded by an
+    earlier run is unchanged since then, so it doesn't need to be handled
+    again.
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads the fingerprints that were saved to the given path. Unreadable
+        state is treated as empty.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._previous: Set[str] = set()
+        # the fingerprints of this run: the unchanged actions, and the handled ones
+        self._current: Set[str] = set()
+        try:
+            with open(self._path) as file:
+                state = json.load(file)
+            if state.get("version") == 1:
+                self._previous = set(state["fingerprints"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    @staticmethod
+    def digest(*parts: str) -> str:
+        """
+        Returns a fingerprint of the given parts.
+        """
+        hasher = hashlib.sha256()
+        for part in parts:
+            hasher.update(part.encode("utf-8", "surrogateescape"))
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    def unchanged(self, fingerprint: str) -> bool:
+        """
+        Returns whether an earlier run recorded the fingerprint, in which case
+        it is kept for the next run.
+        """
+        with self._lock:
+            if fingerprint not in self._previous:
+                return False
+            self._current.add(fingerprint)
+            return True
+
+    def record(self, fingerprint: str) -> None:
+        with self._lock:
+            self._current.add(fingerprint)
+
+    def save(self, *, complete: bool) -> None:
+        """
+        Saves the fingerprints for the next run. Failures are ignored.
+
+        If the run was complete, fingerprints of actions that are no longer in
+        the configuration (or that have changed) are dropped; otherwise, the
+        fingerprints of earlier runs are kept, because the actions that
+        weren't reached may still be unchanged.
+        """
+        with self._lock:
+            fingerprints = self._current if complete else self._current | self._previous
+        data = json.dumps({"version": 1, "fingerprints": sorted(fingerprints)})
+        with contextlib.suppress(OSError):
+            write_atomically(self._path, data.encode("utf-8"))
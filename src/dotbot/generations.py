@@ -0,0 +1,231 @@
+import contextlib
+import os
+import threading
+from typing import List, Optional, Set
+
+
+class Generations:
+    """
+    Link farms that symbolic links point into, so that the links of a run
+    can be activated, or rolled back, all at once.
+
+    A generation is a directory that mirrors the absolute paths of the links
+    of a run (e.g., `3/home/user/.vimrc` for `~/.vimrc`), with symbolic links
+    to their targets. The links themselves point at the same path in the
+    `current` directory, which is a symbolic link to the active generation,
+    so activating a generation is a single atomic rename, and the links only
+    have to change when they are added or moved.
+
+    A new generation starts as a copy of the current one, so that staging
+    only changes the entries whose targets changed.
+    """
+
+    CURRENT = "current"
+    PREVIOUS = "previous"
+
+    def __init__(self, directory: str, *, partial: bool = False):
+        """
+        Manages the generations in the given directory.
+
+        If the run is partial (e.g., with --only), the links of the current
+        generation are kept in the new one, except for the links that the run
+        stages again; otherwise, the new generation only has the links of the
+        run.
+        """
+        self._directory = directory
+        self._partial = partial
+        self._lock = threading.Lock()
+        self._staging: Optional[str] = None
+        # entries that were staged, relative to the generation
+        self._staged: Set[str] = set()
+        # links whose entries aren't in the current generation
+        self._added: List[str] = []
+
+    def path(self, link_path: str) -> str:
+        """
+        Returns the path that the link at the given absolute path points to.
+        """
+        return os.path.join(self._directory, self.CURRENT, _relative(link_path))
+
+    def stage(self, link_path: str, target: str) -> None:
+        """
+        Adds the link at the given absolute path to the new generation.
+        """
+        staging = self._start()
+        relative = _relative(link_path)
+        entry = os.path.join(staging, relative)
+        with self._lock:
+            self._staged.add(relative)
+        try:
+            if os.readlink(entry) == target:
+                return
+        except OSError:
+            pass
+        # the entries of the current generation can be in the way (e.g., a
+        # link to a directory that is now linked file by file)
+        parent = staging
+        for name in os.path.dirname(relative).split(os.sep):
+            parent = os.path.join(parent, name)
+            if os.path.islink(parent):
+                os.unlink(parent)
+                break
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            _remove(entry)
+        elif os.path.lexists(entry):
+            os.unlink(entry)
+        else:
+            with self._lock:
+                self._added.append(link_path)
+        os.symlink(target, entry)
+
+    def staged(self) -> Optional[int]:
+        """
+        Returns the number of the new generation, or None if nothing was
+        staged.
+        """
+        with self._lock:
+            return None if self._staging is None else int(os.path.basename(self._staging))
+
+    def activate(self) -> Optional[int]:
+        """
+        Makes the new generation the current one, and the current one the
+        previous one, removing all of the others. Returns the number of the
+        new generation, or None if nothing was staged.
+        """
+        number = self.staged()
+        if number is None:
+            return None
+        if not self._partial:
+            self._remove_unstaged(os.path.join(self._directory, str(number)))
+        current = self._active(self.CURRENT)
+        if current is not None:
+            self._point(self.PREVIOUS, current)
+        self._point(self.CURRENT, number)
+        self._prune()
+        return number
+
+    def discard(self) -> None:
+        """
+        Removes the new generation, e.g., after a failed run, along with the
+        links that point to its entries that aren't in the current one.
+        """
+        with self._lock:
+            staging, self._staging = self._staging, None
+            added, self._added = self._added, []
+        if staging is not None:
+            _remove(staging)
+        for link_path in added:
+            with contextlib.suppress(OSError):
+                target = os.path.join(os.path.dirname(link_path), os.readlink(link_path))
+                if os.path.normpath(target) == self.path(link_path):
+                    os.unlink(link_path)
+
+    def rollback(self) -> int:
+        """
+        Makes the previous generation the current one (and the current one
+        the previous one), and returns its number.
+        """
+        current = self._active(self.CURRENT)
+        previous = self._active(self.PREVIOUS)
+        if previous is None or not os.path.isdir(os.path.join(self._directory, str(previous))):
+            msg = "There is no previous generation to roll back to"
+            raise GenerationsError(msg)
+        self._point(self.CURRENT, previous)
+        if current is not None:
+            self._point(self.PREVIOUS, current)
+        return previous
+
+    def _start(self) -> str:
+        """
+        Creates the directory of the new generation, if it doesn't exist yet,
+        and returns it.
+        """
+        with self._lock:
+            if self._staging is not None:
+                return self._staging
+            numbers = self._numbers()
+            staging = os.path.join(self._directory, str(max(numbers, default=0) + 1))
+            current = self._active(self.CURRENT)
+            if current is not None and os.path.isdir(os.path.join(self._directory, str(current))):
+                import shutil  # noqa: PLC0415 # slow to import, and only needed once there is a generation
+
+                # symlinks=True copies the links of the farm, not the files they point to
+                shutil.copytree(os.path.join(self._directory, str(current)), staging, symlinks=True)
+            else:
+                os.makedirs(staging)
+            self._staging = staging
+            return staging
+
+    def _remove_unstaged(self, staging: str) -> None:
+        """
+        Removes the entries of the new generation that were copied from the
+        current one, but not staged again, along with directories that are
+        left empty.
+        """
+        for parent, directories, files in os.walk(staging, topdown=False):
+            for name in directories + files:
+                entry = os.path.join(parent, name)
+                if os.path.islink(entry) and os.path.relpath(entry, staging) not in self._staged:
+                    os.unlink(entry)
+            if parent != staging:
+                with contextlib.suppress(OSError):
+                    # only removes empty directories
+                    os.rmdir(parent)
+
+    def _numbers(self) -> List[int]:
+        try:
+            names = os.listdir(self._directory)
+        except OSError:
+            return []
+        return [int(name) for name in names if name.isdigit()]
+
+    def _active(self, name: str) -> Optional[int]:
+        """
+        Returns the number of the generation that the named link points to,
+        or None if there is none.
+        """
+        try:
+            number = os.readlink(os.path.join(self._directory, name))
+        except OSError:
+            return None
+        return int(number) if number.isdigit() else None
+
+    def _point(self, name: str, number: int) -> None:
+        """
+        Atomically points the named link at the given generation.
+        """
+        link = os.path.join(self._directory, name)
+        temporary = f"{link}.{number}.tmp"
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temporary)
+        # a relative target, so that the generations can be moved along with the directory
+        os.symlink(str(number), temporary)
+        os.replace(temporary, link)
+
+    def _prune(self) -> None:
+        """
+        Removes the generations other than the current and the previous one.
+        """
+        keep = {self._active(self.CURRENT), self._active(self.PREVIOUS)}
+        for number in self._numbers():
+            if number not in keep:
+                _remove(os.path.join(self._directory, str(number)))
+
+
+class GenerationsError(Exception):
+    pass
+
+
+def _remove(directory: str) -> None:
+    import shutil  # noqa: PLC0415 # slow to import, and only needed after a run
+
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def _relative(path: str) -> str:
+    """
+    Returns the absolute path as a path relative to the root of a generation.
+    """
+    drive, path = os.path.splitdrive(path)
+    return os.path.join(drive.replace(":", ""), path.lstrip(os.sep))
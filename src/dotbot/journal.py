@@ -0,0 +1,100 @@
+import contextlib
+import hashlib
+import json
+import os
+from typing import IO, Any, Dict, List, Optional
+
+
+class Journal:
+    """
+    An append-only record of the tasks of a run that have completed
+    successfully, so that a later run can resume where the run failed.
+
+    Each task is identified by its index and a digest of the task and of all
+    of the tasks before it, so that a task only counts as completed if
+    neither it nor anything before it in the configuration has changed.
+    """
+
+    def __init__(self, path: str, seed: Any = None):
+        """
+        Starts a new journal at the given path. The tasks that the previous
+        journal at the path recorded as completed can be skipped.
+
+        The seed is included in the digests, for options that change what
+        running the tasks does (e.g., --only).
+        """
+        self._path = path
+        self._previous: List[str] = self._read()
+        self._resuming = True
+        self._digest = hashlib.sha256(json.dumps(seed, sort_keys=True, default=repr).encode("utf-8")).hexdigest()
+        self._digests: List[str] = []
+        self._written = 0
+        self._file: Optional[IO[str]] = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._file = open(path, "w")  # noqa: SIM115 # closed by finish()
+        except OSError:
+            # without a journal, runs simply can't be resumed
+            pass
+
+    def start(self, task: Dict[str, Any]) -> bool:
+        """
+        Starts the next task, returning whether it can be skipped because it
+        was completed by the run that is being resumed.
+        """
+        hasher = hashlib.sha256(self._digest.encode("ascii"))
+        hasher.update(json.dumps(task, sort_keys=True, default=repr).encode("utf-8", "surrogateescape"))
+        self._digest = hasher.hexdigest()
+        index = len(self._digests)
+        self._digests.append(self._digest)
+        if self._resuming and index < len(self._previous) and self._previous[index] == self._digest:
+            return True
+        # only a prefix of the tasks can be skipped
+        self._resuming = False
+        return False
+
+    def record(self, count: int) -> None:
+        """
+        Records that the first count tasks have completed successfully.
+        """
+        if self._file is None:
+            return
+        for index in range(self._written, min(count, len(self._digests))):
+            self._file.write(json.dumps({"index": index, "digest": self._digests[index]}) + "\n")
+            self._written = index + 1
+        # make completed tasks durable as soon as possible, in case the run is interrupted
+        self._file.flush()
+
+    def finish(self, *, success: bool) -> None:
+        """
+        Closes the journal. After a successful run, there is nothing to
+        resume, so the journal is removed.
+        """
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        if success:
+            with contextlib.suppress(OSError):
+                os.unlink(self._path)
+
+    def _read(self) -> List[str]:
+        """
+        Returns the digests of the tasks that the previous journal recorded as
+        completed, up to the first missing or unreadable entry.
+        """
+        digests: List[str] = []
+        try:
+            with open(self._path) as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # e.g., a partial write from an interrupted run
+                        break
+                    if not isinstance(entry, dict) or entry.get("index") != len(digests):
+                        break
+                    digests.append(entry["digest"])
+        except OSError:
+            pass
+        return digests
@@ -0,0 +1,72 @@
+import contextlib
+import json
+import threading
+from typing import Dict, List, Set, Tuple
+
+from dotbot.util.common import write_atomically
+
+
+class Manifest:
+    """
+    The symbolic links that Dotbot manages, which persist between runs.
+
+    Links record the symbolic links that they create (or find already in
+    place) with add(), so that links that were removed from the configuration,
+    or whose targets are gone, can be found by only examining the links in
+    the manifest, without listing any directories.
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads the manifest that was saved to the given path. Unreadable state
+        is treated as empty.
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        # link path -> the target that the link points to
+        self._links: Dict[str, str] = {}
+        # the links of this run
+        self._added: Set[str] = set()
+        try:
+            with open(self._path) as file:
+                state = json.load(file)
+            if state.get("version") == 1:
+                self._links = {str(path): str(target) for path, target in state["links"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    def add(self, path: str, target: str) -> None:
+        """
+        Records that the link at the given absolute path, which points to the
+        target (as it would be read with readlink()), is in the configuration.
+        """
+        with self._lock:
+            self._links[path] = target
+            self._added.add(path)
+
+    def discard(self, path: str) -> None:
+        """
+        Removes the link at the given path from the manifest, e.g., after it
+        was removed.
+        """
+        with self._lock:
+            self._links.pop(path, None)
+            self._added.discard(path)
+
+    def links(self) -> List[Tuple[str, str, bool]]:
+        """
+        Returns the links in the manifest, with their targets, and whether
+        they were added by this run.
+        """
+        with self._lock:
+            return [(path, target, path in self._added) for path, target in sorted(self._links.items())]
+
+    def save(self) -> None:
+        """
+        Saves the manifest for the next run. Failures are ignored.
+        """
+        with self._lock:
+            links = dict(self._links)
+        data = json.dumps({"version": 1, "links": links}, sort_keys=True)
+        with contextlib.suppress(OSError):
+            write_atomically(self._path, data.encode("utf-8", "surrogateescape"))
@@ -1,3 +1,7 @@
+import contextlib
+import threading
+from typing import Iterator, List
+
 from dotbot.messenger.color import Color
 from dotbot.messenger.level import Level
 from dotbot.util.singleton import Singleton
@@ -7,6 +11,7 @@ class Messenger(metaclass=Singleton):
     def __init__(self, level: Level = Level.ACTION):
         self.set_level(level)
         self.use_color(True)
+        self._local = threading.local()
 
     def set_level(self, level: Level) -> None:
         self._level = level
@@ -16,7 +21,33 @@ class Messenger(metaclass=Singleton):
 
     def log(self, level: Level, message: str) -> None:
         if level >= self._level:
-            print(f"{self._color(level)}{message}{self._reset()}")  # noqa: T201
+            line = f"{self._color(level)}{message}{self._reset()}"
+            buffer = getattr(self._local, "buffer", None)
+            if buffer is not None:
+                buffer.append(line)
+            else:
+                print(line)  # noqa: T201
+
+    @contextlib.contextmanager
+    def capture(self) -> Iterator[List[str]]:
+        """
+        Buffers the messages that the current thread logs within the with
+        statement, instead of printing them. The buffered messages can be
+        printed later with emit().
+        """
+        buffer: List[str] = []
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+    def emit(self, lines: List[str]) -> None:
+        """
+        Prints messages that were buffered by capture().
+        """
+        for line in lines:
+            print(line)  # noqa: T201
 
     def debug(self, message: str) -> None:
         self.log(Level.DEBUG, message)
@@ -0,0 +1,370 @@
+import contextlib
+import json
+import os
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from dotbot.filesystem import FileSystem, Snapshot
+from dotbot.messenger import Level, Messenger
+from dotbot.util import shell_command, string
+from dotbot.util.common import write_atomically
+
+
+class Operation:
+    """
+    A change that a run makes: a filesystem operation or a shell command.
+
+    Besides what to do, an operation has the messages to log when it is
+    planned (in a dry run), when it is performed, and when it fails, so that a
+    plan can be reviewed, and applied later with the same output as a run that
+    performs the operations as it goes.
+    """
+
+    __slots__ = ("announce", "arguments", "failed", "kind", "level", "performed", "planned")
+
+    KINDS = ("mkdir", "symlink", "hardlink", "backup", "unlink", "remove", "rmtree", "shell")
+
+    kind: str
+    arguments: Dict[str, Any]
+    planned: Optional[str]
+    performed: Optional[str]
+    failed: Optional[str]
+    level: Level
+    announce: bool
+
+    def __init__(
+        self,
+        kind: str,
+        arguments: Dict[str, Any],
+        *,
+        planned: Optional[str],
+        performed: Optional[str],
+        failed: Optional[str],
+        level: Level = Level.ACTION,
+        announce: bool = False,
+    ):
+        """
+        Creates an operation of the given kind.
+
+        The planned and performed messages are logged at the given level (or
+        not at all, if None); the performed message is logged before the
+        operation is performed if announce is true, and after it succeeded
+        otherwise. The failed message is logged as a warning if the operation
+        fails; if it is None, errors propagate to the caller instead.
+        """
+        if kind not in self.KINDS:
+            msg = f"Unknown operation {kind}"
+            raise ValueError(msg)
+        self.kind = kind
+        self.arguments = arguments
+        self.planned = planned
+        self.performed = performed
+        self.failed = failed
+        self.level = level
+        self.announce = announce
+
+    def apply(self, filesystem: FileSystem) -> bool:
+        """
+        Performs the operation, without logging anything. Returns whether it
+        succeeded, or raises OSError.
+        """
+        arguments = self.arguments
+        if self.kind == "mkdir":
+            mode = arguments.get("mode")
+            if mode is None:
+                filesystem.makedirs(arguments["path"])
+            else:
+                filesystem.makedirs(arguments["path"], mode)
+                # On Windows, the *mode* argument to `os.makedirs()` is ignored.
+                # The mode must be set explicitly in a follow-up call.
+                filesystem.chmod(arguments["path"], mode)
+        elif self.kind == "symlink":
+            filesystem.symlink(arguments["source"], arguments["path"])
+        elif self.kind == "hardlink":
+            filesystem.link(arguments["source"], arguments["path"])
+        elif self.kind == "backup":
+            filesystem.rename(arguments["path"], arguments["destination"])
+        elif self.kind == "unlink":
+            filesystem.unlink(arguments["path"])
+        elif self.kind == "remove":
+            filesystem.remove(arguments["path"])
+        elif self.kind == "rmtree":
+            filesystem.rmtree(arguments["path"])
+        else:  # self.kind == "shell"
+            ret = shell_command(
+                arguments["command"],
+                cwd=arguments["cwd"],
+                enable_stdin=arguments["stdin"],
+                enable_stdout=arguments["stdout"],
+                enable_stderr=arguments["stderr"],
+            )
+            # the command may have changed the filesystem
+            filesystem.invalidate()
+            return ret == 0
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "arguments": self.arguments,
+            "planned": self.planned,
+            "performed": self.performed,
+            "failed": self.failed,
+            "level": self.level.name,
+            "announce": self.announce,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Operation":
+        return cls(
+            data["kind"],
+            dict(data["arguments"]),
+            planned=data["planned"],
+            performed=data["performed"],
+            failed=data["failed"],
+            level=Level[data["level"]],
+            announce=data["announce"],
+        )
+
+
+def perform(operation: Operation, filesystem: FileSystem) -> bool:
+    """
+    Performs the operation, logging what was done, and returns whether it
+    succeeded.
+    """
+    log = Messenger()
+    if operation.announce and operation.performed is not None:
+        log.log(operation.level, operation.performed)
+    try:
+        success = operation.apply(filesystem)
+    except OSError as e:
+        if operation.failed is None:
+            raise
+        log.warning(operation.failed)
+        msg = f"OSError: {e!s}"
+        log.debug(msg)
+        return False
+    if not success:
+        if operation.failed is not None:
+            log.warning(operation.failed)
+        return False
+    if not operation.announce and operation.performed is not None:
+        log.log(operation.level, operation.performed)
+    return True
+
+
+class Plan:
+    """
+    The operations that a run would perform, in order.
+
+    Plans are computed by dry runs, without changing anything, and can be
+    saved, reviewed, and applied later. Plans can also be recorded by runs
+    that perform the operations as they go, together with the state of the
+    paths that the run queried, so that they can be applied again wherever
+    those paths are in the same state (see PlanCache).
+    """
+
+    def __init__(self, operations: Optional[List[Operation]] = None, preconditions: Optional[Snapshot] = None):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._operations: List[Operation] = list(operations or [])
+        self._omitted: List[str] = []
+        # the paths that added operations would create (True) or remove
+        # (False), with the number of the latest operation that did
+        self._planned: Dict[str, Tuple[int, bool]] = {}
+        self._added = 0
+        self.preconditions = preconditions
+
+    def add(self, operation: Operation) -> None:
+        """
+        Adds the operation to the plan, logging what would be done.
+        """
+        self._append(operation)
+        self._track(operation)
+        if operation.planned is not None:
+            Messenger().log(operation.level, operation.planned)
+
+    def planned(self, path: str) -> Optional[bool]:
+        """
+        Returns whether the absolute path would exist after the operations
+        that were added to the plan, or None if they don't affect it.
+
+        Planned operations aren't performed, so this tells plugins about
+        paths that an earlier operation would create (or remove), which the
+        filesystem doesn't show.
+        """
+        with self._lock:
+            latest = self._planned.get(path)
+            # removing a directory removes everything beneath it
+            ancestor = os.path.dirname(path)
+            while True:
+                removed = self._planned.get(ancestor)
+                if removed is not None and not removed[1] and (latest is None or removed[0] > latest[0]):
+                    latest = removed
+                parent = os.path.dirname(ancestor)
+                if parent == ancestor:
+                    break
+                ancestor = parent
+        return None if latest is None else latest[1]
+
+    def record(self, operation: Operation) -> None:
+        """
+        Adds an operation that was performed to the plan.
+        """
+        self._append(operation)
+
+    @contextlib.contextmanager
+    def capture(self) -> Iterator[List[Operation]]:
+        """
+        Buffers the operations that are added or recorded by the current
+        thread in the with statement, instead of adding them to the plan. The
+        buffered operations can be added later with extend(), e.g., in a
+        deterministic order.
+        """
+        buffer: List[Operation] = []
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+    def extend(self, operations: List[Operation]) -> None:
+        """
+        Adds operations that were buffered by capture() to the plan.
+        """
+        with self._lock:
+            self._operations.extend(operations)
+
+    def _track(self, operation: Operation) -> None:
+        arguments = operation.arguments
+        if operation.kind in ("mkdir", "symlink", "hardlink"):
+            created, removed = [arguments["path"]], []
+        elif operation.kind == "backup":
+            created, removed = [arguments["destination"]], [arguments["path"]]
+        elif operation.kind in ("unlink", "remove", "rmtree"):
+            created, removed = [], [arguments["path"]]
+        else:
+            # what shell commands do can't be known
+            return
+        with self._lock:
+            self._added += 1
+            for path in removed:
+                self._planned[path] = (self._added, False)
+            for path in created:
+                # creating a path (e.g., with makedirs) means that its ancestors exist
+                ancestor = path
+                while True:
+                    self._planned[ancestor] = (self._added, True)
+                    parent = os.path.dirname(ancestor)
+                    if parent == ancestor:
+                        break
+                    ancestor = parent
+
+    def _append(self, operation: Operation) -> None:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is not None:
+            buffer.append(operation)
+            return
+        with self._lock:
+            self._operations.append(operation)
+
+    def omit(self, plugin: str) -> None:
+        """
+        Notes that the named plugin handled directives without describing its
+        changes as operations, so they are missing from the plan.
+        """
+        with self._lock:
+            if plugin not in self._omitted:
+                self._omitted.append(plugin)
+
+    def omitted(self) -> List[str]:
+        with self._lock:
+            return list(self._omitted)
+
+    def operations(self) -> List[Operation]:
+        with self._lock:
+            return list(self._operations)
+
+    def apply(self, filesystem: FileSystem, *, exit_on_failure: bool = False) -> bool:
+        """
+        Performs the operations in order, and returns whether all of them
+        succeeded.
+        """
+        success = True
+        for operation in self.operations():
+            if not perform(operation, filesystem):
+                success = False
+                if exit_on_failure:
+                    break
+        return success
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"version": 1, "operations": [operation.to_dict() for operation in self.operations()]}
+        if self.preconditions is not None:
+            data["preconditions"] = self.preconditions.states()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Plan":
+        if data.get("version") != 1:
+            msg = "Unsupported plan version"
+            raise ValueError(msg)
+        preconditions = None
+        if "preconditions" in data:
+            preconditions = Snapshot([(query, path, state) for query, path, state in data["preconditions"]])
+        return cls([Operation.from_dict(operation) for operation in data["operations"]], preconditions)
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+            file.write("\n")
+
+    @classmethod
+    def read(cls, path: str) -> "Plan":
+        try:
+            with open(path) as file:
+                return cls.from_dict(json.load(file))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            msg = string.indent_lines(str(e))
+            msg = f"Could not read plan file:\n{msg}"
+            raise PlanError(msg) from e
+
+
+class PlanCache:
+    """
+    A plan that was recorded by an earlier run, which persists between runs.
+
+    The cache is stored under a key that identifies everything that the
+    operations of a run depend on besides the state of the paths it queried
+    (e.g., the configuration and the revision of the dotfiles), so a cached
+    plan can be applied instead of handling the configuration again, as long
+    as those paths are still in the same state.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+
+    def load(self) -> Optional[Plan]:
+        """
+        Returns the cached plan, or None if there is none, or if the paths
+        that it depends on have changed since it was recorded.
+        """
+        try:
+            plan = Plan.read(self._path)
+        except PlanError:
+            return None
+        if plan.preconditions is None or not plan.preconditions.unchanged():
+            return None
+        return plan
+
+    def save(self, plan: Plan) -> None:
+        """
+        Saves the plan for the next run. Failures are ignored.
+        """
+        data = json.dumps(plan.to_dict())
+        with contextlib.suppress(OSError):
+            write_atomically(self._path, data.encode("utf-8", "surrogateescape"))
+
+
+class PlanError(Exception):
+    pass
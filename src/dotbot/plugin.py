@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, List, Optional, Tuple
 
 from dotbot.context import Context
 from dotbot.messenger import Messenger
@@ -12,6 +12,23 @@ class Plugin:
     _context: Context
     _log: Messenger
     supports_dry_run: bool = False  # plugins must explicitly declare support for dry-run mode
+    # plugins that make all of their changes with Context.perform() can be planned (see --plan-out)
+    performs_operations: bool = False
+
+    # The directives that the plugin handles. Plugins that set this don't
+    # need to implement can_handle(), and the dispatcher routes directives
+    # to them without calling it. Plugins that override can_handle() are
+    # always asked, because the directives they handle may change at runtime.
+    # Plugins that name their directive with _directive (like the built-in
+    # ones) declare it, so that subclasses can handle another directive by
+    # overriding _directive.
+    directives: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        directive = cls.__dict__.get("_directive")
+        if isinstance(directive, str) and "directives" not in cls.__dict__:
+            cls.directives = (directive,)
 
     def __init__(self, context: Context):
         self._context = context
@@ -21,6 +38,8 @@ class Plugin:
         """
         Returns true if the Plugin can handle the directive.
         """
+        if self.directives:
+            return directive in self.directives
         raise NotImplementedError
 
     def handle(self, directive: str, data: Any) -> bool:
@@ -30,3 +49,30 @@ class Plugin:
         Returns true if the Plugin successfully handled the directive.
         """
         raise NotImplementedError
+
+    def fingerprint(self, directive: str, data: Any) -> Optional[str]:  # noqa: ARG002 # overridden by subclasses
+        """
+        Returns a string that summarizes everything that handling the
+        directive depends on (e.g., the data, the defaults, and the state of
+        the files involved), or None if the plugin can't tell.
+
+        With --incremental, directives whose fingerprint is the same as after
+        they were last handled successfully are skipped.
+        """
+        return None
+
+    def partition(self, directive: str, data: Any) -> Optional[List[Tuple[Any, List[str]]]]:  # noqa: ARG002 # overridden by subclasses
+        """
+        Splits the directive's data into parts that can be handled
+        independently, so that they can be handled in parallel.
+
+        Returns a list of (data, paths) pairs, where handling the data of each
+        part in turn has the same effect as handling all of the data, and the
+        handling of each part only reads or changes the given absolute paths
+        (and the paths beneath them).
+
+        Returns None if the directive cannot be split, in which case it is
+        handled after everything before it has finished, and before anything
+        after it starts. This is the default.
+        """
+        return None
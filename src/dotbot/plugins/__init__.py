@@ -1,6 +1,85 @@
-from dotbot.plugins.clean import Clean
-from dotbot.plugins.create import Create
-from dotbot.plugins.link import Link
-from dotbot.plugins.shell import Shell
+import importlib
+import threading
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple, Type
+
+from dotbot.context import Context
+from dotbot.plugin import Plugin
+
+if TYPE_CHECKING:
+    from dotbot.plugins.clean import Clean
+    from dotbot.plugins.create import Create
+    from dotbot.plugins.link import Link
+    from dotbot.plugins.shell import Shell
 
 __all__ = ["Clean", "Create", "Link", "Shell"]
+
+# name -> (module, directive) of the built-in plugins
+_BUILT_IN_PLUGINS = {
+    "Clean": ("dotbot.plugins.clean", "clean"),
+    "Create": ("dotbot.plugins.create", "create"),
+    "Link": ("dotbot.plugins.link", "link"),
+    "Shell": ("dotbot.plugins.shell", "shell"),
+}
+
+
+def __getattr__(name: str) -> Any:
+    # the plugin modules (and what they import) are only loaded when they are used
+    if name in _BUILT_IN_PLUGINS:
+        module, _ = _BUILT_IN_PLUGINS[name]
+        return getattr(importlib.import_module(module), name)
+    msg = f"module {__name__!r} has no attribute {name!r}"
+    raise AttributeError(msg)
+
+
+class _LazyPlugin(Plugin):
+    """
+    A stand-in for a built-in plugin, which only loads the plugin's module when
+    one of its directives is first handled, so that configurations that don't
+    use a plugin don't pay for loading it.
+
+    Subclasses can load plugins from elsewhere by overriding _plugin_class().
+    """
+
+    supports_dry_run = True
+    performs_operations = True
+
+    def __init__(self, context: Context):
+        super().__init__(context)
+        self._lock = threading.Lock()
+        self._plugin: Optional[Plugin] = None
+
+    def handle(self, directive: str, data: Any) -> bool:
+        return self._load().handle(directive, data)
+
+    def fingerprint(self, directive: str, data: Any) -> Optional[str]:
+        return self._load().fingerprint(directive, data)
+
+    def partition(self, directive: str, data: Any) -> Optional[List[Tuple[Any, List[str]]]]:
+        return self._load().partition(directive, data)
+
+    def _load(self) -> Plugin:
+        with self._lock:
+            if self._plugin is None:
+                self._plugin = self._plugin_class()(self._context)
+            return self._plugin
+
+    def _plugin_class(self) -> Type[Plugin]:
+        plugin_class: Type[Plugin] = getattr(importlib.import_module(self.__module__), self.__class__.__name__)
+        return plugin_class
+
+
+def _stand_in(name: str, module: str, directive: str) -> Type[Plugin]:
+    # the stand-ins have the name and module of the plugins, so that they are
+    # treated as the same plugins (e.g., when third-party plugins import the
+    # built-in ones)
+    return type(name, (_LazyPlugin,), {"__module__": module, "__qualname__": name, "directives": (directive,)})
+
+
+_STAND_INS = [_stand_in(name, module, directive) for name, (module, directive) in _BUILT_IN_PLUGINS.items()]
+
+
+def built_in_plugins() -> List[Type[Plugin]]:
+    """
+    Returns the built-in plugins, as stand-ins that load them on first use.
+    """
+    return list(_STAND_INS)
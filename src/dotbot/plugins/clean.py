@@ -1,70 +1,117 @@
 import os
 import sys
-from typing import Any
+from typing import Any, List, Optional, Tuple
 
+from dotbot.plan import Operation
 from dotbot.plugin import Plugin
 from dotbot.util.common import normslash
 
 
+class CleanSpec:
+    """
+    A single directory to clean, with defaults merged in.
+    """
+
+    __slots__ = ("force", "recursive", "target")
+
+    target: str
+    force: bool
+    recursive: bool
+
+    def __init__(self, target: str, *, force: bool, recursive: bool):
+        self.target = target
+        self.force = force
+        self.recursive = recursive
+
+
 class Clean(Plugin):
     """
     Cleans broken symbolic links.
     """
 
     supports_dry_run = True
+    performs_operations = True
 
     _directive = "clean"
 
-    def can_handle(self, directive: str) -> bool:
-        return directive == self._directive
-
     def handle(self, directive: str, data: Any) -> bool:
         if directive != self._directive:
             msg = f"Clean cannot handle directive {directive}"
             raise ValueError(msg)
         return self._process_clean(data)
 
+    def partition(self, directive: str, data: Any) -> Optional[List[Tuple[Any, List[str]]]]:
+        if directive != self._directive:
+            return None
+        return [
+            (
+                {target: data[target]} if isinstance(data, dict) else [target],
+                [os.path.abspath(os.path.expandvars(os.path.expanduser(normslash(target))))],
+            )
+            for target in data
+        ]
+
     def _process_clean(self, targets: Any) -> bool:
         success = True
-        defaults = self._context.defaults().get(self._directive, {})
-        for target in targets:
-            force = defaults.get("force", False)
-            recursive = defaults.get("recursive", False)
-            if isinstance(targets, dict) and isinstance(targets[target], dict):
-                force = targets[target].get("force", force)
-                recursive = targets[target].get("recursive", recursive)
-            success &= self._clean(normslash(target), force=force, recursive=recursive)
+        filesystem = self._context.filesystem()
+        for spec in self._compile(targets):
+            with filesystem.scope(spec.target):
+                success &= self._clean(spec.target, force=spec.force, recursive=spec.recursive)
         if success:
             self._log.info("All targets have been cleaned")
         else:
             self._log.error("Some targets were not successfully cleaned")
         return success
 
+    def _compile(self, targets: Any) -> List[CleanSpec]:
+        """
+        Compiles the targets into specs, merging in defaults.
+        """
+        defaults = self._context.defaults_view().get(self._directive, {})
+        default_force = defaults.get("force", False)
+        default_recursive = defaults.get("recursive", False)
+        specs = []
+        for target in targets:
+            force = default_force
+            recursive = default_recursive
+            if isinstance(targets, dict) and isinstance(targets[target], dict):
+                force = targets[target].get("force", force)
+                recursive = targets[target].get("recursive", recursive)
+            specs.append(CleanSpec(normslash(target), force=force, recursive=recursive))
+        return specs
+
     def _clean(self, target: str, *, force: bool, recursive: bool) -> bool:
         """
         Cleans all the broken symbolic links in target if they point to
         a subdirectory of the base directory or if forced to clean.
         """
-        if not os.path.isdir(os.path.expandvars(os.path.expanduser(target))):
+        filesystem = self._context.filesystem()
+        directory = os.path.expandvars(os.path.expanduser(target))
+        if not filesystem.isdir(directory):
             self._log.debug(f"Ignoring nonexistent directory {target}")
             return True
-        for item in os.listdir(os.path.expandvars(os.path.expanduser(target))):
-            path = os.path.abspath(os.path.join(os.path.expandvars(os.path.expanduser(target)), item))
-            if recursive and os.path.isdir(path):
+        for item in filesystem.listdir(directory):
+            path = os.path.abspath(os.path.join(directory, item))
+            if recursive and filesystem.isdir(path):
                 # isdir implies not islink -- we don't want to descend into
                 # symlinked directories. okay to do a recursive call here
                 # because depth should be fairly limited
                 self._clean(path, force=force, recursive=recursive)
-            if not os.path.exists(path) and os.path.islink(path):
-                points_at = os.path.join(os.path.dirname(path), os.readlink(path))
+            if not filesystem.exists(path) and filesystem.islink(path):
+                points_at = os.path.join(os.path.dirname(path), filesystem.readlink(path))
                 if sys.platform == "win32" and points_at.startswith("\\\\?\\"):
                     points_at = points_at[4:]
                 if self._in_directory(path, self._context.base_directory()) or force:
-                    if self._context.dry_run():
-                        self._log.action(f"Would remove invalid link {path} -> {points_at}")
-                    else:
-                        self._log.action(f"Removing invalid link {path} -> {points_at}")
-                        os.remove(path)
+                    self._context.perform(
+                        Operation(
+                            "remove",
+                            {"path": path},
+                            planned=f"Would remove invalid link {path} -> {points_at}",
+                            performed=f"Removing invalid link {path} -> {points_at}",
+                            failed=None,
+                            announce=True,
+                        )
+                    )
                 else:
                     self._log.info(f"Link {path} -> {points_at} not removed.")
         return True
@@ -73,6 +120,7 @@ class Clean(Plugin):
         """
         Returns true if the path is in the directory.
         """
-        directory = os.path.join(os.path.realpath(directory), "")
-        path = os.path.realpath(path)
+        filesystem = self._context.filesystem()
+        directory = os.path.join(filesystem.realpath(directory), "")
+        path = filesystem.realpath(path)
         return os.path.commonprefix([path, directory]) == directory
@@ -1,68 +1,105 @@
 import os
-from typing import Any
+from typing import Any, List, Optional, Tuple
 
+from dotbot.plan import Operation
 from dotbot.plugin import Plugin
 from dotbot.util.common import normslash
 
 
+class CreateSpec:
+    """
+    A single path to create, with defaults merged in and the path expanded.
+    """
+
+    __slots__ = ("mode", "path")
+
+    path: str
+    mode: int
+
+    def __init__(self, path: str, mode: int):
+        self.path = path
+        self.mode = mode
+
+
 class Create(Plugin):
     """
     Create empty paths.
     """
 
     supports_dry_run = True
+    performs_operations = True
 
     _directive = "create"
 
-    def can_handle(self, directive: str) -> bool:
-        return directive == self._directive
-
     def handle(self, directive: str, data: Any) -> bool:
         if directive != self._directive:
             msg = f"Create cannot handle directive {directive}"
             raise ValueError(msg)
         return self._process_paths(data)
 
+    def partition(self, directive: str, data: Any) -> Optional[List[Tuple[Any, List[str]]]]:
+        if directive != self._directive:
+            return None
+        return [
+            ({key: data[key]} if isinstance(data, dict) else [key], [spec.path])
+            for key, spec in zip(data, self._compile(data))
+        ]
+
+    def fingerprint(self, directive: str, data: Any) -> Optional[str]:
+        if directive != self._directive:
+            return None
+        filesystem = self._context.filesystem()
+        return repr([(spec.path, spec.mode, filesystem.signature(spec.path)) for spec in self._compile(data)])
+
     def _process_paths(self, paths: Any) -> bool:
         success = True
-        defaults = self._context.defaults().get("create", {})
+        filesystem = self._context.filesystem()
+        for spec in self._compile(paths):
+            with filesystem.scope(spec.path):
+                success &= self._create(spec.path, spec.mode)
+        if success:
+            self._log.info("All paths have been set up")
+        else:
+            self._log.error("Some paths were not successfully set up")
+        return success
+
+    def _compile(self, paths: Any) -> List[CreateSpec]:
+        """
+        Compiles the paths into specs, merging in defaults and expanding paths.
+        """
+        defaults = self._context.defaults_view().get("create", {})
+        default_mode = defaults.get("mode", 0o777)  # same as the default for os.makedirs
+        specs = []
         for key in paths:
             path = os.path.abspath(os.path.expandvars(os.path.expanduser(normslash(key))))
-            mode = defaults.get("mode", 0o777)  # same as the default for os.makedirs
+            mode = default_mode
             if isinstance(paths, dict):
                 options = paths[key]
                 if options:
                     mode = options.get("mode", mode)
-            success &= self._create(path, mode)
-        if success:
-            self._log.info("All paths have been set up")
-        else:
-            self._log.error("Some paths were not successfully set up")
-        return success
+            specs.append(CreateSpec(path, mode))
+        return specs
 
     def _exists(self, path: str) -> bool:
         """
         Returns true if the path exists.
         """
-        path = os.path.expanduser(path)
-        return os.path.exists(path)
+        return self._context.filesystem().exists(path)
 
     def _create(self, path: str, mode: int) -> bool:
         success = True
         if not self._exists(path):
             self._log.debug(f"Trying to create path {path} with mode {mode}")
-            try:
-                if self._context.dry_run():
-                    self._log.action(f"Would create path {path}")
-                    return True
-                self._log.action(f"Creating path {path}")
-                os.makedirs(path, mode)
-                # On Windows, the *mode* argument to `os.makedirs()` is ignored.
-                # The mode must be set explicitly in a follow-up call.
-                os.chmod(path, mode)
-            except OSError:
-                self._log.warning(f"Failed to create path {path}")
-                success = False
+            success = self._context.perform(
+                Operation(
+                    "mkdir",
+                    {"path": path, "mode": mode},
+                    planned=f"Would create path {path}",
+                    performed=f"Creating path {path}",
+                    failed=f"Failed to create path {path}",
+                    announce=True,
+                )
+            )
         else:
             self._log.info(f"Path exists {path}")
         return success
@@ -1,14 +1,108 @@
-import glob
 import os
-import shutil
 import sys
 from datetime import datetime, timezone
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
+from dotbot.plan import Operation
 from dotbot.plugin import Plugin
+from dotbot.tracing import Tracer
 from dotbot.util import shell_command
 from dotbot.util.common import normslash
 
+# The options of a link, and their values if they are not configured.
+_DEFAULT_OPTIONS: Dict[str, Any] = {
+    "relative": False,
+    "canonicalize": True,
+    "type": "symlink",
+    "force": False,
+    "relink": False,
+    "create": False,
+    "glob": False,
+    "backup": False,
+    "prefix": "",
+    "if": None,
+    "ignore-missing": False,
+    "exclude": (),
+}
+
+
+class LinkSpec:
+    """
+    A single link, with defaults merged in and paths expanded.
+    """
+
+    __slots__ = (
+        "backup",
+        "canonical_path",
+        "create",
+        "exclude_paths",
+        "force",
+        "ignore_missing",
+        "link_name",
+        "link_type",
+        "path",
+        "prefix",
+        "relative",
+        "relink",
+        "test",
+        "use_glob",
+    )
+
+    link_name: str
+    path: str
+    relative: bool
+    canonical_path: bool
+    link_type: str
+    force: bool
+    relink: bool
+    create: bool
+    use_glob: bool
+    backup: bool
+    prefix: str
+    test: Optional[str]
+    ignore_missing: bool
+    exclude_paths: Sequence[str]
+
+    def __init__(self, link_name: str, path: str, options: Dict[str, Any]):
+        self.link_name = link_name
+        self.path = path
+        self.relative = options["relative"]
+        self.canonical_path = options["canonicalize"]
+        self.link_type = options["type"]
+        self.force = options["force"]
+        self.relink = options["relink"]
+        self.create = options["create"]
+        self.use_glob = options["glob"]
+        self.backup = options["backup"]
+        self.prefix = options["prefix"]
+        self.test = options["if"]
+        self.ignore_missing = options["ignore-missing"]
+        self.exclude_paths = options["exclude"]
+
+
+def _merge_options(options: Mapping[str, Any], overrides: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the link options, with the given overrides applied.
+    """
+    merged = dict(options)
+    for key, value in overrides.items():
+        if key in merged:
+            merged[key] = value
+    # support old "canonicalize-path" key for compatibility
+    if "canonicalize" not in overrides and "canonicalize-path" in overrides:
+        merged["canonicalize"] = overrides["canonicalize-path"]
+    return merged
+
+
+def _static_prefix(pattern: str) -> str:
+    """
+    Returns the longest path that all paths matching the glob pattern are in.
+    """
+    for i, c in enumerate(pattern):
+        if c in "?*[":
+            return os.path.dirname(os.path.abspath(pattern[:i] + "x"))
+    return os.path.abspath(pattern)
+
 
 class Link(Plugin):
     """
@@ -16,12 +110,10 @@ class Link(Plugin):
     """
 
     supports_dry_run = True
+    performs_operations = True
 
     _directive = "link"
 
-    def can_handle(self, directive: str) -> bool:
-        return directive == self._directive
-
     def handle(self, directive: str, data: Any) -> bool:
         if directive != self._directive:
             msg = f"Link cannot handle directive {directive}"
@@ -29,133 +121,199 @@ class Link(Plugin):
         return self._process_links(data)
 
     def _process_links(self, links: Any) -> bool:
-        success = True
-        defaults = self._context.defaults().get("link", {})
+        specs, success = self._compile(links)
+        if specs is None:
+            return False
+        filesystem = self._context.filesystem()
+        for spec in specs:
+            with filesystem.scope(spec.link_name):
+                success &= self._process_link(spec)
+        if success:
+            self._log.info("All links have been set up")
+        else:
+            self._log.error("Some links were not successfully set up")
+        return success
+
+    def partition(self, directive: str, data: Any) -> Optional[List[Tuple[Any, List[str]]]]:
+        defaults = self._compile_defaults()
+        if directive != self._directive or defaults is None or not isinstance(data, dict):
+            return None
+        filesystem = self._context.filesystem()
+        base_directory = self._context.base_directory()
+        parts: List[Tuple[Any, List[str]]] = []
+        for link_name, target in data.items():
+            spec = self._compile_link(link_name, target, defaults)
+            if spec is None:
+                parts.append(({link_name: target}, []))
+                continue
+            link_path = os.path.abspath(os.path.expanduser(spec.link_name))
+            paths = [link_path, _static_prefix(os.path.join(base_directory, spec.path))]
+            paths.extend(_static_prefix(os.path.join(base_directory, p)) for p in spec.exclude_paths)
+            if spec.create and not filesystem.lexists(os.path.dirname(link_path)):
+                # links in the same (missing) directory can't create it at the same time
+                paths.append(os.path.dirname(link_path))
+            parts.append(({link_name: target}, paths))
+        return parts
+
+    def fingerprint(self, directive: str, data: Any) -> Optional[str]:
+        defaults = self._compile_defaults()
+        if directive != self._directive or defaults is None or not isinstance(data, dict):
+            return None
+        filesystem = self._context.filesystem()
+        base_directory = self._context.base_directory()
+        state = []
+        for link_name, target in data.items():
+            spec = self._compile_link(link_name, target, defaults)
+            if spec is None or (spec.use_glob and self._has_glob_chars(spec.path)):
+                # the links that a glob creates depend on more than the state of the pattern
+                return None
+            state.append(
+                (
+                    tuple(getattr(spec, name) for name in LinkSpec.__slots__),
+                    filesystem.signature(spec.link_name, follow_symlinks=False),
+                    filesystem.signature(os.path.join(base_directory, spec.path)),
+                )
+            )
+        return repr(state)
 
-        # Validate the default link type before looping.
-        link_type = defaults.get("type", "symlink")
-        if link_type not in {"symlink", "hardlink"}:
+    def _compile(self, links: Any) -> Tuple[Optional[List["LinkSpec"]], bool]:
+        """
+        Compiles the links into specs, merging in defaults and expanding paths.
+
+        Returns the specs (None if the defaults are invalid, in which case no
+        links should be processed), and whether all of the links are valid.
+        """
+        defaults = self._compile_defaults()
+        if defaults is None:
+            link_type = self._context.defaults_view().get("link", {}).get("type")
             self._log.warning(f"The default link type is not recognized: '{link_type}'")
-            return False
+            return None, False
 
+        success = True
+        specs = []
         for link_name, target in links.items():
-            link_name = os.path.expandvars(normslash(link_name))  # noqa: PLW2901
-            relative = defaults.get("relative", False)
-            # support old "canonicalize-path" key for compatibility
-            canonical_path = defaults.get("canonicalize", defaults.get("canonicalize-path", True))
-            link_type = defaults.get("type", "symlink")
-            force = defaults.get("force", False)
-            relink = defaults.get("relink", False)
-            create = defaults.get("create", False)
-            use_glob = defaults.get("glob", False)
-            backup = defaults.get("backup", False)
-            base_prefix = defaults.get("prefix", "")
-            test = defaults.get("if", None)
-            ignore_missing = defaults.get("ignore-missing", False)
-            exclude_paths = defaults.get("exclude", [])
-            if isinstance(target, dict):
-                # extended config
-                test = target.get("if", test)
-                relative = target.get("relative", relative)
-                canonical_path = target.get("canonicalize", target.get("canonicalize-path", canonical_path))
-                link_type = target.get("type", link_type)
-                if link_type not in {"symlink", "hardlink"}:
-                    msg = f"The link type is not recognized: '{link_type}'"
-                    self._log.warning(msg)
-                    success = False
-                    continue
-                force = target.get("force", force)
-                relink = target.get("relink", relink)
-                create = target.get("create", create)
-                use_glob = target.get("glob", use_glob)
-                backup = target.get("backup", backup)
-                base_prefix = target.get("prefix", base_prefix)
-                ignore_missing = target.get("ignore-missing", ignore_missing)
-                exclude_paths = target.get("exclude", exclude_paths)
-                path = self._default_target(link_name, target.get("path"))
-            else:
-                path = self._default_target(link_name, target)
-            path = normslash(path)
-            if test is not None and not self._test_success(test):
-                self._log.info(f"Skipping {link_name}")
+            spec = self._compile_link(link_name, target, defaults)
+            if spec is None:
+                self._log.warning(f"The link type is not recognized: '{target.get('type')}'")
+                success = False
                 continue
-            path = os.path.normpath(os.path.expandvars(os.path.expanduser(path)))
-            if use_glob and self._has_glob_chars(path):
-                glob_results = self._create_glob_results(path, exclude_paths)
-                self._log.debug(f"Globs from '{path}': {glob_results}")
-                for glob_full_item in glob_results:
-                    # Find common dirname between pattern and the item:
-                    glob_dirname = os.path.dirname(os.path.commonprefix([path, glob_full_item]))
-                    glob_item = glob_full_item if len(glob_dirname) == 0 else glob_full_item[len(glob_dirname) + 1 :]
-                    # Add prefix to basepath, if provided
-                    if base_prefix:
-                        glob_item = base_prefix + glob_item
-                    # where is it going
-                    glob_link_name = os.path.join(link_name, glob_item)
-                    if create:
-                        success &= self._create(glob_link_name)
-                    did_backup = False
-                    did_delete = False
-                    if backup:
-                        did_backup, backup_success = self._backup(glob_link_name)
-                        success &= backup_success
-                    # we only need to consider force/relink if we didn't do a backup
-                    if (force or relink) and not (did_backup and backup_success):
-                        did_delete, delete_success = self._delete(
-                            glob_full_item,
-                            glob_link_name,
-                            relative=relative,
-                            canonical_path=canonical_path,
-                            force=force,
-                        )
-                        success &= delete_success
-                    success &= self._link(
-                        glob_full_item,
-                        glob_link_name,
-                        relative=relative,
-                        canonical_path=canonical_path,
-                        ignore_missing=ignore_missing,
-                        link_type=link_type,
-                        assume_gone=(did_backup or did_delete),
-                    )
-            else:
-                if create:
-                    success &= self._create(link_name)
-                if not ignore_missing and not self._exists(os.path.join(self._context.base_directory(), path)):
-                    # we seemingly check this twice (here and in _link) because
-                    # if the file doesn't exist and force is True, we don't
-                    # want to remove the original (this is tested by test_link_force_leaves_when_nonexistent)
-                    success = False
-                    self._log.warning(f"Nonexistent target {link_name} -> {path}")
-                    continue
+            specs.append(spec)
+        return specs, success
+
+    def _compile_defaults(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the default options, or None if they are invalid.
+        """
+        defaults = _merge_options(_DEFAULT_OPTIONS, self._context.defaults_view().get("link", {}))
+        if defaults["type"] not in {"symlink", "hardlink"}:
+            return None
+        return defaults
+
+    def _compile_link(self, link_name: str, target: Any, defaults: Dict[str, Any]) -> Optional["LinkSpec"]:
+        """
+        Compiles a single link, returning None if its link type is invalid.
+        """
+        link_name = os.path.expandvars(normslash(link_name))
+        if isinstance(target, dict):
+            # extended config
+            options = _merge_options(defaults, target)
+            if options["type"] not in {"symlink", "hardlink"}:
+                return None
+            path = self._default_target(link_name, target.get("path"))
+        else:
+            options = defaults
+            path = self._default_target(link_name, target)
+        path = os.path.normpath(os.path.expandvars(os.path.expanduser(normslash(path))))
+        return LinkSpec(link_name, path, options)
+
+    def _process_link(self, spec: "LinkSpec") -> bool:
+        success = True
+        link_name = spec.link_name
+        path = spec.path
+        if spec.test is not None and not self._test_success(spec.test):
+            self._log.info(f"Skipping {link_name}")
+            return success
+        if spec.use_glob and self._has_glob_chars(path):
+            glob_results = self._create_glob_results(path, spec.exclude_paths)
+            self._log.debug(f"Globs from '{path}': {glob_results}")
+            for glob_full_item in glob_results:
+                # Find common dirname between pattern and the item:
+                glob_dirname = os.path.dirname(os.path.commonprefix([path, glob_full_item]))
+                glob_item = glob_full_item if len(glob_dirname) == 0 else glob_full_item[len(glob_dirname) + 1 :]
+                # Add prefix to basepath, if provided
+                if spec.prefix:
+                    glob_item = spec.prefix + glob_item
+                # where is it going
+                glob_link_name = os.path.join(link_name, glob_item)
+                if spec.create:
+                    success &= self._create(glob_link_name)
                 did_backup = False
                 did_delete = False
-                if backup:
-                    did_backup, backup_success = self._backup(link_name)
+                if spec.backup:
+                    did_backup, backup_success = self._backup(glob_link_name)
                     success &= backup_success
                 # we only need to consider force/relink if we didn't do a backup
-                if (force or relink) and not (did_backup and backup_success):
+                if (spec.force or spec.relink) and not (did_backup and backup_success):
                     did_delete, delete_success = self._delete(
-                        path, link_name, relative=relative, canonical_path=canonical_path, force=force
+                        glob_full_item,
+                        glob_link_name,
+                        relative=spec.relative,
+                        canonical_path=spec.canonical_path,
+                        force=spec.force,
+                        link_type=spec.link_type,
                     )
                     success &= delete_success
                 success &= self._link(
-                    path,
-                    link_name,
-                    relative=relative,
-                    canonical_path=canonical_path,
-                    ignore_missing=ignore_missing,
-                    link_type=link_type,
+                    glob_full_item,
+                    glob_link_name,
+                    relative=spec.relative,
+                    canonical_path=spec.canonical_path,
+                    ignore_missing=spec.ignore_missing,
+                    link_type=spec.link_type,
                     assume_gone=(did_backup or did_delete),
                 )
-        if success:
-            self._log.info("All links have been set up")
-        else:
-            self._log.error("Some links were not successfully set up")
+            return success
+        if spec.create:
+            success &= self._create(link_name)
+        if not spec.ignore_missing and not self._exists(os.path.join(self._context.base_directory(), path)):
+            # we seemingly check this twice (here and in _link) because
+            # if the file doesn't exist and force is True, we don't
+            # want to remove the original (this is tested by test_link_force_leaves_when_nonexistent)
+            self._log.warning(f"Nonexistent target {link_name} -> {path}")
+            return False
+        did_backup = False
+        did_delete = False
+        if spec.backup:
+            did_backup, backup_success = self._backup(link_name)
+            success &= backup_success
+        # we only need to consider force/relink if we didn't do a backup
+        if (spec.force or spec.relink) and not (did_backup and backup_success):
+            did_delete, delete_success = self._delete(
+                path,
+                link_name,
+                relative=spec.relative,
+                canonical_path=spec.canonical_path,
+                force=spec.force,
+                link_type=spec.link_type,
+            )
+            success &= delete_success
+        success &= self._link(
+            path,
+            link_name,
+            relative=spec.relative,
+            canonical_path=spec.canonical_path,
+            ignore_missing=spec.ignore_missing,
+            link_type=spec.link_type,
+            assume_gone=(did_backup or did_delete),
+        )
         return success
 
     def _test_success(self, command: str) -> bool:
-        ret = shell_command(command, cwd=self._context.base_directory())
+        with Tracer().span("if", "test", command=command):
+            ret = shell_command(command, cwd=self._context.base_directory())
+        # the command may have changed the filesystem
+        self._context.filesystem().invalidate()
+        self._context.filesystem().observe_test(command, self._context.base_directory(), success=ret == 0)
         if ret != 0:
             self._log.debug(f"Test '{command}' returned false")
         return ret == 0
@@ -175,17 +333,17 @@ class Link(Plugin):
         """
         Wrap `glob.glob` in a python agnostic way, catching errors in usage.
         """
-        found = glob.glob(path, recursive=True)
+        found = self._context.filesystem().glob(path)
         # normalize paths to ensure cross-platform compatibility
         found = [os.path.normpath(p) for p in found]
         # if using recursive glob (`**`), filter results to return only files:
         if "**" in path and not path.endswith(str(os.sep)):
             self._log.debug("Excluding directories from recursive glob: " + str(path))
-            found = [f for f in found if os.path.isfile(f)]
+            found = [f for f in found if self._context.filesystem().isfile(f)]
         # return matched results
         return found
 
-    def _create_glob_results(self, path: str, exclude_paths: List[str]) -> List[str]:
+    def _create_glob_results(self, path: str, exclude_paths: Sequence[str]) -> List[str]:
         self._log.debug("Globbing with pattern: " + str(path))
         include = self._glob(path)
         self._log.debug("Glob found : " + str(include))
@@ -202,48 +360,50 @@ class Link(Plugin):
         """
         Returns true if the path is a symbolic link.
         """
-        return os.path.islink(os.path.expanduser(path))
+        return self._context.filesystem().islink(path)
 
     def _link_target(self, path: str) -> str:
         """
         Returns the target of the symbolic link.
         """
-        path = os.path.expanduser(path)
-        path = os.readlink(path)
+        path = self._context.filesystem().readlink(path)
         if sys.platform == "win32" and path.startswith("\\\\?\\"):
             path = path[4:]
         return path
 
     def _exists(self, path: str) -> bool:
         """
-        Returns true if the path exists.
+        Returns true if the path exists, or, in a dry run, would exist.
         """
-        path = os.path.expanduser(path)
-        return os.path.exists(path)
+        planned = self._context.planned(path)
+        if planned is not None:
+            return planned
+        return self._context.filesystem().exists(path)
 
     def _lexists(self, path: str) -> bool:
         """
-        Returns true if the path exists (including broken symlinks).
+        Returns true if the path exists (including broken symlinks), or, in a
+        dry run, would exist.
         """
-        path = os.path.expanduser(path)
-        return os.path.lexists(path)
+        planned = self._context.planned(path)
+        if planned is not None:
+            return planned
+        return self._context.filesystem().lexists(path)
 
     def _create(self, path: str) -> bool:
         success = True
         parent = os.path.abspath(os.path.join(os.path.expanduser(path), os.pardir))
         if not self._exists(parent):
             self._log.debug(f"Try to create parent: {parent}")
-            if self._context.dry_run():
-                self._log.action(f"Would create directory {parent}")
-                return True
-            try:
-                os.makedirs(parent)
-            except OSError as e:
-                self._log.warning(f"Failed to create directory {parent}")
-                self._log.debug(f"OSError: {e!s}")
-                success = False
-            else:
-                self._log.action(f"Creating directory {parent}")
+            success = self._context.perform(
+                Operation(
+                    "mkdir",
+                    {"path": parent},
+                    planned=f"Would create directory {parent}",
+                    performed=f"Creating directory {parent}",
+                    failed=f"Failed to create directory {parent}",
+                )
+            )
         return success
 
     def _backup(self, path: str) -> Tuple[bool, bool]:
@@ -251,62 +411,100 @@ class Link(Plugin):
             timestamp = datetime.now(timezone.utc).astimezone().strftime("%Y%m%d-%H%M%S")
             backup_name = f"{path}.dotbot-backup.{timestamp}"
             self._log.debug(f"Try to backup file {path} to {backup_name}")
-            if self._context.dry_run():
-                self._log.action(f"Would backup {path} to {backup_name}")
-                return True, True
-            try:
-                os.rename(os.path.abspath(os.path.expanduser(path)), os.path.abspath(os.path.expanduser(backup_name)))
-            except OSError as e:
-                self._log.warning(f"Failed to backup file {path} to {backup_name}")
-                self._log.debug(f"OSError: {e!s}")
-                return False, False
-            else:
-                self._log.action(f"Backed up file {path} to {backup_name}")
-                return True, True
+            backed_up = self._context.perform(
+                Operation(
+                    "backup",
+                    {
+                        "path": os.path.abspath(os.path.expanduser(path)),
+                        "destination": os.path.abspath(os.path.expanduser(backup_name)),
+                    },
+                    planned=f"Would backup {path} to {backup_name}",
+                    performed=f"Backed up file {path} to {backup_name}",
+                    failed=f"Failed to backup file {path} to {backup_name}",
+                )
+            )
+            return backed_up, backed_up
         return False, True
 
     def _delete(
-        self, target: str, path: str, *, relative: bool, canonical_path: bool, force: bool
+        self, target: str, path: str, *, relative: bool, canonical_path: bool, force: bool, link_type: str
     ) -> Tuple[bool, bool]:
         success = True
         removed = False
         target = os.path.join(self._context.base_directory(canonical_path=canonical_path), target)
         fullpath = os.path.abspath(os.path.expanduser(path))
-        if self._exists(path) and not self._is_link(path) and os.path.realpath(fullpath) == target:
+        filesystem = self._context.filesystem()
+        if self._exists(path) and not self._is_link(path) and filesystem.realpath(fullpath) == target:
             # Special case: The path is not a symlink but resolves to the target anyway.
             # Deleting the path would actually delete the target.
             # This may happen if a parent directory is a symlink.
             self._log.warning(f"{path} appears to be the same file as {target}.")
             return False, False
+        target = self._destination(target, fullpath, link_type)
         if relative:
             target = self._relative_path(target, fullpath)
         if (self._is_link(path) and self._link_target(path) != target) or (
             self._lexists(path) and not self._is_link(path)
         ):
-            if self._context.dry_run():
+            kind = None
+            if filesystem.islink(fullpath):
+                kind = "unlink"
+            elif force:
+                kind = "rmtree" if filesystem.isdir(fullpath) else "remove"
+            if kind is None and self._context.dry_run():
+                # dry runs have always reported the removal, although without
+                # force, a real run leaves anything but a symbolic link in
+                # place, so the plan doesn't assume that the path is gone
                 self._log.action(f"Would remove {path}")
-                removed = True
-            else:
-                try:
-                    if os.path.islink(fullpath):
-                        os.unlink(fullpath)
-                        removed = True
-                    elif force:
-                        if os.path.isdir(fullpath):
-                            shutil.rmtree(fullpath)
-                            removed = True
-                        else:
-                            os.remove(fullpath)
-                            removed = True
-                except OSError as e:
-                    self._log.warning(f"Failed to remove {path}")
-                    self._log.debug(f"OSError: {e!s}")
-                    success = False
-                else:
-                    if removed:
-                        self._log.action(f"Removing {path}")
+            elif kind is not None:
+                removed = self._context.perform(
+                    Operation(
+                        kind,
+                        {"path": fullpath},
+                        planned=f"Would remove {path}",
+                        performed=f"Removing {path}",
+                        failed=f"Failed to remove {path}",
+                    )
+                )
+                success = removed
         return removed, success
 
+    def _destination(self, absolute_target: str, link_path: str, link_type: str) -> str:
+        """
+        Returns the path that the symbolic link at link_path should point to:
+        the target, or, with generations, the link's path in the current
+        generation.
+        """
+        generations = self._context.generations()
+        if generations is None or link_type != "symlink":
+            return absolute_target
+        return generations.path(link_path)
+
+    def _stage(self, absolute_target: str, link_path: str, link_name: str) -> bool:
+        """
+        Adds the link to the new generation.
+
+        Returns true if successfully staged the link.
+        """
+        generations = self._context.generations()
+        if generations is None or self._context.dry_run():
+            return True
+        try:
+            generations.stage(link_path, absolute_target)
+        except OSError as e:
+            self._log.warning(f"Failed to stage link {link_name} -> {absolute_target}")
+            self._log.debug(f"OSError: {e!s}")
+            return False
+        return True
+
+    def _record(self, link_path: str, target_path: str) -> None:
+        """
+        Records the symbolic link in the manifest, if there is one.
+        """
+        manifest = self._context.manifest()
+        if manifest is not None:
+            manifest.add(link_path, target_path)
+
     def _relative_path(self, target: str, link_name: str) -> str:
         """
         Returns the relative path to get to the target file from the
@@ -338,7 +536,10 @@ class Link(Plugin):
         base_directory = self._context.base_directory(canonical_path=canonical_path)
         absolute_target = os.path.join(base_directory, target)
         link_name = os.path.normpath(link_name)
-        target_path = self._relative_path(absolute_target, link_path) if relative else absolute_target
+        destination = self._destination(absolute_target, link_path, link_type)
+        target_path = self._relative_path(destination, link_path) if relative else destination
+        if destination != absolute_target and not self._stage(absolute_target, link_path, link_name):
+            return False
 
         # we need to use absolute_target below because our cwd is the dotfiles
         # directory, and if target_path is relative, it will be relative to the
@@ -346,21 +547,19 @@ class Link(Plugin):
         if ((not self._lexists(link_name)) or (self._context.dry_run() and assume_gone)) and (
             ignore_missing or self._exists(absolute_target)
         ):
-            if self._context.dry_run():
-                self._log.action(f"Would create {link_type} {link_name} -> {target_path}")
-                return True
-            try:
-                if link_type == "symlink":
-                    os.symlink(target_path, link_path)
-                else:  # link_type == "hardlink"
-                    os.link(absolute_target, link_path)
-            except OSError as e:
-                self._log.warning(f"Linking failed {link_name} -> {target_path}")
-                self._log.debug(f"OSError: {e!s}")
-                return False
-            else:
-                self._log.action(f"Creating {link_type} {link_name} -> {target_path}")
-                return True
+            linked = self._context.perform(
+                Operation(
+                    link_type,
+                    # hard links are created from the absolute target, because our cwd isn't the link directory
+                    {"source": target_path if link_type == "symlink" else absolute_target, "path": link_path},
+                    planned=f"Would create {link_type} {link_name} -> {target_path}",
+                    performed=f"Creating {link_type} {link_name} -> {target_path}",
+                    failed=f"Linking failed {link_name} -> {target_path}",
+                )
+            )
+            if linked and link_type == "symlink":
+                self._record(link_path, target_path)
+            return linked
 
         # Failure case: The link name exists and is a symlink
         if self._is_link(link_name):
@@ -368,6 +567,7 @@ class Link(Plugin):
                 if self._link_target(link_name) == target_path:
                     # Idempotent case: The configured symlink already exists
                     self._log.info(f"Link exists {link_name} -> {target_path}")
+                    self._record(link_path, target_path)
                     return True
 
                 # The existing symlink isn't pointing at the target.
@@ -380,7 +580,8 @@ class Link(Plugin):
             return False
 
         # Failure case: The link name exists
-        if link_type == "hardlink" and os.stat(link_path).st_ino == os.stat(absolute_target).st_ino:
+        filesystem = self._context.filesystem()
+        if link_type == "hardlink" and filesystem.stat(link_path).st_ino == filesystem.stat(absolute_target).st_ino:
             # Idempotent case: The configured hardlink already exists
             self._log.info(f"Link exists {link_name} -> {target_path}")
             return True
@@ -1,7 +1,33 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
+from dotbot.messenger import Level
+from dotbot.plan import Operation
 from dotbot.plugin import Plugin
-from dotbot.util.common import shell_command
+
+
+class ShellSpec:
+    """
+    A single shell command, with defaults merged in.
+    """
+
+    __slots__ = ("command", "description", "quiet", "stderr", "stdin", "stdout")
+
+    command: str
+    description: Optional[str]
+    stdin: bool
+    stdout: bool
+    stderr: bool
+    quiet: bool
+
+    def __init__(
+        self, command: str, description: Optional[str], *, stdin: bool, stdout: bool, stderr: bool, quiet: bool
+    ):
+        self.command = command
+        self.description = description
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.quiet = quiet
 
 
 class Shell(Plugin):
@@ -10,74 +36,99 @@ class Shell(Plugin):
     """
 
     supports_dry_run = True
+    performs_operations = True
 
     _directive = "shell"
     _has_shown_override_message = False
 
-    def can_handle(self, directive: str) -> bool:
-        return directive == self._directive
-
     def handle(self, directive: str, data: Any) -> bool:
         if directive != self._directive:
             msg = f"Shell cannot handle directive {directive}"
             raise ValueError(msg)
         return self._process_commands(data)
 
+    def fingerprint(self, directive: str, data: Any) -> Optional[str]:
+        if directive != self._directive:
+            return None
+        # commands are only skipped if they (and their options) haven't changed
+        return repr([tuple(getattr(spec, name) for name in ShellSpec.__slots__) for spec in self._compile(data)])
+
     def _process_commands(self, data: Any) -> bool:
         success = True
-        defaults = self._context.defaults().get("shell", {})
+        specs = self._compile(data)
         options = self._get_option_overrides()
-        for item in data:
-            stdin = defaults.get("stdin", False)
-            stdout = defaults.get("stdout", False)
-            stderr = defaults.get("stderr", False)
-            quiet = defaults.get("quiet", False)
-            if isinstance(item, dict):
-                cmd = item["command"]
-                msg = item.get("description", None)
-                stdin = item.get("stdin", stdin)
-                stdout = item.get("stdout", stdout)
-                stderr = item.get("stderr", stderr)
-                quiet = item.get("quiet", quiet)
-            elif isinstance(item, list):
-                cmd = item[0]
-                msg = item[1] if len(item) > 1 else None
-            else:
-                cmd = item
-                msg = None
-            prefix = "Would run command " if self._context.dry_run() else ""
-            if quiet:
+        for spec in specs:
+            cmd = spec.command
+            msg = spec.description
+            level = Level.ACTION
+            message: Optional[str] = None
+            if spec.quiet:
                 if msg is not None:
-                    self._log.info(f"{prefix}{msg}")
+                    level = Level.INFO
+                    message = msg
                 # if quiet and no msg, show nothing
             elif msg is None:
-                self._log.action(f"{prefix}{cmd}")
+                message = cmd
             else:
-                self._log.action(f"{prefix}{msg} [{cmd}]")
-            if self._context.dry_run():
-                continue
-            stdout = options.get("stdout", stdout)
-            stderr = options.get("stderr", stderr)
-            ret = shell_command(
-                cmd,
-                cwd=self._context.base_directory(),
-                enable_stdin=stdin,
-                enable_stdout=stdout,
-                enable_stderr=stderr,
-            )
-            if ret != 0:
+                message = f"{msg} [{cmd}]"
+            if not self._context.perform(
+                Operation(
+                    "shell",
+                    {
+                        "command": cmd,
+                        "cwd": self._context.base_directory(),
+                        "stdin": spec.stdin,
+                        "stdout": options.get("stdout", spec.stdout),
+                        "stderr": options.get("stderr", spec.stderr),
+                    },
+                    planned=None if message is None else f"Would run command {message}",
+                    performed=message,
+                    failed=f"Command [{cmd}] failed",
+                    level=level,
+                    announce=True,
+                )
+            ):
                 success = False
-                self._log.warning(f"Command [{cmd}] failed")
         if success:
             self._log.info("All commands have been executed")
         else:
             self._log.error("Some commands were not successfully executed")
         return success
 
+    def _compile(self, data: Any) -> List[ShellSpec]:
+        """
+        Compiles the commands into specs, merging in defaults.
+
+        Malformed commands raise an exception here, before any command is run.
+        """
+        defaults = self._context.defaults_view().get("shell", {})
+        stdin = defaults.get("stdin", False)
+        stdout = defaults.get("stdout", False)
+        stderr = defaults.get("stderr", False)
+        quiet = defaults.get("quiet", False)
+        specs = []
+        for item in data:
+            if isinstance(item, dict):
+                spec = ShellSpec(
+                    item["command"],
+                    item.get("description", None),
+                    stdin=item.get("stdin", stdin),
+                    stdout=item.get("stdout", stdout),
+                    stderr=item.get("stderr", stderr),
+                    quiet=item.get("quiet", quiet),
+                )
+            elif isinstance(item, list):
+                msg = item[1] if len(item) > 1 else None
+                spec = ShellSpec(item[0], msg, stdin=stdin, stdout=stdout, stderr=stderr, quiet=quiet)
+            else:
+                spec = ShellSpec(item, None, stdin=stdin, stdout=stdout, stderr=stderr, quiet=quiet)
+            specs.append(spec)
+        return specs
+
     def _get_option_overrides(self) -> Dict[str, bool]:
         ret = {}
-        options = self._context.options()
-        if options.verbose > 1:
+        options = self._context.options_view()
+        if getattr(options, "verbose", 0) > 1:
             ret["stderr"] = True
             ret["stdout"] = True
             if not self._has_shown_override_message:
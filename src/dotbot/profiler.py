@@ -0,0 +1,124 @@
+import contextlib
+import json
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class Profiler:
+    """
+    Records how much wall-clock time and CPU time tasks, actions, and plugins
+    take.
+
+    Measurements are grouped by kind ("task", "action", or "plugin") and name:
+    each task is measured on its own, whereas, for example, all of the link
+    actions in a configuration add up to a single entry. CPU time is the time
+    spent in Dotbot itself, which doesn't include commands that it runs.
+
+    With more than one job (see --jobs), each part of an action that runs in
+    parallel is measured on its own, so plugin times overlap, and can add up
+    to more than the run took; the report says so.
+    """
+
+    KINDS = ("task", "action", "plugin")
+
+    def __init__(self, jobs: int = 1) -> None:
+        self._jobs = jobs
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], _Entry] = {}
+
+    @contextlib.contextmanager
+    def measure(self, kind: str, name: str) -> Iterator[None]:
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def record(self, kind: str, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            entry = self._entries.get((kind, name))
+            if entry is None:
+                entry = self._entries[(kind, name)] = _Entry(kind, name)
+            entry.count += 1
+            entry.wall += wall
+            entry.cpu += cpu
+
+    def tasks(self, tasks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Measures the time that the caller spends on each task, from when it
+        is yielded until the next one is requested.
+        """
+        for index, task in enumerate(tasks):
+            with self.measure("task", f"{index} ({', '.join(task)})"):
+                yield task
+
+    def actions(self, actions: Iterable[str]) -> Iterator[str]:
+        """
+        Measures the time that the caller spends on each action of a task.
+        """
+        for action in actions:
+            with self.measure("action", action):
+                yield action
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """
+        Returns the measurements, with the slowest entries of each kind first.
+        """
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda entry: (self.KINDS.index(entry.kind), -entry.wall))
+            return [
+                {"kind": entry.kind, "name": entry.name, "count": entry.count, "wall": entry.wall, "cpu": entry.cpu}
+                for entry in entries
+            ]
+
+    def summary(self, limit: int = 10) -> List[str]:
+        """
+        Returns a human-readable summary of the slowest entries of each kind.
+        """
+        if self._jobs > 1:
+            lines = [
+                f"Profile with {self._jobs} concurrent jobs (wall time, CPU time, calls);",
+                "plugin times overlap, so they can add up to more than the run took:",
+            ]
+        else:
+            lines = ["Profile (wall time, CPU time, calls):"]
+        entries = self.entries()
+        for kind in self.KINDS:
+            of_kind = [entry for entry in entries if entry["kind"] == kind]
+            if not of_kind:
+                continue
+            lines.append(f"  {kind}s")
+            lines.extend(
+                f"    {entry['wall']:9.3f}s {entry['cpu']:9.3f}s {entry['count']:6d}  {entry['name']}"
+                for entry in of_kind[:limit]
+            )
+            if len(of_kind) > limit:
+                lines.append(f"    ... and {len(of_kind) - limit} more")
+        return lines
+
+    def write(self, path: str) -> None:
+        """
+        Writes the measurements to a JSON file.
+        """
+        with open(path, "w") as file:
+            json.dump({"version": 1, "jobs": self._jobs, "entries": self.entries()}, file, indent=2)
+            file.write("\n")
+
+
+class _Entry:
+    __slots__ = ("count", "cpu", "kind", "name", "wall")
+
+    kind: str
+    name: str
+    count: int
+    wall: float
+    cpu: float
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
@@ -0,0 +1,188 @@
+import collections
+import contextlib
+import os
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, ContextManager, Deque, Dict, List, Optional, Sequence, Set
+
+from dotbot.messenger import Messenger
+
+if TYPE_CHECKING:
+    from dotbot.plan import Operation, Plan
+
+
+class Scheduler:
+    """
+    Runs units of work on a pool of threads.
+
+    Each unit declares the paths that it may read or change (including
+    everything beneath them). A unit only starts once all of the earlier units
+    whose paths overlap with its own have finished, so units that touch the
+    same part of the filesystem run in the order in which they were submitted,
+    and other units run in parallel.
+
+    Messages that units log are buffered and printed in the order in which the
+    units were submitted, so the output does not depend on the scheduling. The
+    same goes for the operations that units add to the plan, if any.
+    """
+
+    def __init__(self, jobs: int, *, stop_on_failure: bool, plan: "Optional[Plan]" = None):
+        self._log = Messenger()
+        self._plan = plan
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+        self._stop_on_failure = stop_on_failure
+        self._stopped = False
+        self._success = True
+        # units whose output hasn't been printed yet, in submission order
+        self._unflushed: Deque[_Unit] = collections.deque()
+        self._running: Dict[Future[bool], _Unit] = {}
+        self._finished: queue.Queue[Future[bool]] = queue.Queue()
+        # for finding overlapping units: the last unit that touched each path,
+        # and the units that touched paths beneath each path
+        self._last: Dict[str, _Unit] = {}
+        self._beneath: Dict[str, List[_Unit]] = {}
+
+    @property
+    def stopped(self) -> bool:
+        """
+        True if a unit failed and stop_on_failure is set, in which case no
+        further units are started.
+        """
+        return self._stopped
+
+    def submit(self, function: Callable[[], bool], paths: Sequence[str]) -> None:
+        """
+        Schedules the function, which returns whether it succeeded, to run
+        once the earlier units that touch any of the absolute paths have
+        finished.
+        """
+        if self._stopped:
+            return
+        unit = _Unit(function)
+        for dependency in self._dependencies(unit, paths):
+            dependency.dependents.append(unit)
+            unit.waiting += 1
+        self._unflushed.append(unit)
+        if unit.waiting == 0:
+            self._start(unit)
+        self._collect(block=False)
+
+    def drain(self) -> bool:
+        """
+        Waits for all units to finish (or, if stopped, for all running units
+        to finish), prints their output, and returns whether all of them
+        succeeded.
+        """
+        while self._running:
+            self._collect(block=True)
+        for unit in self._unflushed:
+            if unit.output is not None:
+                self._flush(unit.output, unit.operations)
+        self._unflushed.clear()
+        self._last = {}
+        self._beneath = {}
+        return self._success
+
+    def shutdown(self) -> None:
+        for future in self._running:
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _dependencies(self, unit: "_Unit", paths: Sequence[str]) -> Set["_Unit"]:
+        dependencies: Set[_Unit] = set()
+        for path in paths:
+            # units that touched the path or one of its ancestors
+            ancestor = path
+            while True:
+                last = self._last.get(ancestor)
+                if last is not None and not last.done:
+                    dependencies.add(last)
+                parent = os.path.dirname(ancestor)
+                if parent == ancestor:
+                    break
+                ancestor = parent
+            # units that touched a path beneath the path; all of them finish
+            # before this unit, so later units only need to wait for this one
+            dependencies.update(other for other in self._beneath.pop(path, ()) if not other.done)
+        for path in paths:
+            self._last[path] = unit
+            ancestor = os.path.dirname(path)
+            while True:
+                self._beneath.setdefault(ancestor, []).append(unit)
+                parent = os.path.dirname(ancestor)
+                if parent == ancestor:
+                    break
+                ancestor = parent
+        dependencies.discard(unit)
+        return dependencies
+
+    def _start(self, unit: "_Unit") -> None:
+        future = self._executor.submit(self._run, unit)
+        self._running[future] = unit
+        future.add_done_callback(self._finished.put)
+
+    def _run(self, unit: "_Unit") -> bool:
+        capture_operations: ContextManager[List[Operation]] = (
+            contextlib.nullcontext([]) if self._plan is None else self._plan.capture()
+        )
+        with self._log.capture() as output, capture_operations as operations:
+            try:
+                return unit.function()
+            finally:
+                unit.operations = operations
+                unit.output = output
+
+    def _flush(self, output: List[str], operations: "List[Operation]") -> None:
+        """
+        Prints the output of a finished unit, and adds its operations to the
+        plan.
+        """
+        self._log.emit(output)
+        if self._plan is not None:
+            self._plan.extend(operations)
+
+    def _collect(self, *, block: bool) -> None:
+        while self._running:
+            try:
+                future = self._finished.get(block=block)
+            except queue.Empty:
+                break
+            # after the first unit, only collect the ones that have already finished
+            block = False
+            unit = self._running.pop(future)
+            unit.done = True
+            if not future.result():
+                self._success = False
+                if self._stop_on_failure:
+                    self._stopped = True
+            if self._stopped:
+                continue
+            for dependent in unit.dependents:
+                dependent.waiting -= 1
+                if dependent.waiting == 0:
+                    self._start(dependent)
+        # print the output of finished units, in order
+        while self._unflushed:
+            output = self._unflushed[0].output
+            if output is None:
+                break
+            self._flush(output, self._unflushed.popleft().operations)
+
+
+class _Unit:
+    __slots__ = ("dependents", "done", "function", "operations", "output", "waiting")
+
+    function: Callable[[], bool]
+    dependents: "List[_Unit]"
+    waiting: int
+    done: bool
+    output: Optional[List[str]]
+    operations: "List[Operation]"
+
+    def __init__(self, function: Callable[[], bool]):
+        self.function = function
+        self.dependents = []
+        self.waiting = 0
+        self.done = False
+        self.output = None
+        self.operations = []
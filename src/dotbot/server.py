@@ -0,0 +1,198 @@
+import array
+import contextlib
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import traceback
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+from dotbot import cli
+from dotbot.config import MemoryConfigCache
+from dotbot.messenger import Level, Messenger
+from dotbot.util.module import PluginCache
+
+# standard input, output, and error
+_STREAMS = (0, 1, 2)
+
+
+class Server:
+    """
+    Runs Dotbot for clients that connect to a Unix socket (see
+    dotbot.client), so that runs don't pay for starting Python and loading
+    Dotbot. Plugins and parsed configuration files are kept for later runs,
+    as long as their files don't change.
+
+    Clients send their arguments, working directory, and environment, along
+    with their standard input, output, and error, so that runs read from and
+    write to the client's terminal directly. Runs are handled one at a time.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._log = Messenger()
+        self._config_cache = MemoryConfigCache()
+        self._plugin_cache = PluginCache()
+
+    def serve(self) -> None:
+        """
+        Handles runs until the server is interrupted or terminated.
+        """
+        with self._bind() as listener:
+            msg = f"Listening on {self._path}"
+            self._log.info(msg)
+            previous = signal.signal(signal.SIGTERM, _terminate)
+            try:
+                while True:
+                    connection, _ = listener.accept()
+                    with connection:
+                        self._handle(connection)
+            except (KeyboardInterrupt, _Terminated):
+                pass
+            finally:
+                signal.signal(signal.SIGTERM, previous)
+                with contextlib.suppress(OSError):
+                    os.unlink(self._path)
+
+    def _bind(self) -> socket.socket:
+        if not hasattr(socket, "AF_UNIX"):
+            msg = "`--serve` is not supported on this platform"
+            raise ServerError(msg)
+        try:
+            mode = os.lstat(self._path).st_mode
+        except OSError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                msg = f"{self._path} already exists"
+                raise ServerError(msg)
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self._path)
+                except OSError:
+                    # left behind by a server that was killed
+                    os.unlink(self._path)
+                else:
+                    msg = f"Another server is listening on {self._path}"
+                    raise ServerError(msg)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # runs can do anything that the user can, so only the user can connect
+        umask = os.umask(0o077)
+        try:
+            listener.bind(self._path)
+        except OSError as e:
+            listener.close()
+            msg = f"Could not listen on {self._path}: {e}"
+            raise ServerError(msg) from e
+        finally:
+            os.umask(umask)
+        listener.listen()
+        return listener
+
+    def _handle(self, connection: socket.socket) -> None:
+        streams: List[int] = []
+        try:
+            try:
+                arguments, cwd, environment = self._receive(connection, streams)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                msg = f"Ignoring an invalid request: {e}"
+                self._log.warning(msg)
+                return
+            status = self._run(arguments, cwd, environment, streams)
+        finally:
+            for fd in streams:
+                os.close(fd)
+        with contextlib.suppress(OSError):
+            connection.sendall(json.dumps({"status": status}).encode("utf-8") + b"\n")
+
+    def _receive(self, connection: socket.socket, streams: List[int]) -> Tuple[List[str], str, Dict[str, str]]:
+        """
+        Receives a request, adding the file descriptors of the client's
+        standard input, output, and error to streams.
+        """
+        fds = array.array("i")
+        data, ancillary, _, _ = connection.recvmsg(65536, socket.CMSG_LEN(len(_STREAMS) * fds.itemsize))
+        for level, kind, payload in ancillary:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                fds.frombytes(payload[: len(payload) - len(payload) % fds.itemsize])
+        streams.extend(fds)
+        while not data.endswith(b"\n"):
+            chunk = connection.recv(65536)
+            if not chunk:
+                msg = "incomplete request"
+                raise ValueError(msg)
+            data += chunk
+        request = json.loads(data)
+        if request.get("version") != 1:
+            msg = "unsupported version"
+            raise ValueError(msg)
+        if len(streams) != len(_STREAMS):
+            msg = "missing standard input, output, or error"
+            raise ValueError(msg)
+        arguments = [str(argument) for argument in request["arguments"]]
+        environment = {str(name): str(value) for name, value in request["environment"].items()}
+        return arguments, str(request["cwd"]), environment
+
+    def _run(self, arguments: List[str], cwd: str, environment: Dict[str, str], streams: List[int]) -> int:
+        """
+        Runs Dotbot as the client would, and returns the exit status.
+        """
+        saved_cwd = os.getcwd()
+        saved_environment = dict(os.environ)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved_streams = [os.dup(fd) for fd in _STREAMS]
+        try:
+            for fd, client_fd in zip(_STREAMS, streams):
+                os.dup2(client_fd, fd)
+            os.environ.clear()
+            os.environ.update(environment)
+            # runs only change the level if they are quiet or verbose
+            self._log.set_level(Level.ACTION)
+            return self._main(arguments, cwd)
+        finally:
+            with contextlib.suppress(OSError):
+                sys.stdout.flush()
+            with contextlib.suppress(OSError):
+                sys.stderr.flush()
+            for fd, saved_fd in zip(_STREAMS, saved_streams):
+                os.dup2(saved_fd, fd)
+                os.close(saved_fd)
+            os.environ.clear()
+            os.environ.update(saved_environment)
+            os.chdir(saved_cwd)
+
+    def _main(self, arguments: List[str], cwd: str) -> int:
+        try:
+            os.chdir(cwd)
+            options = cli.build_parser().parse_args(arguments)
+            if options.serve or options.connect:
+                self._log.error("`--serve` and `--connect` cannot be used with `--connect`")
+                return 1
+            cli.main(arguments, config_cache=self._config_cache, plugin_cache=self._plugin_cache)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                return e.code or 0
+            print(e.code, file=sys.stderr)  # noqa: T201
+            return 1
+        except Exception:  # noqa: BLE001 # reported to the client, and the server keeps serving
+            traceback.print_exc()
+            return 1
+        return 0
+
+
+class ServerError(Exception):
+    pass
+
+
+class _Terminated(BaseException):
+    """
+    Stops the server, even during a run, which handles KeyboardInterrupt.
+    """
+
+
+def _terminate(_signum: int, _frame: Optional[FrameType]) -> None:
+    raise _Terminated
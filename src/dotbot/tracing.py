@@ -0,0 +1,146 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from types import TracebackType
+from typing import Any, ContextManager, Dict, Iterable, Iterator, List, Optional, Type, TypeVar
+
+from dotbot.util.singleton import Singleton
+
+T = TypeVar("T")
+
+
+class Tracer(metaclass=Singleton):
+    """
+    Records a timeline of a run, in the Trace Event Format that Perfetto and
+    chrome://tracing can display.
+
+    Tracing is disabled until start() is called, and spans cost next to
+    nothing while it is disabled.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._events: Optional[List[Dict[str, Any]]] = None
+        self._threads: Dict[int, str] = {}
+        self._origin = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._events is not None
+
+    def start(self) -> None:
+        """
+        Discards any previously recorded spans and starts recording.
+        """
+        with self._lock:
+            self._events = []
+            self._threads = {}
+            self._origin = time.perf_counter()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._events = None
+
+    def span(self, name: str, category: str, **args: Any) -> ContextManager[None]:
+        """
+        Returns a context manager that records a span covering the with
+        statement. The keyword arguments are shown with the span.
+        """
+        if self._events is None:
+            return _NULL_SPAN
+        return _Span(self, name, category, args)
+
+    def iterate(self, iterable: Iterable[T], name: str, category: str) -> Iterable[T]:
+        """
+        Records a span for each item of the iterable, covering the time it
+        takes to produce the item (e.g., to parse it).
+        """
+        if self._events is None:
+            return iterable
+        return self._iterate(iterable, name, category)
+
+    def each(self, names: Iterable[str], category: str) -> Iterable[str]:
+        """
+        Records a span for each name, covering the time that the caller spends
+        on it, from when it is yielded until the next one is requested.
+        """
+        if self._events is None:
+            return names
+        return self._each(names, category)
+
+    def _iterate(self, iterable: Iterable[T], name: str, category: str) -> Iterator[T]:
+        iterator = iter(iterable)
+        while True:
+            with self.span(name, category):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def _each(self, names: Iterable[str], category: str) -> Iterator[str]:
+        for name in names:
+            with self.span(name, category):
+                yield name
+
+    def write(self, path: str) -> None:
+        """
+        Writes the recorded spans to a JSON file.
+        """
+        with self._lock:
+            events = list(self._events or [])
+            threads = dict(self._threads)
+        pid = os.getpid()
+        for tid, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}})
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+            file.write("\n")
+
+    def _record(self, name: str, category: str, args: Dict[str, Any], start: float, end: float) -> None:
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            # timestamps and durations are in microseconds
+            "ts": (start - self._origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": thread.ident,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            if self._events is None:
+                return
+            self._events.append(event)
+            if thread.ident is not None:
+                self._threads[thread.ident] = thread.name
+
+
+class _Span:
+    __slots__ = ("args", "category", "name", "start", "tracer")
+
+    def __init__(self, tracer: Tracer, name: str, category: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.tracer._record(self.name, self.category, self.args, self.start, time.perf_counter())  # noqa: SLF001
+
+
+_NULL_SPAN: ContextManager[None] = contextlib.nullcontext()
@@ -4,6 +4,8 @@ import subprocess
 import sys
 from typing import Optional
 
+from dotbot import tracing
+
 
 def shell_command(
     command: str,
@@ -32,15 +34,16 @@ def shell_command(
             # won't work; a workaround for this is to write the command as
             # `bash -c "..."`.
             executable = None
-        return subprocess.call(  # noqa: S602
-            command,
-            shell=True,
-            executable=executable,
-            stdin=stdin,
-            stdout=stdout,
-            stderr=stderr,
-            cwd=cwd,
-        )
+        with tracing.Tracer().span(command, "shell"):
+            return subprocess.call(  # noqa: S602
+                command,
+                shell=True,
+                executable=executable,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=stderr,
+                cwd=cwd,
+            )
 
 
 def normslash(path: str) -> str:
@@ -49,3 +52,19 @@ def normslash(path: str) -> str:
         # because we don't want to make all characters lowercase
         return path.replace("/", "\\")
     return path
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    """
+    Writes the data to the file at the path, creating its directory if
+    needed, and atomically replacing any existing file, so that concurrent
+    readers never see a partial write.
+    """
+    # tempfile is slow to import (it imports shutil and random), and only needed for saving state
+    import tempfile  # noqa: PLC0415
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as fout:
+        fout.write(data)
+    os.replace(fout.name, path)
@@ -0,0 +1,96 @@
+import contextlib
+import os
+from typing import Optional
+
+_HEX_DIGITS = frozenset("0123456789abcdef")
+
+
+def head_revision(directory: str) -> Optional[str]:
+    """
+    Returns the commit that is checked out in the git repository containing
+    the directory, or None if there is none.
+
+    The commit is read from the repository's files, which is much faster than
+    running git. Repositories that can't be read this way (e.g., ones that use
+    the reftable format) are treated as having no commit checked out.
+    """
+    git_directory = _git_directory(directory)
+    if git_directory is None:
+        return None
+    common_directory = git_directory
+    with contextlib.suppress(OSError):
+        # linked worktrees share their refs with the main repository
+        common_directory = os.path.join(git_directory, _read(os.path.join(git_directory, "commondir")))
+    try:
+        head = _read(os.path.join(git_directory, "HEAD"))
+    except OSError:
+        return None
+    # symbolic refs can refer to other symbolic refs, but not indefinitely
+    for _ in range(8):
+        if not head.startswith("ref:"):
+            return head if _is_object_name(head) else None
+        ref = head[len("ref:") :].strip()
+        resolved = _loose_ref(git_directory, ref) or _loose_ref(common_directory, ref)
+        if resolved is None:
+            resolved = _packed_ref(common_directory, ref)
+        if resolved is None:
+            return None
+        head = resolved
+    return None
+
+
+def _git_directory(directory: str) -> Optional[str]:
+    """
+    Returns the git directory of the repository containing the directory, or
+    None if there is none.
+    """
+    path = os.path.abspath(directory)
+    while True:
+        candidate = os.path.join(path, ".git")
+        if os.path.isdir(candidate):
+            return candidate
+        if os.path.isfile(candidate):
+            # submodules and linked worktrees have a file pointing to the git directory
+            try:
+                contents = _read(candidate)
+            except OSError:
+                return None
+            if not contents.startswith("gitdir:"):
+                return None
+            return os.path.normpath(os.path.join(path, contents[len("gitdir:") :].strip()))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def _loose_ref(git_directory: str, ref: str) -> Optional[str]:
+    try:
+        return _read(os.path.join(git_directory, *ref.split("/")))
+    except OSError:
+        return None
+
+
+def _packed_ref(git_directory: str, ref: str) -> Optional[str]:
+    try:
+        with open(os.path.join(git_directory, "packed-refs")) as file:
+            for line in file:
+                # skip the header, and the peeled objects of annotated tags
+                if line.startswith(("#", "^")):
+                    continue
+                name, _, packed = line.rstrip("\n").partition(" ")
+                if packed == ref:
+                    return name
+    except OSError:
+        pass
+    return None
+
+
+def _read(path: str) -> str:
+    with open(path) as file:
+        return file.read().strip()
+
+
+def _is_object_name(name: str) -> bool:
+    # SHA-1 or SHA-256
+    return len(name) in {40, 64} and _HEX_DIGITS.issuperset(name)
@@ -1,10 +1,15 @@
-import glob
+import contextlib
 import importlib.util
+import json
 import os
+import threading
 from types import ModuleType
-from typing import List, Optional, Type
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 from dotbot.plugin import Plugin
+from dotbot.plugins import _LazyPlugin
+from dotbot.tracing import Tracer
+from dotbot.util.common import write_atomically
 
 # We keep references to loaded modules so they don't get garbage collected.
 loaded_modules: List[ModuleType] = []
@@ -36,28 +41,179 @@ def load_module(module_name: str, path: str) -> ModuleType:
     return module
 
 
-def load_plugins(paths: List[str], plugins: Optional[List[Type[Plugin]]] = None) -> List[Type[Plugin]]:
+class PluginCache:
+    """
+    The plugins loaded from each file, which are reused as long as the file
+    is unchanged, for processes that load the same plugins many times (e.g.,
+    `--serve`).
+    """
+
+    def __init__(self) -> None:
+        # path -> (modification time and size of the file, plugins)
+        self._plugins: Dict[str, Tuple[Tuple[int, int], List[Type[Plugin]]]] = {}
+
+    def load(self, path: str) -> List[Type[Plugin]]:
+        st = os.stat(path)
+        key = (st.st_mtime_ns, st.st_size)
+        cached = self._plugins.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        plugins = load(path)
+        self._plugins[path] = (key, plugins)
+        return plugins
+
+
+class PluginManifest(PluginCache):
+    """
+    A PluginCache that also saves which directives the plugins in each file
+    handle, so that later runs only load a file once one of its directives is
+    handled.
+
+    A file is loaded as usual the first time it is seen, whenever it changes,
+    and whenever any of its plugins doesn't declare its directives (see
+    Plugin.directives), because the directives that such a plugin handles
+    can't be known without loading it.
+    """
+
+    def __init__(self, path: str):
+        """
+        Loads the manifest that was saved to the given path. Unreadable state
+        is treated as empty.
+        """
+        super().__init__()
+        self._path = path
+        self._lock = threading.Lock()
+        # path -> modification time and size of the file, and its plugins, or
+        # None if the file needs to be loaded
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._changed = False
+        try:
+            with open(self._path) as file:
+                state = json.load(file)
+            if state.get("version") == 1:
+                self._files = dict(state["files"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+
+    def load(self, path: str) -> List[Type[Plugin]]:
+        st = os.stat(path)
+        key = [st.st_mtime_ns, st.st_size]
+        entry = self._files.get(path)
+        if isinstance(entry, dict) and entry.get("key") == key and entry.get("plugins") is not None:
+            with contextlib.suppress(KeyError, TypeError):
+                return [self._stand_in(path, plugin) for plugin in entry["plugins"]]
+        with self._lock:
+            plugins = super().load(path)
+        self._files[path] = {"key": key, "plugins": _describe(plugins)}
+        self._changed = True
+        return plugins
+
+    def save(self) -> None:
+        """
+        Saves the manifest for later runs, if it changed. Failures are ignored.
+        """
+        if not self._changed:
+            return
+        # files that were removed are dropped
+        files = {path: entry for path, entry in self._files.items() if os.path.exists(path)}
+        data = json.dumps({"version": 1, "files": files})
+        with contextlib.suppress(OSError):
+            write_atomically(self._path, data.encode("utf-8"))
+
+    def _stand_in(self, path: str, plugin: Dict[str, Any]) -> Type[Plugin]:
+        # like the stand-ins for the built-in plugins, these have the name and
+        # module of the plugins that they stand in for
+        attributes = {
+            "__module__": str(plugin["module"]),
+            "__qualname__": str(plugin["qualname"]),
+            "directives": tuple(str(directive) for directive in plugin["directives"]),
+            "supports_dry_run": bool(plugin["supports_dry_run"]),
+            "performs_operations": bool(plugin["performs_operations"]),
+            "_manifest": self,
+            "_file": path,
+        }
+        return type(str(plugin["name"]), (_ManifestPlugin,), attributes)
+
+    def _resolve(self, path: str, module: str, qualname: str) -> Type[Plugin]:
+        """
+        Loads the file (unless it was already loaded), and returns the plugin.
+        """
+        with self._lock:
+            plugins = super().load(path)
+        for plugin in plugins:
+            if plugin.__module__ == module and plugin.__qualname__ == qualname:
+                return plugin
+        msg = f"Plugin {qualname} not found in {path}"
+        raise ImportError(msg)
+
+
+class _ManifestPlugin(_LazyPlugin):
+    """
+    A stand-in for a plugin in a file that hasn't been loaded yet, which only
+    loads the file when one of the plugin's directives is first handled.
+    """
+
+    _manifest: PluginManifest
+    _file: str
+
+    def _plugin_class(self) -> Type[Plugin]:
+        return self._manifest._resolve(self._file, self.__module__, self.__class__.__qualname__)  # noqa: SLF001
+
+
+def _describe(plugins: List[Type[Plugin]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Returns what stand-ins need to know about the plugins, or None if any of
+    them doesn't declare its directives.
+    """
+    described = []
+    for plugin in plugins:
+        if plugin.can_handle is not Plugin.can_handle or not plugin.directives:
+            return None
+        described.append(
+            {
+                "module": plugin.__module__,
+                "qualname": plugin.__qualname__,
+                "name": plugin.__name__,
+                "directives": list(plugin.directives),
+                "supports_dry_run": plugin.supports_dry_run,
+                "performs_operations": plugin.performs_operations,
+            }
+        )
+    return described
+
+
+def load_plugins(
+    paths: List[str], plugins: Optional[List[Type[Plugin]]] = None, cache: Optional[PluginCache] = None
+) -> List[Type[Plugin]]:
     """
     Load plugins from the given paths and add them to the given list of plugins.
 
     Args:
         paths: List of file paths to load plugins from. Each path can be either a file or a directory.
         plugins: List of existing plugins to add to.
+        cache: Cache of plugins that were loaded before, if any.
 
     Returns the newly-loaded plugins.
     """
     if plugins is None:
         plugins = []
     new_plugins = []
-    plugin_paths = []
+    plugin_paths: List[str] = []
     for path in paths:
         if os.path.isdir(path):
-            plugin_paths.extend(glob.glob(os.path.join(path, "*.py")))
+            # like glob("*.py"), without importing glob
+            plugin_paths.extend(
+                os.path.join(path, name)
+                for name in os.listdir(path)
+                if name.endswith(".py") and not name.startswith(".")
+            )
         else:
             plugin_paths.append(path)
     for plugin_path in plugin_paths:
         abspath = os.path.abspath(plugin_path)
-        for plugin in load(abspath):
+        with Tracer().span(f"load {plugin_path}", "plugins"):
+            loaded = load(abspath) if cache is None else cache.load(abspath)
+        for plugin in loaded:
             # ensure plugins are unique to avoid duplicate execution, which
             # can happen if, for example, a third-party plugin loads a
             # built-in plugin, which will cause it to appear in the list
@@ -0,0 +1,25 @@
+import os
+
+
+def cache_home() -> str:
+    """
+    Returns the directory where Dotbot stores user-specific cache files.
+    """
+    return _dotbot_directory("XDG_CACHE_HOME", os.path.join("~", ".cache"))
+
+
+def state_home() -> str:
+    """
+    Returns the directory where Dotbot stores user-specific state that should
+    persist between runs.
+    """
+    return _dotbot_directory("XDG_STATE_HOME", os.path.join("~", ".local", "state"))
+
+
+def _dotbot_directory(variable: str, default: str) -> str:
+    base = os.environ.get(variable, "")
+    # the XDG Base Directory Specification says that relative paths are invalid
+    # and should be ignored
+    if not os.path.isabs(base):
+        base = os.path.expanduser(default)
+    return os.path.join(base, "dotbot")
@@ -0,0 +1,324 @@
+"""
+A fast parser for the subset of YAML that Dotbot configuration files typically
+use: block sequences and block mappings, plain and single-line quoted scalars,
+and single-line flow sequences of scalars.
+
+The parser is deliberately conservative. Whenever a document uses anything
+outside of this subset (anchors, aliases, tags, block scalars, multi-line
+scalars, flow mappings, escape sequences, document markers, and so on), or
+whenever a plain scalar could resolve to a type other than a string, null,
+boolean, or integer, it raises UnsupportedSyntaxError rather than guessing, and
+the caller is expected to fall back to a full YAML parser. For every document
+that it does accept, it returns the same result as `yaml.safe_load`.
+"""
+
+import re
+from typing import Any, Dict, List, NoReturn, Optional, Tuple
+
+# Characters that YAML treats specially (or that the reader rejects), which
+# are easier to leave to a full YAML parser. These are listed rather than
+# excluded from the allowed ranges, which is much faster to compile.
+_UNSUPPORTED_CHARACTERS = re.compile(r"[\x00-\x09\x0b-\x1f\x7f-\x9f\u2028\u2029\ud800-\udfff\ufeff\ufffe\uffff]")
+
+# Characters that cannot start a plain scalar in this subset.
+_INDICATORS = frozenset("-?:,[]{}#&*!|>'\"%@`")
+
+# End of a plain scalar in block context: a mapping value indicator or a comment.
+_BLOCK_PLAIN_END = re.compile(r": |:$| #")
+
+# End of a plain scalar in flow context.
+_FLOW_PLAIN_END = re.compile(r"[,\[\]{}?]|:(?=[ ,\[\]{}]|$)| #")
+
+_EMPTY_FLOW_MAPPING = re.compile(r"\{ *\}(?: +#.*)?")
+
+_DECIMAL = re.compile(r"[-+]?(?:0|[1-9][0-9]*)")
+_OCTAL = re.compile(r"[-+]?0[0-7]+")
+
+# Prefixes of scalars that YAML 1.1 may resolve to floats, timestamps, or
+# other kinds of numbers.
+_NUMERIC = re.compile(r"[-+]?\.?[0-9_]|[-+]?\.(?:inf|Inf|INF|nan|NaN|NAN)$")
+
+_CONSTANTS: Dict[str, Any] = {
+    "~": None,
+    "null": None,
+    "Null": None,
+    "NULL": None,
+    **dict.fromkeys(["yes", "Yes", "YES", "true", "True", "TRUE", "on", "On", "ON"], True),
+    **dict.fromkeys(["no", "No", "NO", "false", "False", "FALSE", "off", "Off", "OFF"], False),
+}
+
+
+class UnsupportedSyntaxError(Exception):
+    """
+    Raised when a document uses YAML features that the parser does not support.
+    """
+
+
+def parse(text: str) -> Any:
+    """
+    Parses a YAML document, returning the same result as `yaml.safe_load`.
+
+    Raises UnsupportedSyntaxError if the document is not in the supported
+    subset of YAML (including if it is not valid YAML at all).
+    """
+    return _Parser(text).parse()
+
+
+class _Parser:
+    _lines: List[Tuple[int, str]]
+    _index: int
+
+    def __init__(self, text: str):
+        if _UNSUPPORTED_CHARACTERS.search(text):
+            _unsupported()
+        self._lines = []
+        for raw in text.split("\n"):
+            content = raw.lstrip(" ")
+            if not content or content[0] == "#":
+                continue
+            indent = len(raw) - len(content)
+            if indent == 0 and content.startswith(("---", "...")):
+                _unsupported()
+            self._lines.append((indent, content.rstrip(" ")))
+        self._index = 0
+
+    def parse(self) -> Any:
+        if not self._lines:
+            return None
+        indent, content = self._lines[0]
+        if len(self._lines) == 1 and not _is_sequence_entry(content) and self._mapping_entry(content) is None:
+            # e.g., `[]`, which is what an empty list of tasks is serialized as
+            return self._scalar(content)
+        value = self._block(indent)
+        if self._index != len(self._lines):
+            _unsupported()
+        return value
+
+    def _block(self, indent: int) -> Any:
+        """
+        Parses the block collection starting at the current line.
+        """
+        content = self._lines[self._index][1]
+        if _is_sequence_entry(content):
+            return self._sequence(indent)
+        if self._mapping_entry(content) is None:
+            # a multi-line plain scalar, or something that isn't valid YAML
+            _unsupported()
+        return self._mapping(indent)
+
+    def _sequence(self, indent: int) -> List[Any]:
+        lines = self._lines
+        items: List[Any] = []
+        while self._index < len(lines):
+            line_indent, content = lines[self._index]
+            if line_indent < indent or (line_indent == indent and not _is_sequence_entry(content)):
+                # the end of the sequence; if this is a sequence at the same
+                # indentation as its key, the line may be the parent's next key
+                break
+            if line_indent > indent:
+                _unsupported()
+            rest = content[1:].lstrip(" ")
+            if not rest or rest[0] == "#":
+                self._index += 1
+                items.append(self._nested(indent, same_indent_sequence=False))
+            elif _is_sequence_entry(rest) or self._mapping_entry(rest) is not None:
+                # a compact nested collection, e.g. `- key: value`; treat the
+                # remainder of the line as if it were a line of its own, so that
+                # the following lines at the same column continue the collection
+                column = indent + len(content) - len(rest)
+                lines[self._index] = (column, rest)
+                items.append(self._block(column))
+            else:
+                items.append(self._scalar(rest))
+                self._index += 1
+        return items
+
+    def _mapping(self, indent: int) -> Dict[Any, Any]:
+        lines = self._lines
+        mapping: Dict[Any, Any] = {}
+        while self._index < len(lines):
+            line_indent, content = lines[self._index]
+            if line_indent < indent:
+                break
+            if line_indent > indent:
+                _unsupported()
+            entry = self._mapping_entry(content)
+            if entry is None:
+                _unsupported()
+            key, rest = entry
+            self._index += 1
+            if not rest or rest[0] == "#":
+                mapping[key] = self._nested(indent, same_indent_sequence=True)
+            else:
+                mapping[key] = self._scalar(rest)
+        return mapping
+
+    def _nested(self, indent: int, *, same_indent_sequence: bool) -> Any:
+        """
+        Parses the value of an entry that has nothing after the indicator on
+        its own line.
+        """
+        if self._index < len(self._lines):
+            line_indent, content = self._lines[self._index]
+            if line_indent > indent:
+                return self._block(line_indent)
+            if same_indent_sequence and line_indent == indent and _is_sequence_entry(content):
+                # YAML allows a sequence that is the value of a mapping entry to
+                # have the same indentation as the key
+                return self._sequence(indent)
+        return None
+
+    def _mapping_entry(self, content: str) -> Optional[Tuple[Any, str]]:
+        """
+        Returns the key and the rest of the line if the content is a mapping
+        entry, and None otherwise.
+        """
+        first = content[0]
+        if first in "'\"":
+            key, end = _quoted(content, 0)
+            rest = content[end:].lstrip(" ")
+            if rest[:1] == ":" and (len(rest) == 1 or rest[1] == " "):
+                return key, rest[1:].lstrip(" ")
+            return None
+        if not _starts_plain(content, 0):
+            return None
+        match = _BLOCK_PLAIN_END.search(content)
+        if match is None or match.group() == " #":
+            return None
+        return _resolve(content[: match.start()].rstrip(" ")), content[match.end() :].lstrip(" ")
+
+    def _scalar(self, content: str) -> Any:
+        """
+        Parses a value that fits on a single line.
+
+        If the value continues on the following lines, those lines are more
+        indented than the current collection, which the callers reject.
+        """
+        first = content[0]
+        if first in "'\"":
+            value, end = _quoted(content, 0)
+            _check_end(content, end)
+            return value
+        if first == "[":
+            return _flow_sequence(content)
+        if first == "{":
+            if not _EMPTY_FLOW_MAPPING.fullmatch(content):
+                _unsupported()
+            return {}
+        if not _starts_plain(content, 0):
+            _unsupported()
+        match = _BLOCK_PLAIN_END.search(content)
+        if match is not None and match.group() != " #":
+            _unsupported()
+        return _resolve(content[: match.start() if match else len(content)].rstrip(" "))
+
+
+def _is_sequence_entry(content: str) -> bool:
+    return content[0] == "-" and (len(content) == 1 or content[1] == " ")
+
+
+def _starts_plain(content: str, position: int) -> bool:
+    first = content[position]
+    if first == "-":
+        # e.g., `-f`, but not `- ` (a sequence entry)
+        return content[position + 1 : position + 2] not in {"", " "}
+    return first not in _INDICATORS
+
+
+def _quoted(content: str, start: int) -> Tuple[str, int]:
+    """
+    Parses a quoted scalar that starts and ends on the current line, returning
+    the value and the index after the closing quote.
+    """
+    if content[start] == "'":
+        parts = []
+        position = start + 1
+        while True:
+            end = content.find("'", position)
+            if end < 0:
+                _unsupported()
+            if content[end + 1 : end + 2] == "'":
+                parts.append(content[position : end + 1])
+                position = end + 2
+                continue
+            parts.append(content[position:end])
+            return "".join(parts), end + 1
+    end = content.find('"', start + 1)
+    if end < 0:
+        _unsupported()
+    value = content[start + 1 : end]
+    if "\\" in value:
+        _unsupported()
+    return value, end + 1
+
+
+def _flow_sequence(content: str) -> List[Any]:
+    items: List[Any] = []
+    position = 1
+    length = len(content)
+    while True:
+        while position < length and content[position] == " ":
+            position += 1
+        if position >= length:
+            _unsupported()
+        first = content[position]
+        if first == "]" and not items:
+            _check_end(content, position + 1)
+            return items
+        if first in "'\"":
+            value, position = _quoted(content, position)
+        elif not _starts_plain(content, position):
+            _unsupported()
+        else:
+            match = _FLOW_PLAIN_END.search(content, position)
+            if match is None or match.group() not in ",]":
+                _unsupported()
+            value = _resolve(content[position : match.start()].rstrip(" "))
+            position = match.start()
+        items.append(value)
+        while position < length and content[position] == " ":
+            position += 1
+        if position >= length:
+            _unsupported()
+        if content[position] == "]":
+            _check_end(content, position + 1)
+            return items
+        if content[position] != ",":
+            _unsupported()
+        position += 1
+        # a trailing comma is allowed by YAML but rare enough to leave to the full parser
+        if content[position:].lstrip(" ")[:1] == "]":
+            _unsupported()
+
+
+def _check_end(content: str, position: int) -> None:
+    """
+    Checks that nothing but a comment follows the given position.
+    """
+    rest = content[position:]
+    if rest and not (rest[0] == " " and rest.lstrip(" ")[0] == "#"):
+        _unsupported()
+
+
+def _resolve(plain: str) -> Any:
+    """
+    Resolves a plain scalar the same way that YAML 1.1 (as implemented by
+    PyYAML's SafeLoader) does.
+    """
+    if plain in _CONSTANTS:
+        return _CONSTANTS[plain]
+    first = plain[0]
+    if first in "0123456789+-.":
+        if _DECIMAL.fullmatch(plain):
+            return int(plain)
+        if _OCTAL.fullmatch(plain):
+            return int(plain, 8)
+        if first in "0123456789" or _NUMERIC.match(plain):
+            _unsupported()
+    elif plain in {"<<", "="}:
+        _unsupported()
+    return plain
+
+
+def _unsupported() -> NoReturn:
+    raise UnsupportedSyntaxError
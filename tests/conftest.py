@@ -60,7 +60,7 @@ def get_path_from_fd(fd: int) -> Optional[str]:
 def wrap_function(
     function: Callable[..., Any], function_path: str, arg_index: int, kwarg_key: str, root: str
 ) -> Callable[..., Any]:
-    is_unlink = function == os.unlink
+    is_unlink = function in {os.unlink, os.rmdir}
 
     def wrapper(*args: Any, **kwargs: Any) -> Any:
         value = kwargs[kwarg_key] if kwarg_key in kwargs else args[arg_index]
@@ -69,7 +69,7 @@ def wrap_function(
         if value in allowed_tempfile_internal_unlink_calls:
             return function(*args, **kwargs)
 
-        # For unlink(), allow relative paths when dir_fd is provided (used by shutil.rmtree)
+        # For unlink() and rmdir(), allow relative paths when dir_fd is provided (used by shutil.rmtree)
         if is_unlink and "dir_fd" in kwargs and kwargs["dir_fd"] is not None:
             dir_fd = kwargs["dir_fd"]
             dir_path = get_path_from_fd(dir_fd)
@@ -1,6 +1,7 @@
+import json
 import os
 import shutil
-from typing import Callable
+from typing import Any, Callable, Dict, List
 
 import pytest
 
@@ -270,3 +271,176 @@ def test_dry_run_aware_plugin_no_dry_run(home: str, dotfiles: Dotfiles, run_dotb
     run_dotbot("--plugin", os.path.join(dotfiles.directory, "dry_run.py"))
     with open(os.path.join(home, "flag-dry-run")) as file:
         assert file.read() == "Dry run executed"
+
+
+def test_jobs(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --jobs produces the same results and output as running sequentially."""
+
+    config: List[Dict[str, Any]] = [
+        {"defaults": {"link": {"create": True}}},
+        {"create": {"~/d": {"mode": 0o700}}},
+        {"link": {f"~/d/f{i:02}": "f" for i in range(20)}},
+        {"shell": [{"command": "echo apple", "stdout": True}]},
+        {"link": {f"~/e/f{i:02}": "f" for i in range(20)}},
+    ]
+    dotfiles.write("f", "apple")
+    dotfiles.write_config(config)
+    run_dotbot("--jobs", "8")
+
+    lines = capfd.readouterr().out.splitlines()
+    created = [os.path.join(home, "d", f"f{i:02}") for i in range(20)] + [
+        os.path.join(home, "e", f"f{i:02}") for i in range(20)
+    ]
+    assert [line.split(" ")[2] for line in lines if line.startswith("Creating symlink")] == [
+        os.path.join("~", os.path.relpath(path, home)) for path in created
+    ]
+    # the shell command runs after the links before it, and before the links after it
+    links = [i for i, line in enumerate(lines) if line.startswith("Creating symlink")]
+    assert links[19] < lines.index("apple") < links[20]
+    for path in created:
+        with open(path) as file:
+            assert file.read() == "apple"
+
+
+def test_jobs_defaults_scoping(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that each part of the config runs with the defaults that were set when it appeared."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config(
+        [
+            {"defaults": {"link": {"create": True}}},
+            {"link": {f"~/a/f{i}": "f" for i in range(10)}},
+            {"defaults": {}},
+            {"link": {"~/b/f": "f"}},
+        ]
+    )
+    with pytest.raises(SystemExit):
+        run_dotbot("--jobs", "4")
+
+    for i in range(10):
+        assert os.path.islink(os.path.join(home, "a", f"f{i}"))
+    assert not os.path.exists(os.path.join(home, "b"))
+
+
+def test_jobs_exit_on_failure(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that nothing after a failure runs with --jobs and --exit-on-failure."""
+
+    dotfiles.write_config(
+        [
+            {"link": {"~/f": "nonexistent"}},
+            {"create": ["~/a"]},
+            {"shell": ["touch ~/b"]},
+        ]
+    )
+    with pytest.raises(SystemExit):
+        run_dotbot("--jobs", "4", "-x")
+
+    assert not os.path.exists(os.path.join(home, "b"))
+
+
+def test_jobs_invalid(capfd: pytest.CaptureFixture[str], dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --jobs must be positive."""
+
+    dotfiles.write_config([])
+    with pytest.raises(SystemExit):
+        run_dotbot("--jobs", "0")
+
+    assert "`--jobs` must be at least 1" in capfd.readouterr().out
+
+
+def test_profile(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --profile reports timings for tasks, actions, and plugins."""
+
+    dotfiles.write("f")
+    dotfiles.write_config(
+        [
+            {"link": {"~/f": "f"}},
+            {"shell": ["true"], "link": {"~/g": "f"}},
+        ]
+    )
+    profile = os.path.join(home, "profile.json")
+    run_dotbot("--profile-output", profile)
+
+    output = capfd.readouterr().out
+    assert "Profile (wall time, CPU time, calls):" in output
+    with open(profile) as file:
+        entries = json.load(file)["entries"]
+    counts = {(entry["kind"], entry["name"]): entry["count"] for entry in entries}
+    assert counts == {
+        ("task", "0 (link)"): 1,
+        ("task", "1 (link, shell)"): 1,
+        ("action", "link"): 2,
+        ("action", "shell"): 1,
+        ("plugin", "Link (link)"): 2,
+        ("plugin", "Shell (shell)"): 1,
+    }
+    assert all(entry["wall"] >= 0 and entry["cpu"] >= 0 for entry in entries)
+
+
+def test_profile_jobs(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --profile with --jobs measures each part, and labels the overlapping times as concurrent."""
+
+    dotfiles.write("f")
+    dotfiles.write_config([{"link": {"~/f": "f", "~/g": "f", "~/h": "f"}}])
+    profile = os.path.join(home, "profile.json")
+    run_dotbot("--profile-output", profile, "--jobs", "4")
+
+    output = capfd.readouterr().out
+    assert "Profile with 4 concurrent jobs" in output
+    with open(profile) as file:
+        data = json.load(file)
+    assert data["jobs"] == 4
+    counts = {(entry["kind"], entry["name"]): entry["count"] for entry in data["entries"]}
+    assert counts[("plugin", "Link (link)")] == 3
+
+
+def test_trace_out(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --trace-out writes a timeline of the run in the Trace Event Format."""
+
+    dotfiles.write("f")
+    dotfiles.write_config(
+        [
+            {"link": {"~/f": {"path": "f", "if": "true"}}},
+            {"shell": ["true"]},
+        ]
+    )
+    trace = os.path.join(home, "trace.json")
+    run_dotbot("--trace-out", trace)
+
+    with open(trace) as file:
+        events = json.load(file)["traceEvents"]
+    spans = [(event["cat"], event["name"]) for event in events if event["ph"] == "X"]
+    for span in [
+        ("config", "read configuration"),
+        ("action", "link"),
+        ("plugin", "Link.handle"),
+        ("test", "if"),
+        ("action", "shell"),
+        ("plugin", "Shell.handle"),
+        ("shell", "true"),
+    ]:
+        assert span in spans
+    assert any(event["ph"] == "M" and event["name"] == "thread_name" for event in events)
+    assert all(event["dur"] >= 0 for event in events if event["ph"] == "X")
+
+
+def test_fs_stats(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --fs-stats reports the filesystem operations of each directive and entry."""
+
+    dotfiles.write("f")
+    dotfiles.write_config([{"link": {"~/f": "f"}}])
+    run_dotbot("--fs-stats")
+
+    lines = capfd.readouterr().out.splitlines()
+    assert "Filesystem operations (system calls, with cached results in parentheses):" in lines
+    assert any(line.startswith("  link: ") for line in lines)
+    assert any(line.startswith("    link ~/f: ") for line in lines)
+    assert os.path.islink(os.path.join(home, "f"))
@@ -1,7 +1,18 @@
+import io
 import json
 import os
+import stat
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from typing import Callable
+from unittest import mock
 
+import pytest
+import yaml
+
+import dotbot.config
+from dotbot.config import ConfigReader, MemoryConfigCache, describe_yaml_loader, yaml_loader
 from tests.conftest import Dotfiles
 
 
@@ -54,3 +65,281 @@ def test_multiple_config(home: str, dotfiles: Dotfiles, run_dotbot: Callable[...
 
     assert os.path.isdir(os.path.join(home, "d1"))
     assert os.path.isdir(os.path.join(home, "d2"))
+
+
+def test_config_cache(
+    monkeypatch: pytest.MonkeyPatch, root: str, home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that cached configs are loaded without parsing YAML."""
+
+    monkeypatch.setenv("XDG_CACHE_HOME", os.path.join(root, "cache"))
+    dotfiles.write_config([{"create": ["~/d1"]}])
+    run_dotbot("--config-cache")
+    assert os.path.isdir(os.path.join(home, "d1"))
+    assert len(os.listdir(os.path.join(root, "cache", "dotbot", "config"))) == 1
+
+    os.rmdir(os.path.join(home, "d1"))
+    with mock.patch("yaml.load", side_effect=AssertionError("YAML should not be parsed")):
+        run_dotbot("--config-cache")
+    assert os.path.isdir(os.path.join(home, "d1"))
+
+
+def test_config_cache_invalidated(
+    monkeypatch: pytest.MonkeyPatch, root: str, home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that a changed config is parsed again."""
+
+    monkeypatch.setenv("XDG_CACHE_HOME", os.path.join(root, "cache"))
+    dotfiles.write_config([{"create": ["~/d1"]}])
+    run_dotbot("--config-cache")
+    dotfiles.write_config([{"create": ["~/d2"]}])
+    run_dotbot("--config-cache")
+
+    assert os.path.isdir(os.path.join(home, "d2"))
+
+
+def test_config_cache_corrupted(
+    monkeypatch: pytest.MonkeyPatch, root: str, home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that a corrupted cache entry falls back to parsing the config."""
+
+    cache = os.path.join(root, "cache")
+    monkeypatch.setenv("XDG_CACHE_HOME", cache)
+    dotfiles.write_config([{"create": ["~/d1"]}])
+    run_dotbot("--config-cache")
+    entries = os.listdir(os.path.join(cache, "dotbot", "config"))
+    with open(os.path.join(cache, "dotbot", "config", entries[0]), "wb") as file:
+        file.write(b"garbage")
+    run_dotbot("--config-cache")
+
+    assert os.path.isdir(os.path.join(home, "d1"))
+
+
+def test_yaml_loader_fallback(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Verify that the pure-Python loader is used when libyaml is unavailable."""
+
+    monkeypatch.delattr(yaml, "CSafeLoader", raising=False)
+    assert yaml_loader() is yaml.SafeLoader
+    assert "pure Python" in describe_yaml_loader()
+
+
+def test_yaml_loader_diagnostic(capfd: pytest.CaptureFixture[str], run_dotbot: Callable[..., None]) -> None:
+    """Verify that `--yaml-loader` reports the loader in use."""
+
+    with pytest.raises(SystemExit) as e:
+        run_dotbot("--yaml-loader", custom=True)
+    assert e.value.code == 0
+    assert f"using {yaml_loader().__name__}" in capfd.readouterr().out
+
+
+def test_multiple_config_parallel(
+    monkeypatch: pytest.MonkeyPatch, home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that configs parsed in parallel are merged in command-line order."""
+
+    monkeypatch.setattr(dotbot.config, "_PARALLEL_THRESHOLD", 0)
+    paths = []
+    for i in range(4):
+        paths.append(os.path.join(dotfiles.directory, f"config{i}.yaml"))
+        dotfiles.write(paths[-1], f"- shell:\n  - echo {i} >> ~/order\n")
+
+    with mock.patch("concurrent.futures.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor:
+        run_dotbot("-c", *paths, custom=True)
+    assert executor.called
+    with open(os.path.join(home, "order")) as file:
+        assert file.read().split() == ["0", "1", "2", "3"]
+
+
+def test_multiple_config_parallel_error(
+    monkeypatch: pytest.MonkeyPatch,
+    capfd: pytest.CaptureFixture[str],
+    dotfiles: Dotfiles,
+    run_dotbot: Callable[..., None],
+) -> None:
+    """Verify that errors from configs parsed in parallel name the failing file."""
+
+    monkeypatch.setattr(dotbot.config, "_PARALLEL_THRESHOLD", 0)
+    good = os.path.join(dotfiles.directory, "good.yaml")
+    bad = os.path.join(dotfiles.directory, "bad.yaml")
+    dotfiles.write(good, "- create: [~/d]\n")
+    dotfiles.write(bad, "- create: [~/d\n")
+
+    with pytest.raises(SystemExit):
+        run_dotbot("-c", good, bad, custom=True)
+    assert f'in "{bad}", line 1' in capfd.readouterr().out
+
+
+def test_multiple_config_parallel_memory_cache(monkeypatch: pytest.MonkeyPatch, dotfiles: Dotfiles) -> None:
+    """Verify that configs parsed in parallel are stored in an in-memory cache (e.g., with --serve)."""
+
+    monkeypatch.setattr(dotbot.config, "_PARALLEL_THRESHOLD", 0)
+    paths = []
+    for i in range(2):
+        paths.append(os.path.join(dotfiles.directory, f"config{i}.yaml"))
+        dotfiles.write(paths[-1], f"- create: [~/d{i}]\n")
+
+    cache = MemoryConfigCache()
+    with mock.patch("concurrent.futures.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor:
+        ConfigReader(paths, cache=cache)
+    assert executor.called
+    for i, path in enumerate(paths):
+        with open(path, "rb") as file:
+            assert cache.load(path, os.stat(path), file.read()) == (True, [{"create": [f"~/d{i}"]}])
+
+
+@pytest.mark.skipif(
+    "sys.platform == 'win32'",
+    reason="The hybrid sh/Python dotbot script doesn't run on Windows platforms",
+)
+def test_multiple_config_parallel_spawn(root: str, home: str, dotfiles: Dotfiles) -> None:
+    """Verify that the dotbot script can parse configs in processes that import it again (e.g., on macOS)."""
+
+    project = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # loaded by the script and by each worker process, before anything else
+    site = os.path.join(root, "site")
+    os.makedirs(site)
+    with open(os.path.join(site, "sitecustomize.py"), "w") as file:
+        file.write(
+            "import multiprocessing\n"
+            "import dotbot.config\n"
+            "dotbot.config._PARALLEL_THRESHOLD = 0\n"
+            "dotbot.config._process_context = lambda: multiprocessing.get_context('spawn')\n"
+        )
+    paths = []
+    for i in range(2):
+        paths.append(os.path.join(dotfiles.directory, f"config{i}.yaml"))
+        dotfiles.write(paths[-1], f"- shell:\n  - echo {i} >> ~/order\n")
+
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["PYTHONPATH"] = os.pathsep.join([site, os.path.join(project, "src")])
+    result = subprocess.run(
+        [sys.executable, os.path.join(project, "bin", "dotbot"), "-c", *paths],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    assert result.returncode == 0
+    assert result.stderr == ""
+    with open(os.path.join(home, "order")) as file:
+        assert file.read().split() == ["0", "1"]
+
+
+def test_stream_yaml_documents(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that multi-document YAML configs can be streamed."""
+
+    dotfiles.write(
+        "install.conf.yaml",
+        "- defaults:\n    create:\n      mode: 0700\n---\n- create: [~/a]\n--- # comment\ncreate: [~/b]\n...\n",
+    )
+    run_dotbot("--stream", "-c", os.path.join(dotfiles.directory, "install.conf.yaml"), custom=True)
+
+    assert os.path.isdir(os.path.join(home, "a"))
+    assert os.path.isdir(os.path.join(home, "b"))
+    if sys.platform != "win32":
+        assert stat.S_IMODE(os.stat(os.path.join(home, "b")).st_mode) == 0o700
+
+
+def test_stream_json_lines(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that JSON Lines configs can be streamed."""
+
+    dotfiles.write("install.conf.jsonl", '{"create": ["~/a"]}\n\n[{"create": ["~/b"]}, {"create": ["~/c"]}]\n')
+    run_dotbot("--stream", "-c", os.path.join(dotfiles.directory, "install.conf.jsonl"), custom=True)
+
+    for name in ["a", "b", "c"]:
+        assert os.path.isdir(os.path.join(home, name))
+
+
+def test_stream_runs_tasks_before_parsing_finishes(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that streamed tasks run before the rest of the config is parsed."""
+
+    path = os.path.join(dotfiles.directory, "install.conf.yaml")
+    dotfiles.write(path, "- create: [~/a]\n---\n- create: [~/b]\n---\n- create: [~/c\n")
+    with pytest.raises(SystemExit):
+        run_dotbot("--stream", "-c", path, custom=True)
+
+    assert os.path.isdir(os.path.join(home, "a"))
+    assert os.path.isdir(os.path.join(home, "b"))
+    # the error refers to the line in the file, not in the document
+    assert f'in "{path}", line 5' in capfd.readouterr().out
+
+
+def test_stream_json_lines_error(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that errors in JSON Lines configs name the line."""
+
+    path = os.path.join(dotfiles.directory, "install.conf.jsonl")
+    dotfiles.write(path, '{"create": ["~/a"]}\n{"create": \n')
+    with pytest.raises(SystemExit):
+        run_dotbot("--stream", "-c", path, custom=True)
+
+    assert os.path.isdir(os.path.join(home, "a"))
+    assert "line 2" in capfd.readouterr().out
+
+
+def test_config_stdin(
+    home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Verify that configs can be read from stdin, relative to the working directory."""
+
+    dotfiles.write("f", "apple")
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(b"- link:\n    ~/.f: f\n")))
+    os.chdir(dotfiles.directory)
+    run_dotbot("-c", "-", custom=True)
+
+    with open(os.path.join(home, ".f")) as file:
+        assert file.read() == "apple"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+@pytest.mark.parametrize(
+    "content",
+    [
+        '[{"create": ["~/a"]}, {"create": ["~/b"]}]',
+        '[\n  {"create": ["~/a"]},\n  {"create": ["~/b"]}\n]\n',
+        '\n{"create": ["~/a"]}\n{"create": ["~/b"]}\n',
+        "- create: [~/a]\n- create: [~/b]\n",
+        "[{create: [~/a]}, {create: [~/b]}]\n",
+    ],
+)
+def test_config_stdin_format_detection(
+    home: str, run_dotbot: Callable[..., None], monkeypatch: pytest.MonkeyPatch, content: str, *, stream: bool
+) -> None:
+    """Verify that the format of configs read from stdin is detected from the content."""
+
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(content.encode("utf-8"))))
+    run_dotbot(*(["--stream"] if stream else []), "-c", "-", custom=True)
+
+    assert os.path.isdir(os.path.join(home, "a"))
+    assert os.path.isdir(os.path.join(home, "b"))
+
+
+@pytest.mark.skipif(
+    "sys.platform != 'linux'",
+    reason="requires /dev/fd",
+)
+def test_config_pipe(home: str, run_dotbot: Callable[..., None]) -> None:
+    """Verify that configs can be read from pipes, such as those created by process substitution."""
+
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(write_fd, "w") as fout:
+        fout.write("- create: [~/a]\n")
+    try:
+        run_dotbot("-c", f"/dev/fd/{read_fd}", custom=True)
+    finally:
+        os.close(read_fd)
+
+    assert os.path.isdir(os.path.join(home, "a"))
+
+
+def test_config_stdin_twice(capfd: pytest.CaptureFixture[str], run_dotbot: Callable[..., None]) -> None:
+    """Verify that stdin cannot be given more than once."""
+
+    with pytest.raises(SystemExit):
+        run_dotbot("-c", "-", "-", custom=True)
+
+    assert "Standard input can only be read once" in capfd.readouterr().out
@@ -0,0 +1,160 @@
+import os
+from typing import Any, Callable, List
+
+import pytest
+
+from dotbot.filesystem import FileSystem, OperationCounter
+
+
+def count_calls(monkeypatch: pytest.MonkeyPatch, name: str) -> List[Any]:
+    """Record the calls to the os function with the given name."""
+
+    calls: List[Any] = []
+    function: Callable[..., Any] = getattr(os, name)
+
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        calls.append(args)
+        return function(*args, **kwargs)
+
+    monkeypatch.setattr(os, name, wrapper)
+    return calls
+
+
+def test_filesystem_caches_queries(home: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Verify that repeated queries for the same path only make one system call."""
+
+    path = os.path.join(home, "a")
+    os.mkdir(path)
+    filesystem = FileSystem()
+    lstat_calls = count_calls(monkeypatch, "lstat")
+    stat_calls = count_calls(monkeypatch, "stat")
+
+    for _ in range(3):
+        assert filesystem.lexists(path)
+        assert not filesystem.islink(path)
+        assert filesystem.exists(path)
+        assert filesystem.isdir(path)
+        assert not filesystem.isfile(path)
+        assert not filesystem.lexists(os.path.join(home, "b"))
+    assert len(lstat_calls) == 2
+    assert len(stat_calls) == 1
+
+
+def test_filesystem_caches_errors(home: str) -> None:
+    """Verify that cached errors are raised again."""
+
+    filesystem = FileSystem()
+    for _ in range(2):
+        with pytest.raises(FileNotFoundError):
+            filesystem.lstat(os.path.join(home, "nonexistent"))
+        with pytest.raises(OSError):  # noqa: PT011 # the error differs across platforms
+            filesystem.readlink(home)
+
+
+def test_filesystem_invalidates_changed_path(home: str) -> None:
+    """Verify that changes made through the filesystem are reflected in queries."""
+
+    filesystem = FileSystem()
+    link = os.path.join(home, "link")
+    assert not filesystem.lexists(link)
+    assert not filesystem.exists(link)
+    filesystem.symlink(home, link)
+    assert filesystem.islink(link)
+    assert filesystem.exists(link)
+    assert filesystem.readlink(link) == home
+    filesystem.unlink(link)
+    assert not filesystem.lexists(link)
+
+
+def test_filesystem_invalidates_ancestors(home: str) -> None:
+    """Verify that creating a path invalidates its ancestors."""
+
+    filesystem = FileSystem()
+    parent = os.path.join(home, "a")
+    assert not filesystem.lexists(parent)
+    assert filesystem.listdir(home) == []
+    filesystem.makedirs(os.path.join(parent, "b", "c"))
+    assert filesystem.lexists(parent)
+    assert filesystem.listdir(home) == ["a"]
+
+
+def test_filesystem_invalidates_descendants(home: str) -> None:
+    """Verify that moving a path invalidates its descendants."""
+
+    filesystem = FileSystem()
+    directory = os.path.join(home, "a")
+    os.makedirs(os.path.join(directory, "b"))
+    assert filesystem.lexists(os.path.join(directory, "b"))
+    filesystem.rename(directory, os.path.join(home, "c"))
+    assert not filesystem.lexists(os.path.join(directory, "b"))
+    assert filesystem.lexists(os.path.join(home, "c", "b"))
+
+
+def test_filesystem_invalidates_symlink_resolution(home: str) -> None:
+    """Verify that changes invalidate queries that resolve symbolic links through the changed path."""
+
+    filesystem = FileSystem()
+    os.mkdir(os.path.join(home, "a"))
+    link = os.path.join(home, "link")
+    os.symlink(os.path.join(home, "a"), link)
+    assert filesystem.isdir(os.path.join(link, "."))
+    filesystem.rename(os.path.join(home, "a"), os.path.join(home, "b"))
+    assert not filesystem.exists(link)
+
+
+def test_filesystem_invalidate_all(home: str) -> None:
+    """Verify that changes made behind the filesystem's back are picked up after invalidating."""
+
+    filesystem = FileSystem()
+    path = os.path.join(home, "a")
+    assert not filesystem.exists(path)
+    os.mkdir(path)
+    assert not filesystem.exists(path)
+    filesystem.invalidate()
+    assert filesystem.exists(path)
+
+
+def test_filesystem_invalidate_during_query(home: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Verify that a query that races a change (e.g., with --jobs) doesn't cache the old state."""
+
+    filesystem = FileSystem()
+    path = os.path.join(home, "a")
+    lstat = os.lstat
+
+    def racing_lstat(*args: Any, **kwargs: Any) -> Any:
+        try:
+            return lstat(*args, **kwargs)
+        finally:
+            # another thread creates the path after it was queried
+            monkeypatch.setattr(os, "lstat", lstat)
+            os.mkdir(path)
+            filesystem.invalidate(path)
+
+    monkeypatch.setattr(os, "lstat", racing_lstat)
+    assert not filesystem.lexists(path)
+    assert filesystem.lexists(path)
+
+
+def test_filesystem_counts_operations(home: str) -> None:
+    """Verify that operations are counted by scope, separately from cached results."""
+
+    path = os.path.join(home, "a")
+    filesystem = FileSystem()
+    counter = OperationCounter()
+    filesystem.count_operations(counter)
+
+    with filesystem.scope("create"), filesystem.scope(path):
+        assert not filesystem.exists(path)
+        filesystem.makedirs(path)
+        assert filesystem.exists(path)
+        assert filesystem.exists(path)
+    filesystem.islink(path)
+
+    assert counter.counts() == {
+        (("create", path), "stat"): (2, 1),
+        (("create", path), "makedirs"): (1, 0),
+        ((), "lstat"): (1, 0),
+    }
+    summary = counter.summary()
+    assert "  create: 3 (1)" in summary
+    assert f"    create {path}: 3 (1)" in summary
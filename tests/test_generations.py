@@ -0,0 +1,112 @@
+import os
+from typing import Callable
+
+import pytest
+
+from tests.conftest import Dotfiles
+
+
+def read(path: str) -> str:
+    with open(path) as file:
+        return file.read()
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_generations_activate_and_rollback(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], jobs: str
+) -> None:
+    """Verify that --generations switches all links at once, and --rollback switches them back."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write("b", "banana")
+    dotfiles.write_config([{"link": {"~/f": "a", "~/g": "b"}}])
+    run_dotbot("--generations", "--jobs", jobs)
+
+    link = os.readlink(os.path.join(home, "f"))
+    assert not link.startswith(dotfiles.directory)
+    assert read(os.path.join(home, "f")) == "apple"
+    assert read(os.path.join(home, "g")) == "banana"
+    assert "Activated generation 1" in capfd.readouterr().out
+
+    # changing a target only changes the generation, not the link
+    dotfiles.write_config([{"link": {"~/f": "b", "~/g": "b"}}])
+    run_dotbot("--generations", "--jobs", jobs)
+    assert os.readlink(os.path.join(home, "f")) == link
+    assert read(os.path.join(home, "f")) == "banana"
+
+    run_dotbot("--rollback")
+    assert read(os.path.join(home, "f")) == "apple"
+    assert "Rolled back to generation 1" in capfd.readouterr().out
+    run_dotbot("--rollback")
+    assert read(os.path.join(home, "f")) == "banana"
+
+
+def test_generations_failed_run(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that a failed run with --generations doesn't change the active links."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write("b", "banana")
+    dotfiles.write_config([{"link": {"~/f": "a"}}])
+    run_dotbot("--generations")
+
+    dotfiles.write_config([{"link": {"~/f": "b"}}, {"shell": ["false"]}])
+    with pytest.raises(SystemExit):
+        run_dotbot("--generations")
+    assert read(os.path.join(home, "f")) == "apple"
+
+
+def test_generations_failed_run_new_link(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that a failed run with --generations doesn't leave the links it added dangling."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write_config([{"link": {"~/f": "a"}}])
+    run_dotbot("--generations")
+
+    dotfiles.write_config([{"link": {"~/f": "a", "~/g": "a"}}, {"shell": ["false"]}])
+    with pytest.raises(SystemExit):
+        run_dotbot("--generations")
+    assert read(os.path.join(home, "f")) == "apple"
+    assert not os.path.lexists(os.path.join(home, "g"))
+
+
+def test_generations_drop_links(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that a new generation only has the links of the run, even though it starts as a copy."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write("d/b", "banana")
+    dotfiles.write_config([{"link": {"~/f": "a", "~/g": "a", "~/d": "d"}}])
+    run_dotbot("--generations")
+
+    # ~/d becomes a directory of links
+    os.unlink(os.path.join(home, "d"))
+    dotfiles.write_config([{"link": {"~/f": "a", "~/d/b": {"path": "d/b", "create": True}}}])
+    run_dotbot("--generations")
+    assert read(os.path.join(home, "f")) == "apple"
+    assert read(os.path.join(home, "d", "b")) == "banana"
+    assert not os.path.exists(os.path.join(home, "g"))
+    assert os.listdir(os.path.join(dotfiles.directory, "d")) == ["b"]
+
+
+def test_generations_partial_run(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that runs that skip links keep the links of the current generation."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write("b", "banana")
+    dotfiles.write_config([{"link": {"~/f": "a"}}, {"shell": ["echo run >> ~/log"]}])
+    run_dotbot("--generations")
+
+    dotfiles.write_config([{"link": {"~/g": "b"}}, {"link": {"~/f": "a"}}, {"shell": ["echo run >> ~/log"]}])
+    run_dotbot("--generations", "--except", "shell")
+    assert read(os.path.join(home, "f")) == "apple"
+    assert read(os.path.join(home, "g")) == "banana"
+
+
+def test_rollback_without_previous_generation(
+    capfd: pytest.CaptureFixture[str], dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --rollback fails if there is no generation to roll back to."""
+
+    dotfiles.write_config([])
+    with pytest.raises(SystemExit):
+        run_dotbot("--rollback")
+    assert "There is no previous generation to roll back to" in capfd.readouterr().out
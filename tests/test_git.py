@@ -0,0 +1,82 @@
+import os
+import shutil
+import subprocess
+from typing import Callable
+from unittest import mock
+
+import pytest
+
+import dotbot.cli
+from dotbot.util.git import head_revision
+from tests.conftest import Dotfiles
+
+
+def git(dotfiles: Dotfiles, *args: str) -> str:
+    command = ["git", "-c", "user.name=Dotbot", "-c", "user.email=dotbot@example.com", *args]
+    return subprocess.check_output(command, cwd=dotfiles.directory).decode("ascii").strip()
+
+
+@pytest.fixture
+def repository(dotfiles: Dotfiles) -> Dotfiles:
+    if shutil.which("git") is None:
+        pytest.skip("git is unavailable")
+    git(dotfiles, "init", "-q")
+    dotfiles.write("f", "apple")
+    git(dotfiles, "add", "-A")
+    git(dotfiles, "commit", "-q", "-m", "Dotfiles")
+    return dotfiles
+
+
+def test_head_revision(repository: Dotfiles) -> None:
+    """Verify that the checked-out commit is read from loose refs."""
+
+    os.mkdir(os.path.join(repository.directory, "sub"))
+    assert head_revision(repository.directory) == git(repository, "rev-parse", "HEAD")
+    assert head_revision(os.path.join(repository.directory, "sub")) == git(repository, "rev-parse", "HEAD")
+
+
+def test_head_revision_packed_refs(repository: Dotfiles) -> None:
+    """Verify that the checked-out commit is read from packed refs."""
+
+    git(repository, "pack-refs", "--all")
+    assert head_revision(repository.directory) == git(repository, "rev-parse", "HEAD")
+
+
+def test_head_revision_detached(repository: Dotfiles) -> None:
+    """Verify that the checked-out commit is read when HEAD is detached."""
+
+    first = git(repository, "rev-parse", "HEAD")
+    repository.write("g", "banana")
+    git(repository, "add", "-A")
+    git(repository, "commit", "-q", "-m", "More dotfiles")
+    git(repository, "checkout", "-q", first)
+    assert head_revision(repository.directory) == first
+
+
+def test_head_revision_worktree(repository: Dotfiles) -> None:
+    """Verify that the checked-out commit is read in linked worktrees, which have a .git file."""
+
+    worktree = os.path.join(repository.directory, "worktree")
+    git(repository, "worktree", "add", "-q", "-b", "other", worktree)
+    assert os.path.isfile(os.path.join(worktree, ".git"))
+    assert head_revision(worktree) == git(repository, "rev-parse", "other")
+
+
+def test_head_revision_no_repository(home: str) -> None:
+    """Verify that directories outside of a repository have no commit."""
+
+    assert head_revision(home) is None
+
+
+def test_version(capfd: pytest.CaptureFixture[str], run_dotbot: Callable[..., None]) -> None:
+    """Verify that --version shows the version without running git."""
+
+    with mock.patch("subprocess.check_output") as check_output, pytest.raises(SystemExit) as e:
+        run_dotbot("--version", custom=True)
+    assert e.value.code == 0
+    check_output.assert_not_called()
+    output = capfd.readouterr().out
+    assert output.startswith(f"Dotbot version {dotbot.__version__}")
+    revision = head_revision(os.path.dirname(os.path.abspath(dotbot.cli.__file__)))
+    if revision is not None:
+        assert f"(git {revision[:10]})" in output
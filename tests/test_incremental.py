@@ -0,0 +1,83 @@
+import os
+from typing import Callable
+
+import pytest
+
+from tests.conftest import Dotfiles
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_incremental_skips_unchanged(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], jobs: str
+) -> None:
+    """Verify that --incremental skips actions that haven't changed since they last succeeded."""
+
+    dotfiles.write("f", "apple")
+    config = [
+        {"link": {"~/f": "f"}},
+        {"shell": ["echo run >> ~/log"]},
+    ]
+    dotfiles.write_config(config)
+    run_dotbot("--incremental", "--jobs", jobs)
+    run_dotbot("--incremental", "--jobs", jobs, "-v")
+
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\n"
+    output = capfd.readouterr().out
+    assert "Skipping unchanged action link" in output
+    assert "Skipping unchanged action shell" in output
+
+    # changed commands run again
+    config[1] = {"shell": ["echo changed >> ~/log"]}
+    dotfiles.write_config(config)
+    run_dotbot("--incremental", "--jobs", jobs)
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\nchanged\n"
+
+
+def test_incremental_detects_changed_files(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --incremental handles actions again when the files involved have changed."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/f": "f"}}])
+    run_dotbot("--incremental")
+    os.unlink(os.path.join(home, "f"))
+
+    run_dotbot("--incremental")
+    assert os.path.islink(os.path.join(home, "f"))
+
+
+def test_incremental_detects_changed_defaults(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --incremental handles actions again when their defaults have changed."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"shell": ["echo run >> ~/log"]}])
+    run_dotbot("--incremental")
+    dotfiles.write_config([{"defaults": {"shell": {"quiet": True}}}, {"shell": ["echo run >> ~/log"]}])
+    run_dotbot("--incremental")
+
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\nrun\n"
+
+
+def test_incremental_retries_failures(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --incremental doesn't skip actions that failed."""
+
+    dotfiles.write_config([{"shell": ["echo run >> ~/log && false"]}])
+    for _ in range(2):
+        with pytest.raises(SystemExit):
+            run_dotbot("--incremental")
+
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\nrun\n"
+
+
+def test_incremental_not_saved_in_dry_run(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that a dry run doesn't cause later runs to skip actions."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/f": "f"}}])
+    run_dotbot("--incremental", "--dry-run")
+    run_dotbot("--incremental")
+
+    assert os.path.islink(os.path.join(home, "f"))
@@ -1648,6 +1648,26 @@ def test_link_dry_run_relink(
     )
 
 
+def test_link_dry_run_relink_file(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that a dry run with relink reports removing an existing file, as it always has, but fails like a real run."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/.f": {"path": "f", "relink": True}}}])
+    with open(os.path.join(home, ".f"), "w") as file:
+        file.write("pear")
+    with pytest.raises(SystemExit):
+        run_dotbot("-n")
+    with open(os.path.join(home, ".f")) as file:
+        assert file.read() == "pear"
+
+    output = capfd.readouterr().out
+    lines = [line.strip() for line in output.splitlines()]
+    assert [line for line in lines if line.startswith("Would")] == [f"Would remove {os.path.join('~', '.f')}"]
+    assert f"{os.path.join('~', '.f')} already exists but is a regular file or directory" in output
+
+
 def test_link_dry_run_overwrite(
     capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
 ) -> None:
@@ -1782,3 +1802,32 @@ def test_link_error_delete(
 
     stdout, _ = capsys.readouterr()
     assert "Failed to remove" in stdout
+
+
+def test_link_defaults_merged_with_extended_config(
+    home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that defaults apply to extended configs, and that the old canonicalize-path key overrides them."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write("g", "banana")
+    dotfiles.write_config(
+        [
+            {"defaults": {"link": {"create": True, "relative": True, "canonicalize": True}}},
+            {
+                "link": {
+                    "~/a/.f": {"path": "f"},
+                    "~/b/.g": {"path": "g", "relative": False, "canonicalize-path": False},
+                }
+            },
+        ]
+    )
+    run_dotbot()
+
+    assert not os.path.isabs(os.readlink(os.path.join(home, "a", ".f")))
+    g = os.readlink(os.path.join(home, "b", ".g"))
+    if sys.platform == "win32" and g.startswith("\\\\?\\"):
+        g = g[4:]
+    assert g == os.path.join(dotfiles.directory, "g")
+    with open(os.path.join(home, "b", ".g")) as file:
+        assert file.read() == "banana"
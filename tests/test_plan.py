@@ -0,0 +1,115 @@
+import json
+import os
+from typing import Callable
+
+import pytest
+
+from tests.conftest import Dotfiles
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_plan_out_and_apply(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], jobs: str
+) -> None:
+    """Verify that --plan-out writes the changes without making them, and --apply-plan makes them."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config(
+        [
+            {"create": ["~/c"]},
+            {"link": {"~/d/f": {"path": "f", "create": True}}},
+            {"shell": [{"command": "echo run >> ~/log", "description": "Logging"}]},
+        ]
+    )
+    plan_file = os.path.join(home, "plan.json")
+    run_dotbot("--plan-out", plan_file, "--jobs", jobs)
+
+    assert not os.path.exists(os.path.join(home, "c"))
+    assert not os.path.exists(os.path.join(home, "d"))
+    assert not os.path.exists(os.path.join(home, "log"))
+    with open(plan_file) as file:
+        plan = json.load(file)
+    assert [operation["kind"] for operation in plan["operations"]] == ["mkdir", "mkdir", "symlink", "shell"]
+    output = capfd.readouterr().out
+    assert "Would create symlink ~/d/f" in output
+    assert "Would run command Logging [echo run >> ~/log]" in output
+
+    run_dotbot("--apply-plan", plan_file, custom=True)
+
+    assert os.path.isdir(os.path.join(home, "c"))
+    assert os.path.islink(os.path.join(home, "d", "f"))
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\n"
+    output = capfd.readouterr().out
+    assert "Creating symlink ~/d/f" in output
+    assert "Logging [echo run >> ~/log]" in output
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_plan_out_shared_parent(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], jobs: str) -> None:
+    """Verify that planned operations are taken into account by later ones, like in a normal run."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write("g", "banana")
+    dotfiles.write_config([{"link": {"~/x/f": {"path": "f", "create": True}, "~/x/g": {"path": "g", "create": True}}}])
+    plan_file = os.path.join(home, "plan.json")
+    run_dotbot("--plan-out", plan_file, "--jobs", jobs)
+
+    with open(plan_file) as file:
+        plan = json.load(file)
+    assert [operation["kind"] for operation in plan["operations"]] == ["mkdir", "symlink", "symlink"]
+
+    run_dotbot("--apply-plan", plan_file, custom=True)
+    assert os.path.islink(os.path.join(home, "x", "f"))
+    assert os.path.islink(os.path.join(home, "x", "g"))
+
+
+def test_plan_out_relink_file(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that a plan doesn't replace a regular file that relink without force leaves in place."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/.f": {"path": "f", "relink": True}}}])
+    with open(os.path.join(home, ".f"), "w") as file:
+        file.write("pear")
+    plan_file = os.path.join(home, "plan.json")
+    with pytest.raises(SystemExit):
+        run_dotbot("--plan-out", plan_file)
+
+    # like a real run, which leaves the file in place
+    assert "~/.f already exists but is a regular file or directory" in capfd.readouterr().out
+    assert not os.path.exists(plan_file)
+
+
+def test_apply_plan_failure(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --apply-plan fails if an operation fails."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"shell": ["false"]}, {"link": {"~/f": "f"}}])
+    plan_file = os.path.join(home, "plan.json")
+    run_dotbot("--plan-out", plan_file)
+
+    with pytest.raises(SystemExit):
+        run_dotbot("--apply-plan", plan_file, custom=True)
+    # without --exit-on-failure, later operations are still applied
+    assert os.path.islink(os.path.join(home, "f"))
+
+
+def test_apply_plan_rejects_config(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --apply-plan can't be combined with a configuration file."""
+
+    dotfiles.write_config([])
+    with pytest.raises(SystemExit):
+        run_dotbot("--apply-plan", os.path.join(home, "plan.json"))
+
+
+def test_apply_plan_unreadable(capfd: pytest.CaptureFixture[str], home: str, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --apply-plan reports plans that can't be read."""
+
+    plan_file = os.path.join(home, "plan.json")
+    with open(plan_file, "w") as file:
+        file.write("{}")
+    with pytest.raises(SystemExit):
+        run_dotbot("--apply-plan", plan_file, custom=True)
+    assert "Could not read plan file" in capfd.readouterr().out
@@ -0,0 +1,169 @@
+import os
+import shutil
+import subprocess
+from typing import Callable
+
+import pytest
+
+from tests.conftest import Dotfiles
+
+
+def commit(dotfiles: Dotfiles) -> None:
+    for command in (
+        ["git", "init", "-q"],
+        ["git", "add", "-A"],
+        ["git", "-c", "user.name=Dotbot", "-c", "user.email=dotbot@example.com", "commit", "-q", "-m", "Dotfiles"],
+    ):
+        subprocess.check_call(command, cwd=dotfiles.directory)
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_plan_cache_applies_cached_plan(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], jobs: str
+) -> None:
+    """Verify that --plan-cache makes the changes of an earlier run in the same state again."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config(
+        [
+            {"link": {"~/d/f": {"path": "f", "create": True}}},
+            {"shell": ["echo run >> ~/log"]},
+        ]
+    )
+    commit(dotfiles)
+    run_dotbot("--plan-cache", "--jobs", jobs)
+
+    # start over from the same state, as on a new machine
+    shutil.rmtree(os.path.join(home, "d"))
+    os.unlink(os.path.join(home, "log"))
+    capfd.readouterr()
+    run_dotbot("--plan-cache", "--jobs", jobs, "-v")
+
+    assert "Applying the cached plan" in capfd.readouterr().out
+    assert os.path.islink(os.path.join(home, "d", "f"))
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\n"
+
+
+def test_plan_cache_revalidates(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --plan-cache handles the configuration when the paths involved have changed."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write("g", "banana")
+    dotfiles.write_config([{"link": {"~/f": "f", "~/g": "g"}}])
+    commit(dotfiles)
+    run_dotbot("--plan-cache")
+
+    # ~/f is still in place, so the cached plan (which creates it) doesn't apply
+    os.unlink(os.path.join(home, "g"))
+    capfd.readouterr()
+    run_dotbot("--plan-cache", "-v")
+
+    assert "Applying the cached plan" not in capfd.readouterr().out
+    assert os.path.islink(os.path.join(home, "g"))
+
+
+def test_plan_cache_keyed_by_config(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --plan-cache doesn't apply plans of other configurations."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write("g", "banana")
+    dotfiles.write_config([{"link": {"~/f": "f"}}])
+    commit(dotfiles)
+    run_dotbot("--plan-cache")
+
+    os.unlink(os.path.join(home, "f"))
+    dotfiles.write_config([{"link": {"~/g": "g"}}])
+    capfd.readouterr()
+    run_dotbot("--plan-cache", "-v")
+
+    assert "Applying the cached plan" not in capfd.readouterr().out
+    assert not os.path.lexists(os.path.join(home, "f"))
+    assert os.path.islink(os.path.join(home, "g"))
+
+
+def test_plan_cache_reruns_if(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --plan-cache handles the configuration when the outcome of an `if` has changed."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/f": {"path": "f", "if": "test -e ~/flag"}}}])
+    commit(dotfiles)
+    run_dotbot("--plan-cache")
+    assert not os.path.lexists(os.path.join(home, "f"))
+
+    with open(os.path.join(home, "flag"), "w"):
+        pass
+    capfd.readouterr()
+    run_dotbot("--plan-cache", "-v")
+
+    assert "Applying the cached plan" not in capfd.readouterr().out
+    assert os.path.islink(os.path.join(home, "f"))
+
+
+def test_plan_cache_rematches_globs(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --plan-cache handles the configuration when a glob matches different paths."""
+
+    dotfiles.write("a/f", "apple")
+    dotfiles.write_config([{"link": {"~/c/": {"path": "a/*", "glob": True, "create": True}}}])
+    commit(dotfiles)
+    run_dotbot("--plan-cache")
+    assert os.path.islink(os.path.join(home, "c", "f"))
+
+    shutil.rmtree(os.path.join(home, "c"))
+    dotfiles.write("a/g", "banana")
+    capfd.readouterr()
+    run_dotbot("--plan-cache", "-v")
+
+    assert "Applying the cached plan" not in capfd.readouterr().out
+    assert os.path.islink(os.path.join(home, "c", "f"))
+    assert os.path.islink(os.path.join(home, "c", "g"))
+
+
+def test_plan_cache_replaced_file(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --plan-cache handles the configuration when a file was replaced by another one."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/h": {"path": "f", "type": "hardlink"}}}])
+    commit(dotfiles)
+    run_dotbot("--plan-cache")
+    assert os.path.samefile(os.path.join(home, "h"), os.path.join(dotfiles.directory, "f"))
+    # the hard link exists, so this caches a plan that does nothing
+    run_dotbot("--plan-cache")
+
+    # the target is replaced, so that ~/h is no longer a hard link to it
+    replacement = os.path.join(dotfiles.directory, "f.new")
+    dotfiles.write(replacement, "banana")
+    os.replace(replacement, os.path.join(dotfiles.directory, "f"))
+    capfd.readouterr()
+    with pytest.raises(SystemExit):
+        run_dotbot("--plan-cache", "-v")
+
+    output = capfd.readouterr().out
+    assert "Applying the cached plan" not in output
+    assert "~/h already exists but is a regular file or directory" in output
+
+
+def test_plan_cache_requires_git(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that --plan-cache doesn't cache plans of dotfiles that aren't in a git repository."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/f": "f"}}])
+    run_dotbot("--plan-cache")
+    os.unlink(os.path.join(home, "f"))
+    capfd.readouterr()
+    run_dotbot("--plan-cache", "-v")
+
+    assert "Applying the cached plan" not in capfd.readouterr().out
+    assert os.path.islink(os.path.join(home, "f"))
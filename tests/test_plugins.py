@@ -1,9 +1,14 @@
 import os
 import shutil
-from typing import Callable
+from argparse import Namespace
+from typing import Any, Callable, Tuple
 
 import pytest
 
+from dotbot.context import Context
+from dotbot.dispatcher import Dispatcher
+from dotbot.plugin import Plugin
+from dotbot.plugins.link import Link
 from tests.conftest import Dotfiles
 
 
@@ -181,3 +186,183 @@ def test_plugin_subdirectory(home: str, dotfiles: Dotfiles, run_dotbot: Callable
     run_dotbot()
     with open(os.path.join(home, "flag-file")) as file:
         assert file.read() == "file plugin loading works"
+
+
+def test_context_defaults_view_is_read_only() -> None:
+    """Verify that plugins can read the defaults without copying them, but can't modify them."""
+
+    context = Context("/", Namespace(dry_run=False))
+    context.set_defaults({"link": {"create": True, "exclude": ["a"]}})
+
+    view = context.defaults_view()
+    assert view["link"]["create"] is True
+    assert view["link"]["exclude"] == ("a",)
+    assert context.defaults_view() is view
+    with pytest.raises(TypeError):
+        view["link"]["create"] = False
+
+    # the compatibility path still returns a mutable copy
+    defaults = context.defaults()
+    defaults["link"]["exclude"].append("b")
+    assert context.defaults()["link"]["exclude"] == ["a"]
+
+
+def test_context_options_view_is_read_only() -> None:
+    """Verify that plugins can read the options without copying them, but can't modify them."""
+
+    context = Context("/", Namespace(dry_run=False, only=["link"]))
+
+    view = context.options_view()
+    assert view.only == ("link",)
+    with pytest.raises(AttributeError):
+        view.dry_run = True
+    assert not context.dry_run()
+
+    # the compatibility path still returns a mutable copy
+    options = context.options()
+    options.dry_run = True
+    assert not context.options().dry_run
+
+
+def test_plugin_declared_directives(dotfiles: Dotfiles) -> None:
+    """Verify that directives are routed to plugins in load order, whether declared or checked dynamically."""
+
+    handled = []
+
+    class Declared(Plugin):
+        directives: Tuple[str, ...] = ("first", "both")
+
+        def handle(self, directive: str, data: Any) -> bool:
+            handled.append(("declared", directive, data))
+            return True
+
+    class Dynamic(Plugin):
+        def can_handle(self, directive: str) -> bool:
+            return directive in {"second", "both"}
+
+        def handle(self, directive: str, data: Any) -> bool:
+            handled.append(("dynamic", directive, data))
+            return True
+
+    class Other(Declared):
+        directives = ("both",)
+
+    dispatcher = Dispatcher(dotfiles.directory, plugins=[Dynamic, Declared, Other])
+    assert dispatcher.dispatch([{"first": 1}, {"second": 2}, {"both": 3}])
+    assert handled == [
+        ("declared", "first", 1),
+        ("dynamic", "second", 2),
+        ("dynamic", "both", 3),
+        ("declared", "both", 3),
+        ("declared", "both", 3),
+    ]
+    assert Declared(Context("/")).can_handle("first")
+    assert not Declared(Context("/")).can_handle("second")
+    assert not dispatcher.dispatch([{"third": 4}])
+
+
+def test_plugin_subclass_overrides_directive(home: str, dotfiles: Dotfiles) -> None:
+    """Verify that a subclass of a built-in plugin that overrides _directive handles only its own directive."""
+
+    class MyLink(Link):
+        _directive = "mylink"
+
+    assert Link.directives == ("link",)
+    assert MyLink.directives == ("mylink",)
+    dotfiles.write("a", "apple")
+    dispatcher = Dispatcher(dotfiles.directory, plugins=[Link, MyLink])
+    assert dispatcher.dispatch([{"link": {"~/.p1": "a"}}, {"mylink": {"~/.p2": "a"}}])
+    assert os.path.islink(os.path.join(home, ".p1"))
+    assert os.path.islink(os.path.join(home, ".p2"))
+
+
+# a plugin that records when its file is loaded, and when it handles its directive
+DECLARED_PLUGIN = """
+import os.path
+
+import dotbot
+
+with open(os.path.expanduser("~/loaded"), "a") as file:
+    file.write("{name} ")
+
+
+class {name}(dotbot.Plugin):
+    directives = ("{name}",)
+    supports_dry_run = {dry_run}
+
+    def handle(self, directive, data):
+        with open(os.path.expanduser("~/handled"), "a") as file:
+            file.write(directive + " ")
+        return True
+"""
+
+
+def read_and_remove(path: str) -> str:
+    try:
+        with open(path) as file:
+            return file.read()
+    except FileNotFoundError:
+        return ""
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_plugin_cache(
+    monkeypatch: pytest.MonkeyPatch, root: str, home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that cached plugin directives are used to only load the plugins that are used."""
+
+    monkeypatch.setenv("XDG_CACHE_HOME", os.path.join(root, "cache"))
+    for name in ("a", "b"):
+        dotfiles.write(os.path.join("plugins", f"{name}.py"), DECLARED_PLUGIN.format(name=name, dry_run=False))
+    dotfiles.write_config([{"a": None}])
+    run_dotbot("--plugin-cache", "--plugin", os.path.join(dotfiles.directory, "plugins"))
+    assert sorted(read_and_remove(os.path.join(home, "loaded")).split()) == ["a", "b"]
+    assert read_and_remove(os.path.join(home, "handled")) == "a "
+    assert os.path.isfile(os.path.join(root, "cache", "dotbot", "plugins.json"))
+
+    run_dotbot("--plugin-cache", "--plugin", os.path.join(dotfiles.directory, "plugins"))
+    assert read_and_remove(os.path.join(home, "loaded")) == "a "
+    assert read_and_remove(os.path.join(home, "handled")) == "a "
+
+    # changed plugins are loaded again
+    dotfiles.write(os.path.join("plugins", "b.py"), DECLARED_PLUGIN.format(name="b", dry_run=True))
+    dotfiles.write_config([{"a": None}, {"b": None}])
+    run_dotbot("--plugin-cache", "--plugin", os.path.join(dotfiles.directory, "plugins"))
+    assert read_and_remove(os.path.join(home, "loaded")) == "b a "
+
+    # stand-ins have the attributes of the plugins, so a is skipped without being loaded
+    run_dotbot("--plugin-cache", "--dry-run", "--plugin", os.path.join(dotfiles.directory, "plugins"))
+    assert read_and_remove(os.path.join(home, "loaded")) == "b "
+    assert read_and_remove(os.path.join(home, "handled")) == "a b b "
+
+
+def test_plugin_cache_undeclared_directives(
+    monkeypatch: pytest.MonkeyPatch, root: str, home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that plugins that don't declare their directives are always loaded."""
+
+    monkeypatch.setenv("XDG_CACHE_HOME", os.path.join(root, "cache"))
+    plugin_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dotbot_plugin_counter.py")
+    shutil.copy(plugin_file, os.path.join(dotfiles.directory, "counter.py"))
+    dotfiles.write_config([{"counter": None}])
+    for _ in range(2):
+        run_dotbot("--plugin-cache", "--plugin", os.path.join(dotfiles.directory, "counter.py"))
+    with open(os.path.join(home, "counter")) as file:
+        assert file.read() == "2"
+
+
+def test_plugin_cache_corrupted(
+    monkeypatch: pytest.MonkeyPatch, root: str, home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that an unreadable plugin cache is ignored."""
+
+    monkeypatch.setenv("XDG_CACHE_HOME", os.path.join(root, "cache"))
+    os.makedirs(os.path.join(root, "cache", "dotbot"))
+    with open(os.path.join(root, "cache", "dotbot", "plugins.json"), "w") as file:
+        file.write('{"version": 1, "files": ["nonsense"]}')
+    dotfiles.write(os.path.join("plugins", "a.py"), DECLARED_PLUGIN.format(name="a", dry_run=False))
+    dotfiles.write_config([{"a": None}])
+    run_dotbot("--plugin-cache", "--plugin", os.path.join(dotfiles.directory, "plugins"))
+    assert read_and_remove(os.path.join(home, "handled")) == "a "
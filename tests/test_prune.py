@@ -0,0 +1,59 @@
+import os
+from typing import Callable
+
+import pytest
+
+from tests.conftest import Dotfiles
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_prune_removed_links(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], jobs: str
+) -> None:
+    """Verify that --prune removes the links that are no longer in the configuration."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write("b", "banana")
+    dotfiles.write_config([{"link": {"~/a": "a", "~/b": "b"}}])
+    run_dotbot("--prune", "--jobs", jobs)
+
+    dotfiles.write_config([{"link": {"~/a": "a"}}])
+    run_dotbot("--prune", "--jobs", jobs, "--dry-run")
+    assert os.path.islink(os.path.join(home, "b"))
+    assert "Would remove stale link" in capfd.readouterr().out
+
+    run_dotbot("--prune", "--jobs", jobs)
+    assert os.path.islink(os.path.join(home, "a"))
+    assert not os.path.lexists(os.path.join(home, "b"))
+
+
+def test_prune_invalid_links(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --prune removes links whose targets are gone, even when only some directives run."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write("b", "banana")
+    dotfiles.write_config([{"link": {"~/a": "a", "~/b": "b"}}])
+    run_dotbot("--prune")
+
+    os.unlink(os.path.join(dotfiles.directory, "b"))
+    dotfiles.write_config([{"link": {"~/a": "a"}}, {"shell": ["true"]}])
+    run_dotbot("--prune", "--only", "shell")
+    assert os.path.islink(os.path.join(home, "a"))
+    assert not os.path.lexists(os.path.join(home, "b"))
+
+
+def test_prune_leaves_other_links(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --prune doesn't remove links that it didn't create, or that were changed since."""
+
+    dotfiles.write("a", "apple")
+    dotfiles.write("b", "banana")
+    dotfiles.write_config([{"link": {"~/a": "a"}}])
+    os.symlink(os.path.join(dotfiles.directory, "b"), os.path.join(home, "b"))
+    run_dotbot("--prune")
+
+    os.unlink(os.path.join(home, "a"))
+    os.symlink(os.path.join(dotfiles.directory, "b"), os.path.join(home, "a"))
+    dotfiles.write_config([])
+    run_dotbot("--prune")
+    assert os.path.islink(os.path.join(home, "a"))
+    assert os.path.islink(os.path.join(home, "b"))
@@ -0,0 +1,89 @@
+import os
+from typing import Callable
+
+import pytest
+
+from tests.conftest import Dotfiles
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_resume_skips_completed_tasks(
+    capfd: pytest.CaptureFixture[str], home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None], jobs: str
+) -> None:
+    """Verify that --resume skips the tasks that a failed run completed."""
+
+    dotfiles.write("f", "apple")
+    config = [
+        {"defaults": {"link": {"create": True}}},
+        {"shell": ["echo first >> ~/log"]},
+        {"shell": ["echo second >> ~/log && test -e ~/flag"]},
+        {"link": {"~/d/f": "f"}},
+    ]
+    dotfiles.write_config(config)
+    with pytest.raises(SystemExit):
+        run_dotbot("--resume", "--jobs", jobs)
+
+    with open(os.path.join(home, "flag"), "w"):
+        pass
+    capfd.readouterr()
+    run_dotbot("--resume", "--jobs", jobs, "-v")
+
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "first\nsecond\nsecond\n"
+    # defaults from skipped tasks still apply
+    assert os.path.islink(os.path.join(home, "d", "f"))
+    output = capfd.readouterr().out
+    assert "Skipping task 1, which was completed by an earlier run" in output
+
+    # after a successful run, there is nothing to resume
+    run_dotbot("--resume", "--jobs", jobs)
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "first\nsecond\nsecond\nfirst\nsecond\n"
+
+
+def test_resume_changed_config(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --resume runs tasks again if they or the tasks before them changed."""
+
+    dotfiles.write_config(
+        [
+            {"shell": ["echo first >> ~/log"]},
+            {"shell": ["echo second >> ~/log"]},
+            {"shell": ["false"]},
+        ]
+    )
+    with pytest.raises(SystemExit):
+        run_dotbot("--resume")
+
+    dotfiles.write_config(
+        [
+            {"shell": ["echo changed >> ~/log"]},
+            {"shell": ["echo second >> ~/log"]},
+        ]
+    )
+    run_dotbot("--resume")
+
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "first\nsecond\nchanged\nsecond\n"
+
+
+def test_resume_without_journal(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that --resume runs everything when there is nothing to resume."""
+
+    dotfiles.write_config([{"shell": ["echo run >> ~/log"]}])
+    run_dotbot("--resume")
+
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\n"
+
+
+def test_resume_needs_journal(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that only runs with --resume keep a journal."""
+
+    dotfiles.write_config([{"shell": ["echo run >> ~/log"]}, {"shell": ["false"]}])
+    with pytest.raises(SystemExit):
+        run_dotbot()
+    with pytest.raises(SystemExit):
+        run_dotbot("--resume")
+
+    with open(os.path.join(home, "log")) as file:
+        assert file.read() == "run\nrun\n"
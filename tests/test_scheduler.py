@@ -0,0 +1,133 @@
+import threading
+from typing import Callable, List
+
+import pytest
+
+from dotbot.messenger import Messenger
+from dotbot.plan import Operation, Plan
+from dotbot.scheduler import Scheduler
+
+
+def record(events: List[str], name: str, *, success: bool = True) -> Callable[[], bool]:
+    def function() -> bool:
+        events.append(name)
+        Messenger().action(name)
+        return success
+
+    return function
+
+
+def test_scheduler_runs_independent_units_in_parallel() -> None:
+    """Verify that units with disjoint paths run at the same time."""
+
+    started = threading.Event()
+
+    def start() -> bool:
+        started.set()
+        return True
+
+    scheduler = Scheduler(2, stop_on_failure=False)
+    try:
+        # the first unit can only finish if the second one runs at the same time
+        scheduler.submit(lambda: started.wait(timeout=10), ["/home/user/a"])
+        scheduler.submit(start, ["/home/user/b"])
+        assert scheduler.drain()
+    finally:
+        scheduler.shutdown()
+
+
+@pytest.mark.parametrize(
+    ("first", "second"),
+    [
+        ("/home/user/a", "/home/user/a"),
+        ("/home/user", "/home/user/a/b"),
+        ("/home/user/a/b", "/home/user"),
+    ],
+)
+def test_scheduler_orders_overlapping_units(first: str, second: str) -> None:
+    """Verify that a unit waits for earlier units that touch the same path, an ancestor, or a descendant."""
+
+    release = threading.Event()
+    events: List[str] = []
+    scheduler = Scheduler(4, stop_on_failure=False)
+    try:
+
+        def slow() -> bool:
+            release.wait(timeout=1)
+            events.append("first")
+            return True
+
+        scheduler.submit(slow, [first])
+        scheduler.submit(record(events, "second"), [second])
+        release.set()
+        assert scheduler.drain()
+    finally:
+        scheduler.shutdown()
+    assert events == ["first", "second"]
+
+
+def test_scheduler_output_is_in_submission_order(capfd: pytest.CaptureFixture[str]) -> None:
+    """Verify that output is printed in submission order, regardless of when units finish."""
+
+    Messenger().use_color(False)
+    release = threading.Event()
+    scheduler = Scheduler(4, stop_on_failure=False)
+    try:
+
+        def slow() -> bool:
+            release.wait(timeout=10)
+            Messenger().action("slow")
+            return True
+
+        scheduler.submit(slow, ["/a"])
+        for i in range(10):
+            scheduler.submit(record([], f"fast {i}"), [f"/b/{i}"])
+        release.set()
+        assert scheduler.drain()
+    finally:
+        scheduler.shutdown()
+    assert capfd.readouterr().out.splitlines() == ["slow"] + [f"fast {i}" for i in range(10)]
+
+
+def test_scheduler_plan_is_in_submission_order() -> None:
+    """Verify that operations are added to the plan in submission order, regardless of when units finish."""
+
+    release = threading.Event()
+    plan = Plan()
+    scheduler = Scheduler(4, stop_on_failure=False, plan=plan)
+
+    def add(path: str, *, wait: bool = False) -> Callable[[], bool]:
+        def function() -> bool:
+            if wait:
+                release.wait(timeout=10)
+            plan.add(Operation("mkdir", {"path": path}, planned=None, performed=None, failed=None))
+            return True
+
+        return function
+
+    try:
+        scheduler.submit(add("/a", wait=True), ["/a"])
+        for i in range(10):
+            scheduler.submit(add(f"/b/{i}"), [f"/b/{i}"])
+        release.set()
+        assert scheduler.drain()
+    finally:
+        scheduler.shutdown()
+    assert [operation.arguments["path"] for operation in plan.operations()] == ["/a"] + [f"/b/{i}" for i in range(10)]
+
+
+def test_scheduler_stop_on_failure() -> None:
+    """Verify that no units start after a failure when stop_on_failure is set."""
+
+    events: List[str] = []
+    scheduler = Scheduler(4, stop_on_failure=True)
+    try:
+        scheduler.submit(record(events, "fail", success=False), ["/a"])
+        scheduler.submit(record(events, "after"), ["/a/b"])
+        assert not scheduler.drain()
+        assert scheduler.stopped
+        scheduler.submit(record(events, "later"), ["/c"])
+        scheduler.drain()
+    finally:
+        scheduler.shutdown()
+    assert events == ["fail"]
@@ -0,0 +1,135 @@
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator, List
+
+import pytest
+
+from tests.conftest import Dotfiles
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32" or not hasattr(socket, "AF_UNIX"),
+    reason="--serve and --connect require Unix sockets",
+)
+
+
+def environment(home: str) -> Dict[str, str]:
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["PYTHONPATH"] = SRC
+    return env
+
+
+@pytest.fixture
+def server(home: str) -> Iterator[str]:
+    path = os.path.join(home, "s")
+    process = subprocess.Popen(
+        [sys.executable, "-c", "import dotbot.cli; dotbot.cli.main()", "--serve", path], env=environment(home)
+    )
+    try:
+        deadline = time.monotonic() + 10
+        while not os.path.exists(path):
+            if process.poll() is not None or time.monotonic() > deadline:
+                pytest.fail("The server did not start")
+            time.sleep(0.01)
+        yield path
+    finally:
+        process.terminate()
+        assert process.wait(timeout=10) == 0
+    assert not os.path.exists(path)
+
+
+def connect(home: str, dotfiles: Dotfiles, path: str, *argv: str) -> "subprocess.CompletedProcess[str]":
+    arguments: List[str] = [sys.executable, "-c", "import dotbot.client; dotbot.client.main()", "--connect", path]
+    return subprocess.run(
+        [*arguments, *argv],
+        cwd=dotfiles.directory,
+        env=environment(home),
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+
+
+def test_connect(home: str, dotfiles: Dotfiles, server: str) -> None:
+    """Verify that runs on the server use the client's directory and output."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/.f": "f"}}, {"shell": [{"command": "echo $PWD", "stdout": True}]}])
+    result = connect(home, dotfiles, server, "-c", dotfiles.config_filename)
+
+    assert result.returncode == 0
+    assert "Creating symlink ~/.f" in result.stdout
+    assert os.path.realpath(dotfiles.directory) in result.stdout
+    with open(os.path.join(home, ".f")) as file:
+        assert file.read() == "apple"
+
+
+def test_connect_reloads_config(home: str, dotfiles: Dotfiles, server: str) -> None:
+    """Verify that the server notices when the config file changes between runs."""
+
+    dotfiles.write("f", "apple")
+    dotfiles.write("g", "banana")
+    dotfiles.write_config([{"link": {"~/.f": "f"}}])
+    assert connect(home, dotfiles, server, "-c", dotfiles.config_filename).returncode == 0
+    dotfiles.write_config([{"link": {"~/.g": "g"}}])
+    assert connect(home, dotfiles, server, "-c", dotfiles.config_filename).returncode == 0
+
+    with open(os.path.join(home, ".g")) as file:
+        assert file.read() == "banana"
+
+
+def test_connect_reloads_plugins(home: str, dotfiles: Dotfiles, server: str) -> None:
+    """Verify that the server loads each plugin once, until the plugin file changes."""
+
+    plugin_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dotbot_plugin_counter.py")
+    shutil.copy(plugin_file, os.path.join(dotfiles.directory, "counter.py"))
+    with open(os.path.join(dotfiles.directory, "counter.py"), "a") as file:
+        file.write("\nwith open(os.path.expanduser('~/loads'), 'a') as f:\n    f.write('x')\n")
+    dotfiles.write_config([{"counter": None}])
+    argv = ["--plugin", "counter.py", "-c", dotfiles.config_filename]
+    for _ in range(2):
+        assert connect(home, dotfiles, server, *argv).returncode == 0
+    with open(os.path.join(home, "loads")) as file:
+        assert file.read() == "x"
+
+    with open(os.path.join(dotfiles.directory, "counter.py"), "a") as file:
+        file.write("\n# changed\n")
+    assert connect(home, dotfiles, server, *argv).returncode == 0
+    with open(os.path.join(home, "loads")) as file:
+        assert file.read() == "xx"
+    with open(os.path.join(home, "counter")) as file:
+        assert file.read() == "3"
+
+
+def test_connect_failure(home: str, dotfiles: Dotfiles, server: str) -> None:
+    """Verify that the client exits with the status of the run, and the server keeps serving."""
+
+    dotfiles.write_config([{"shell": ["false"]}])
+    result = connect(home, dotfiles, server, "-c", dotfiles.config_filename)
+    assert result.returncode == 1
+    assert "Some tasks were not executed successfully" in result.stdout
+
+    result = connect(home, dotfiles, server, "-c", os.path.join(dotfiles.directory, "missing.yaml"))
+    assert result.returncode == 1
+
+    result = connect(home, dotfiles, server, "--connect", server)
+    assert result.returncode == 1
+    assert "cannot be used with `--connect`" in result.stdout
+
+    dotfiles.write_config([])
+    assert connect(home, dotfiles, server, "-c", dotfiles.config_filename).returncode == 0
+
+
+def test_connect_no_server(home: str, dotfiles: Dotfiles) -> None:
+    """Verify that the client reports when no server is listening."""
+
+    dotfiles.write_config([])
+    result = connect(home, dotfiles, os.path.join(home, "s"), "-c", dotfiles.config_filename)
+    assert result.returncode == 1
+    assert "Could not connect to" in result.stdout
@@ -318,3 +318,17 @@ def test_shell_dry_run(capfd: pytest.CaptureFixture[str], dotfiles: Dotfiles, ru
 
     lines = capfd.readouterr().out.splitlines()
     assert any(line.strip() == "Would run command exit 1" for line in lines)
+
+
+def test_shell_malformed_command_runs_nothing(
+    capfd: pytest.CaptureFixture[str], dotfiles: Dotfiles, run_dotbot: Callable[..., None]
+) -> None:
+    """Verify that a malformed command is detected before any command is run."""
+
+    dotfiles.write_config([{"shell": [{"command": "echo apple", "stdout": True}, {"description": "banana"}]}])
+    with pytest.raises(SystemExit):
+        run_dotbot()
+
+    output = capfd.readouterr().out
+    assert "apple" not in output
+    assert "An error was encountered while executing action shell" in output
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+from typing import List
+
+from tests.conftest import Dotfiles
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+DEFERRED = [
+    "dotbot.plugins.clean",
+    "dotbot.plugins.create",
+    "dotbot.plugins.link",
+    "dotbot.plugins.shell",
+    "dotbot.scheduler",
+    "concurrent.futures",
+    "datetime",
+    "glob",
+    "multiprocessing",
+    "pickle",
+    "shutil",
+    "tempfile",
+    "yaml",
+]
+
+
+def imported_modules(code: str, home: str) -> List[str]:
+    """
+    Runs the code in a new interpreter, and returns the modules that it
+    imported.
+    """
+    env = dict(os.environ)
+    env["HOME"] = home
+    env["PYTHONPATH"] = SRC
+    script = f"{code}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))"
+    output = subprocess.check_output([sys.executable, "-c", script], env=env, text=True)
+    modules: List[str] = json.loads(output.splitlines()[-1])
+    return modules
+
+
+def test_startup_defers_imports(home: str) -> None:
+    """Verify that importing Dotbot doesn't load the modules that are only needed later."""
+
+    modules = imported_modules("import dotbot.cli", home)
+    assert "dotbot.cli" in modules
+    for name in DEFERRED:
+        assert name not in modules
+
+
+def test_startup_package_is_lazy(home: str) -> None:
+    """Verify that importing the package doesn't load the command-line interface."""
+
+    modules = imported_modules("import dotbot", home)
+    assert "dotbot.cli" not in modules
+    modules = imported_modules("import dotbot\nassert callable(dotbot.main)\nassert dotbot.Plugin", home)
+    assert "dotbot.cli" in modules
+
+
+def test_startup_loads_used_plugins(home: str, dotfiles: Dotfiles) -> None:
+    """Verify that only the built-in plugins whose directives are used are loaded."""
+
+    dotfiles.write_config([{"shell": ["true"]}])
+    code = (
+        f"import sys\nimport dotbot.cli\nsys.argv = ['dotbot', '-c', {dotfiles.config_filename!r}]\ndotbot.cli.main()"
+    )
+    modules = imported_modules(code, home)
+    assert "dotbot.plugins.shell" in modules
+    assert "dotbot.plugins.link" not in modules
+    assert "dotbot.plugins.clean" not in modules
+    assert "dotbot.plugins.create" not in modules
+    # the config is parsed without PyYAML, and building the parser doesn't measure the terminal
+    assert "yaml" not in modules
+    assert "shutil" not in modules
@@ -0,0 +1,157 @@
+import os
+import random
+import re
+from typing import Any, Callable, List
+
+import pytest
+import yaml
+
+from dotbot.util import yaml_subset
+from tests.conftest import Dotfiles
+
+README = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "README.md")
+
+
+def readme_examples() -> List[str]:
+    with open(README) as file:
+        return re.findall(r"```yaml\n(.*?)```", file.read(), re.DOTALL)
+
+
+SUPPORTED = [
+    "",
+    "# just a comment\n",
+    "[]",
+    "{}\n",
+    "scalar",
+    "- link:\n    ~/.vimrc: vimrc\n",
+    "- link:\n    ~/.vimrc:\n      path: vimrc\n      relink: true\n",
+    "- shell:\n  - echo a\n  - [echo b, Printing b]\n- clean: ['~']\n",
+    "- defaults:\n    link:\n      create: true\n      relink: yes\n",
+    "- create:\n    ~/.ssh:\n      mode: 0700\n    ~/projects:\n",
+    "- create:\n    ~/a:\n      mode: 448\n    ~/b: {}\n",
+    "-\n  link:\n    ~/.f: f\n",
+    "- link:\n    '~/.has: colon': \"f\"\n    ~/.quoted: 'it''s'\n",
+    "- link:\n    ~/.f: f # a comment\n    ~/.g: g#not-a-comment\n",
+    "- shell:\n  - command: echo $HOME:$PATH\n    stdout: true\n    quiet: off\n",
+    "- shell:\n  - [echo -n, -v]\n  - [\"a, b\", 'c ]']\n",
+    "- link:\n    ~/.config/:\n      glob: true\n      path: config/*\n      exclude: [config/a, config/b]\n",
+    "- link:\n    ~/.f: ~\n    ~/.g: null\n    ~/.h:\n",
+    "- - nested\n  - sequence\n- - another\n",
+    "- a: 1\n  b: -2\n  c: +3\n  d: 0\n  e: -f\n  f: .vimrc\n  g: http://example.com\n",
+    "- plugins:\n  - dotbot-plugin/plugin.py\n- brew: [git, vim]\n",
+    "  - indented: top\n  - level\n",
+    "- key:\n  - same indent\n  - sequence\n  other: value\n",
+    "- {}\n- k: {  }\n",
+    "- trailing spaces   \n-   extra spaces   \n",
+    "- [ ]\n- ['', \"\"]\n",
+]
+
+UNSUPPORTED = [
+    "---\n- a\n",
+    "%YAML 1.1\n---\n- a\n",
+    "- &anchor a\n- *anchor\n",
+    "- !!str 1\n",
+    "- |\n  block\n",
+    "- >\n  folded\n",
+    "- {a: b}\n",
+    "- [a, [b]]\n",
+    "- [a, b,]\n",
+    "- [a,\n  b]\n",
+    "- 'multi\n  line'\n",
+    "- plain\n  continued\n",
+    '- "escape\\n"\n',
+    "- 1.5\n",
+    "- 1e3\n",
+    "- .inf\n",
+    "- .5\n",
+    "- 2001-12-14\n",
+    "- 1:20\n",
+    "- 0x1f\n",
+    "- 0b101\n",
+    "- 1_000\n",
+    "- 08\n",
+    "- <<: {}\n",
+    "- =\n",
+    "- ? complex\n  : key\n",
+    "- a: b: c\n",
+    "-\tab\n",
+    "scalar\n  continued\n",
+    "- a\nb: c\n",
+    "a: 1\n- b\n",
+    "- a: 1\n b: 2\n",
+    "\ufeff- bom\n",
+    "- a\u2028b\n",
+]
+
+
+def assert_identical(expected: Any, actual: Any) -> None:
+    """Assert that two values are equal and have the same types, recursively."""
+
+    assert type(expected) is type(actual), f"{expected!r} != {actual!r}"
+    if isinstance(expected, dict):
+        assert list(expected.keys()) == list(actual.keys())
+        for key in expected:
+            assert_identical(key, next(k for k in actual if k == key))
+            assert_identical(expected[key], actual[key])
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual)
+        for a, b in zip(expected, actual):
+            assert_identical(a, b)
+    else:
+        assert expected == actual
+
+
+@pytest.mark.parametrize("document", SUPPORTED + readme_examples())
+def test_yaml_subset_supported(document: str) -> None:
+    """Verify that the fast parser accepts common documents and agrees with PyYAML."""
+
+    assert_identical(yaml.safe_load(document), yaml_subset.parse(document))
+
+
+@pytest.mark.parametrize("document", UNSUPPORTED)
+def test_yaml_subset_unsupported(document: str) -> None:
+    """Verify that the fast parser rejects documents outside the subset."""
+
+    with pytest.raises(yaml_subset.UnsupportedSyntaxError):
+        yaml_subset.parse(document)
+
+
+def test_yaml_subset_differential_fuzz() -> None:
+    """Verify that mutated documents are either rejected or parsed identically to PyYAML."""
+
+    rng = random.Random(0)
+    corpus = SUPPORTED + UNSUPPORTED + readme_examples()
+    alphabet = [*" \n-:#'\"[],{}~!&*|>?0.1aZ", "  ", "- ", ": ", " #", "yes", "0700", "\n  "]
+    accepted = 0
+    for _ in range(5000):
+        document = rng.choice(corpus)
+        for _ in range(rng.randint(1, 3)):
+            position = rng.randint(0, len(document))
+            if rng.random() < 0.5 and position < len(document):
+                document = document[:position] + document[position + 1 :]
+            else:
+                document = document[:position] + rng.choice(alphabet) + document[position:]
+        try:
+            expected = yaml.safe_load(document)
+        except yaml.YAMLError:
+            with pytest.raises(yaml_subset.UnsupportedSyntaxError):
+                yaml_subset.parse(document)
+            continue
+        try:
+            actual = yaml_subset.parse(document)
+        except yaml_subset.UnsupportedSyntaxError:
+            continue
+        accepted += 1
+        assert_identical(expected, actual)
+    # make sure the fuzzer exercises the parser, not just the fallback
+    assert accepted > 1000
+
+
+def test_yaml_subset_fallback(home: str, dotfiles: Dotfiles, run_dotbot: Callable[..., None]) -> None:
+    """Verify that configs outside the subset are still read correctly."""
+
+    dotfiles.write("install.conf.yaml", "- create: &dirs\n  - ~/a\n- create: *dirs\n- create:\n  - >-\n    ~/b\n")
+    run_dotbot("-c", os.path.join(dotfiles.directory, "install.conf.yaml"), custom=True)
+
+    assert os.path.isdir(os.path.join(home, "a"))
+    assert os.path.isdir(os.path.join(home, "b"))
@@ -0,0 +1,76 @@
+import os
+import shutil
+import subprocess
+import sys
+import zipfile
+
+import pytest
+import yaml
+
+from tests.conftest import Dotfiles
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_zipapp(output: str, *argv: str, root: str = ROOT) -> None:
+    subprocess.check_call([sys.executable, os.path.join(root, "tools", "build-zipapp.py"), "--output", output, *argv])
+
+
+def test_zipapp(home: str, dotfiles: Dotfiles) -> None:
+    """Verify that the zipapp runs Dotbot, using the bytecode that it includes."""
+
+    zipapp = os.path.join(home, "dotbot.pyz")
+    build_zipapp(zipapp)
+    with zipfile.ZipFile(zipapp) as archive:
+        names = set(archive.namelist())
+    for name in ("__main__.pyc", "dotbot/cli.py", "dotbot/cli.pyc", "yaml/__init__.pyc"):
+        assert name in names
+
+    dotfiles.write("f", "apple")
+    dotfiles.write_config([{"link": {"~/.f": "f"}}])
+    subprocess.check_call([sys.executable, zipapp, "-c", dotfiles.config_filename], cwd=dotfiles.directory)
+
+    with open(os.path.join(home, ".f")) as file:
+        assert file.read() == "apple"
+
+
+@pytest.mark.skipif(
+    "sys.platform == 'win32'",
+    reason="The hybrid sh/Python dotbot script doesn't run on Windows platforms",
+)
+def test_bin_dotbot_prefers_zipapp(home: str) -> None:
+    """Verify that the dotbot script runs the zipapp, unless the sources have been updated since it was built."""
+
+    project = os.path.join(home, "dotbot")
+    for directory in ("bin", "src", "tools"):
+        shutil.copytree(
+            os.path.join(ROOT, directory),
+            os.path.join(project, directory),
+            ignore=shutil.ignore_patterns("__pycache__"),
+        )
+    # like the PyYAML submodule
+    yaml_directory = os.path.join(project, "lib", "pyyaml", "lib", "yaml")
+    shutil.copytree(os.path.dirname(yaml.__file__), yaml_directory, ignore=shutil.ignore_patterns("__pycache__"))
+    zipapp = os.path.join(project, "dist", "dotbot.pyz")
+    executable = os.path.join(project, "bin", "dotbot")
+
+    for updated in (os.path.join(project, "src", "dotbot", "plugins"), yaml_directory):
+        build_zipapp(zipapp, "--yaml", yaml_directory, root=project)
+        output = subprocess.check_output([executable, "--yaml-loader"]).decode("utf-8")
+        assert zipapp in output
+
+        # updating a file (e.g., with git) replaces it, which changes its directory
+        built = os.stat(updated).st_mtime
+        os.utime(updated, (built + 10, built + 10))
+        output = subprocess.check_output([executable, "--yaml-loader"]).decode("utf-8")
+        assert zipapp not in output
+
+
+def test_zipapp_bytecode_not_optimized(home: str) -> None:
+    """Verify that the bytecode in the zipapp keeps docstrings, because Python uses it even without -O."""
+
+    zipapp = os.path.join(home, "dotbot.pyz")
+    build_zipapp(zipapp)
+    code = "import dotbot.filesystem; print(dotbot.filesystem.FileSystem.__doc__ is not None)"
+    output = subprocess.check_output([sys.executable, "-c", code], env={**os.environ, "PYTHONPATH": zipapp})
+    assert output.decode("utf-8").strip() == "True"
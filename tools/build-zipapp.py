@@ -0,0 +1,166 @@
+# noqa: INP001
+
+"""
+Build Dotbot as a single-file zipapp, which includes PyYAML and precompiled
+bytecode, so that it starts quickly even where nothing has been compiled yet
+(e.g., in a fresh clone).
+
+Run with, for example, `hatch run python tools/build-zipapp.py`. The bytecode
+is specific to the version of Python that builds the zipapp; other versions
+compile the included sources whenever they run it, like the `bin/dotbot`
+script without a `__pycache__` directory.
+
+Next to the zipapp, this writes a stamp (e.g., `dist/dotbot.pyz.stamp`) with
+the modification times of the zipapp and of the directories of the sources
+that it includes, which `bin/dotbot` checks to tell whether the zipapp is
+still current.
+"""
+
+import argparse
+import importlib.util
+import marshal
+import os
+import stat
+import sys
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the same for every build, so that builds of the same sources are identical
+DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+MAIN = """\
+import sys
+
+if sys.version_info < (3, 7):
+    sys.exit("error: this version of Dotbot requires Python 3.7+")
+
+from dotbot.cli import main
+
+main()
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default=os.path.join(ROOT, "dist", "dotbot.pyz"), help="path of the zipapp")
+    parser.add_argument(
+        "--yaml",
+        help="directory of the PyYAML package to include (by default, the\n"
+        "vendored copy in lib/pyyaml, or else the installed one)",
+    )
+    parser.add_argument("--python", default="/usr/bin/env python3", help="interpreter for the shebang line")
+    parser.add_argument("--compress", action="store_true", help="compress the files (smaller, but slower to start)")
+    args = parser.parse_args()
+
+    yaml_directory = args.yaml or find_yaml()
+    if yaml_directory is None:
+        print("PyYAML not found; check out lib/pyyaml or install it, or use --yaml")  # noqa: T201
+        sys.exit(1)
+    build(
+        args.output,
+        yaml_directory=yaml_directory,
+        python=args.python,
+        compress=args.compress,
+    )
+    print(f"Built {args.output}")  # noqa: T201
+
+
+def find_yaml() -> Optional[str]:
+    vendored = os.path.join(ROOT, "lib", "pyyaml", "lib", "yaml")
+    if os.path.isdir(vendored):
+        return vendored
+    spec = importlib.util.find_spec("yaml")
+    if spec is None or spec.origin is None:
+        return None
+    return os.path.dirname(spec.origin)
+
+
+def build(output: str, *, yaml_directory: str, python: str, compress: bool) -> None:
+    """
+    Writes the zipapp, with the sources of Dotbot and PyYAML, and their
+    bytecode next to them, where zipimport looks for it, and then its stamp.
+    """
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    dotbot_directory = os.path.join(ROOT, "src", "dotbot")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    temporary = f"{output}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(f"#!{python}\n".encode())
+        with zipfile.ZipFile(file, "w", compression) as archive:
+            modules = [("__main__.py", MAIN.encode("utf-8"))]
+            modules.extend(sources(dotbot_directory, "dotbot"))
+            modules.extend(sources(yaml_directory, "yaml"))
+            for name, source in modules:
+                write(archive, name, source)
+                write(archive, f"{name[: -len('.py')]}.pyc", bytecode(name, source))
+    mode = os.stat(temporary).st_mode
+    os.chmod(temporary, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)  # noqa: S103 # executable, like bin/dotbot
+    os.replace(temporary, output)
+    write_stamp(f"{output}.stamp", [output, *directories(dotbot_directory), *directories(yaml_directory)])
+
+
+def sources(directory: str, package: str) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yields the path in the archive and the contents of each Python source file
+    of the package in the directory, in a stable order.
+    """
+    for parent, directories, files in os.walk(directory):
+        directories[:] = sorted(d for d in directories if d != "__pycache__")
+        relative = os.path.relpath(parent, directory)
+        for name in sorted(files):
+            if not name.endswith(".py"):
+                continue
+            path = os.path.normpath(os.path.join(package, relative, name)).replace(os.sep, "/")
+            with open(os.path.join(parent, name), "rb") as file:
+                yield path, file.read()
+
+
+def directories(directory: str) -> Iterator[str]:
+    """
+    Yields the directory and its subdirectories, which change whenever a file
+    in them is added, removed, or replaced (e.g., by git).
+    """
+    for parent, children, _ in os.walk(directory):
+        children[:] = sorted(d for d in children if d != "__pycache__")
+        yield parent
+
+
+def write_stamp(stamp: str, paths: List[str]) -> None:
+    """
+    Writes the modification time and the absolute path of each path, one per
+    line, in the format that `bin/dotbot` reads.
+    """
+    with open(stamp, "w") as file:
+        file.writelines(f"{os.stat(path).st_mtime_ns} {os.path.abspath(path)}\n" for path in paths)
+
+
+def bytecode(name: str, source: bytes) -> bytes:
+    """
+    Compiles the source into the contents of a .pyc file that is never checked
+    against the source, because both come from the same build (PEP 552).
+
+    The bytecode isn't optimized, because zipimport uses the same .pyc file
+    whether or not Python runs with -O, and optimizing would drop asserts and
+    docstrings even without it.
+    """
+    code = compile(source, name, "exec", dont_inherit=True, optimize=0)
+    flags = 0b01  # hash-based, without checking the source
+    return (
+        importlib.util.MAGIC_NUMBER
+        + flags.to_bytes(4, "little")
+        + importlib.util.source_hash(source)
+        + marshal.dumps(code)
+    )
+
+
+def write(archive: zipfile.ZipFile, name: str, data: bytes) -> None:
+    info = zipfile.ZipInfo(name, DATE_TIME)
+    info.compress_type = archive.compression
+    info.external_attr = 0o644 << 16
+    archive.writestr(info, data)
+
+
+if __name__ == "__main__":
+    main()